@@ -1,5 +1,6 @@
-from KuliAnalysis import KuliAnalysis
-import colorama
+from kuli.kulianalysis import KuliAnalysis, init_colorama
+from kuli.connector import ConnectorRef, parse_connector, parse_connectors
+from kuli.schema import load_schema
 
 # starts and initializes kuli
 def start_kuli(kuli_file_name):
@@ -8,6 +9,7 @@ def start_kuli(kuli_file_name):
     KULI.write_results = False
 
     if KULI.initialize() == 0:
+        colorama = init_colorama()
         print(colorama.Back.RED 
             + "ERROR: KULI could not be initalized!"
             + colorama.Style.RESET_ALL)
@@ -24,50 +26,37 @@ def cleanup_kuli(kuli):
 #############################################################################
 # component connector helper functions
 
+# the extract functions share one memoized parser, see kuli.connector
+
 # extracts the KULI component id from a string
 # sample: returns "1.Rad" from "1.Rad.ExitTempIM"
 def extract_component_id(component_connector):
-    number_of_delim = component_connector.count(".")
-    
-    if number_of_delim != 1 and number_of_delim != 2:
-        return ""
-    
-    return component_connector.rsplit('.', 1)[0]
+    return parse_connector(component_connector).component_id
 
 # extracts the KULI component type from a string
 # sample: returns "Rad" from "1.Rad.ExitTempIM"
 def extract_component_type(component_connector):
-    number_of_delim = component_connector.count(".")
-    
-    if number_of_delim == 1:
-        return component_connector.split('.')[0]
-    elif number_of_delim == 2:
-        return component_connector.split(".")[1] # take "Rad" from "1.Rad.ExitTempIM[K]"
-    else:
-        return ""
+    return parse_connector(component_connector).component_type
 
 # extracts the KULI connector id from a string
 # sample: returns "ExitTempIM" from "1.Rad.ExitTempIM"
 def extract_connector_id(component_connector, keep_unit:bool=True):
-    connector_id = component_connector
-
+    connector = parse_connector(component_connector)
     if not keep_unit:
-        connector_id = component_connector.split("[")[0]  # remove unit definition from string
-
-    number_of_delim = connector_id.count(".")
-    
-    if number_of_delim != 1 and number_of_delim != 2:
-        return ""
+        return connector.connector_id
 
-    return connector_id.rsplit('.', 1)[1] # take right most enty from string
+    return connector.connector_id + connector.connector_unit_suffix
 
 # validates a list of component connectors
-def validate_connectors(component_connectors:list, connectors_are_inputs:bool, kuli_file_name:str):
-    KULI = start_kuli(kuli_file_name) # type: KuliAnalysis
-    if KULI is None:
+# the model schema is cached per scs file, so KULI is only started if the
+# file changed since the last validation
+def validate_connectors(component_connectors:list, connectors_are_inputs:bool, kuli_file_name:str, cache_dir:str=None):
+    schema = load_schema(kuli_file_name, cache_dir=cache_dir, start_kuli=start_kuli)
+    if schema is None:
         return False
 
-    component_ids = KULI.list_components("*").split()
+    colorama = init_colorama()
+    component_ids = schema.components
     if len(component_ids) == 0:
         print(colorama.Back.RED 
             + "ERROR: Error getting components list from KULI."
@@ -76,20 +65,19 @@ def validate_connectors(component_connectors:list, connectors_are_inputs:bool, k
 
     valid = True
 
-    for component_connector in component_connectors: 
-        component_id = extract_component_id(component_connector)
+    for component_connector, connector_ref in zip(component_connectors, parse_connectors(component_connectors)):
+        component_id = connector_ref.component_id
 
         if component_id in component_ids:
-            component_type = extract_component_type(component_connector)
+            component_type = connector_ref.component_type
             if component_type == "":
                 print(colorama.Back.RED 
                     + "ERROR: Invalid component type: %s" % component_connector
                     + colorama.Style.RESET_ALL)
                 valid = False
             else:
-                connectors = KULI.list_connectors(component_type , "A" if connectors_are_inputs else "S").split()
-                connector = extract_connector_id(component_connector, False)
-                if connector in connectors:
+                connector = connector_ref.connector_id
+                if schema.has_connector(component_type, connector, "A" if connectors_are_inputs else "S"):
                     print(colorama.Fore.GREEN 
                         + "Info:\tConnector successfully validated: \'%s\'" % component_connector
                         + colorama.Style.RESET_ALL)
@@ -110,7 +98,5 @@ def validate_connectors(component_connectors:list, connectors_are_inputs:bool, k
                     + colorama.Style.RESET_ALL)
                 valid = False
 
-    cleanup_kuli(KULI)
-
     return valid
 #############################################################################
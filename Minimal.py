@@ -1,4 +1,4 @@
-from KuliAnalysis import KuliAnalysis
+from kuli import KuliAnalysis
 
 kuli = KuliAnalysis("13")
 kuli.kuli_file_name = r"C:\ECS\KULI_130000\data\CoolingSystems\ExCAR_COM.scs"
@@ -0,0 +1,50 @@
+""" Compares two result files of benchmarks/suite.py
+
+    python benchmarks/compare.py benchmarks/results/abc1234.json benchmarks/results/def5678.json
+
+Prints the median time per operation of both runs and their ratio. Exits
+with status 1 if a benchmark got slower by more than --threshold.
+"""
+import argparse
+import json
+import sys
+
+
+def load(file_name):
+    with open(file_name) as result_file:
+        return json.load(result_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('base', help='result file of the reference commit')
+    parser.add_argument('head', help='result file of the commit to check')
+    parser.add_argument('--threshold', type=float, default=0.10, help='accepted slowdown, 0.10 is 10 %%')
+    args = parser.parse_args()
+
+    base, head = load(args.base), load(args.head)
+    print('%-32s %14s %14s %8s' % ('benchmark', base['commit'] + ' [us]', head['commit'] + ' [us]', 'ratio'))
+    regressions = []
+    for name in sorted(set(base['results']) | set(head['results'])):
+        before = base['results'].get(name)
+        after = head['results'].get(name)
+        if before is None or after is None:
+            print('%-32s %14s %14s' % (name, '-' if before is None else '%.3f' % (1e6 * before['median']),
+                                       '-' if after is None else '%.3f' % (1e6 * after['median'])))
+            continue
+        ratio = after['median'] / before['median'] if before['median'] else float('inf')
+        flag = ''
+        if ratio > 1.0 + args.threshold:
+            flag = '  slower'
+            regressions.append(name)
+        elif ratio < 1.0 / (1.0 + args.threshold):
+            flag = '  faster'
+        print('%-32s %14.3f %14.3f %8.2f%s' % (name, 1e6 * before['median'], 1e6 * after['median'], ratio, flag))
+
+    if regressions:
+        print('%d benchmark(s) slower than the threshold: %s' % (len(regressions), ', '.join(regressions)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
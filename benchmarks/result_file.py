@@ -0,0 +1,92 @@
+""" Benchmark of kuli.results.ResultFile on a synthetic KULI result file
+
+    python benchmarks/result_file.py --size 4096 --columns 200
+
+writes a tab separated result file of about --size MB and compares the
+line by line Python parser with ResultFile for all columns, a projection
+and the chunked generator mode.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kuli.results import ResultFile
+
+
+def write_result_file(file_name, size_mb, columns, seed=0):
+    ''' writes a file of about size_mb MB, returns the number of rows '''
+    names = ['Time'] + ['%d.Comp.Signal%d' % (column % 10 + 1, column) for column in range(1, columns)]
+    random = numpy.random.default_rng(seed)
+    block = random.normal(300.0, 50.0, size=(10000, columns))
+    with open(file_name, 'w', newline='') as result_file:
+        result_file.write('\t'.join(names) + '\r\n')
+        result_file.write('\t'.join(['s'] + ['K'] * (columns - 1)) + '\r\n')
+        rows = 0
+        while result_file.tell() < size_mb << 20:
+            block[:, 0] = numpy.arange(rows, rows + len(block))
+            numpy.savetxt(result_file, block, fmt='%.6g', delimiter='\t', newline='\r\n')
+            rows += len(block)
+    return rows
+
+
+def read_lines(file_name, names):
+    ''' the line by line parser ResultFile replaces '''
+    with open(file_name) as result_file:
+        header = result_file.readline().rstrip('\r\n').split('\t')
+        result_file.readline()
+        positions = [header.index(name) for name in names]
+        columns = [[] for _ in positions]
+        for line in result_file:
+            fields = line.split('\t')
+            for column, position in zip(columns, positions):
+                column.append(float(fields[position]))
+    return dict((name, numpy.array(column)) for name, column in zip(names, columns))
+
+
+def timed(title, function, size_mb):
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    print('%-36s %8.2f s %9.1f MB/s' % (title, elapsed, size_mb / elapsed))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=256, help='file size in MB')
+    parser.add_argument('--columns', type=int, default=100, help='number of signals')
+    parser.add_argument('--projection', type=int, default=5, help='signals read in the projection')
+    parser.add_argument('--file', help='result file to use instead of a temporary one')
+    parser.add_argument('--skip-python', action='store_true', help='skip the line by line parser')
+    args = parser.parse_args()
+
+    file_name = args.file or os.path.join(tempfile.gettempdir(), 'kuli_results_%d.res' % args.size)
+    if not os.path.exists(file_name):
+        rows = write_result_file(file_name, args.size, args.columns)
+        print('wrote %s: %d rows, %d columns' % (file_name, rows, args.columns))
+    size_mb = os.path.getsize(file_name) / float(1 << 20)
+
+    results = ResultFile(file_name)
+    projection = results.names[:args.projection]
+    if not args.skip_python:
+        expected = timed('line by line, projection', lambda: read_lines(file_name, projection), size_mb)
+    actual = timed('ResultFile.read, projection', lambda: results.read(projection), size_mb)
+    if not args.skip_python:
+        assert all(numpy.array_equal(expected[name], actual[name]) for name in projection)
+    del actual
+    timed('ResultFile.iter_chunks, projection',
+          lambda: sum(len(chunk['Time']) for chunk in results.iter_chunks(projection)), size_mb)
+    timed('ResultFile.iter_chunks, all', lambda: sum(len(chunk['Time']) for chunk in results.iter_chunks()),
+          size_mb)
+    if not args.file:
+        os.remove(file_name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+""" Benchmark of the time from import to the first KULI call
+
+    python benchmarks/startup.py --repeat 20
+
+Runs every scenario in fresh interpreters and reports the median time to
+import, to construct a KuliAnalysis on the fake server and to finish the
+first call, plus which heavy modules were loaded. The import of the fake server
+itself is not counted.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# scenario -> (import statement, construct and call)
+SCENARIOS = {
+    'import kuli': ('import kuli', False),
+    'import KuliAnalysis': ('from KuliAnalysis import KuliAnalysis', False),
+    'import KuliAnalysisHelper': ('import KuliAnalysisHelper', False),
+    'first call, lazy': ('from kuli import KuliAnalysis', True),
+    'first call, eager': ('from kuli import KuliAnalysis', 'eager'),
+}
+
+CHILD = '''
+import json, sys, time
+start = time.perf_counter()
+%s
+imported = time.perf_counter()
+constructed = called = imported
+backend = 0.0
+if %r:
+    # the fake server needs numpy, its import is not counted
+    from kuli import fake
+    backend = time.perf_counter() - imported
+    imported += backend
+    kuli = KuliAnalysis('13', dispatch=fake.DispatchWithEvents, lazy=%r)
+    constructed = time.perf_counter()
+    kuli.get_version_str()
+    called = time.perf_counter()
+print(json.dumps({
+    'import': imported - backend - start,
+    'construct': constructed - imported,
+    'first_call': called - backend - start,
+    'modules': sorted(name for name in ('colorama', 'win32com', 'numpy') if name in sys.modules),
+}))
+'''
+
+
+def run(statement, construct, repeat):
+    code = CHILD % (statement, bool(construct), construct != 'eager')
+    samples = []
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, '-c', code], cwd=ROOT)
+        samples.append(json.loads(output))
+    return dict((key, statistics.median(sample[key] for sample in samples))
+                for key in ('import', 'construct', 'first_call')), samples[-1]['modules']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=10, help='interpreters started per scenario')
+    args = parser.parse_args()
+
+    print('%-28s %12s %14s %15s  %s' % ('scenario', 'import [ms]', 'construct [ms]', 'first call [ms]',
+                                        'modules loaded'))
+    for name, (statement, construct) in SCENARIOS.items():
+        times, modules = run(statement, construct, args.repeat)
+        print('%-28s %12.2f %14.3f %15.2f  %s' % (name, 1e3 * times['import'], 1e3 * times['construct'],
+                                                 1e3 * times['first_call'], ', '.join(modules) or '-'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+""" Benchmark suite of the KULI wrapper on the fake server
+
+    python benchmarks/suite.py                     # all benchmarks
+    python benchmarks/suite.py --filter batch --latency 50e-6
+    python benchmarks/compare.py benchmarks/results/abc1234.json benchmarks/results/def5678.json
+
+Runs against kuli.fake, which mimics KuliAnalysisCtr2 including events,
+operating points, time steps and COM codes, so the suite runs anywhere.
+Each benchmark is repeated and the median time per operation is written
+to benchmarks/results/<commit>.json, to be compared with compare.py.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy
+
+import KuliAnalysisHelper
+from kuli import KuliAnalysis, StepDriver, fake
+from kuli.connector import parse_connector, parse_connectors
+from kuli.schema import load_schema
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+
+def large_model(instances, **kwargs):
+    ''' returns a FakeModel with the default components repeated '''
+    model = fake.FakeModel(**kwargs)
+    model.components = dict(('%d.%s' % (instance, component_type), component_type)
+                            for instance in range(1, instances + 1)
+                            for component_type in ('Rad', 'CAC', 'Fan', 'Pump', 'Eng'))
+    return model
+
+
+def signal_list(model, count, kind='S'):
+    ''' returns count connector strings of the model '''
+    signals = []
+    for component_id, component_type in sorted(model.components.items()):
+        for connector in sorted(model.connectors[component_type][kind]):
+            signals.append('%s.%s' % (component_id, connector))
+            if len(signals) == count:
+                return signals
+    return signals
+
+
+def start(model=None, latency=0.0):
+    kuli = KuliAnalysis('13', dispatch=fake.FakeDispatch(model, latency))
+    kuli.kuli_file_name = 'benchmark.scs'
+    kuli.initialize()
+    return kuli
+
+
+###########################################################################
+# benchmarks: function(args) -> (function to time, operations per call)
+
+def bench_call_raw(args):
+    ''' GetValue on the server object, the floor of the wrapper '''
+    kuli = start()
+    server = kuli._KuliAnalysis__kuli
+    def run():
+        for _ in range(args.calls):
+            server.GetValue('1.Rad', 'ExitTempIM')
+    return run, args.calls
+
+
+def bench_call_get_value(args):
+    ''' get_value with component and connector ID '''
+    kuli = start()
+    def run():
+        for _ in range(args.calls):
+            kuli.get_value('1.Rad', 'ExitTempIM')
+    return run, args.calls
+
+
+def bench_call_get_value_ref(args):
+    ''' get_value with a ConnectorRef '''
+    kuli = start()
+    ref = parse_connector('1.Rad.ExitTempIM')
+    def run():
+        for _ in range(args.calls):
+            kuli.get_value(ref)
+    return run, args.calls
+
+
+def bench_call_set_com_value(args):
+    ''' set_com_value_by_id '''
+    kuli = start()
+    def run():
+        for _ in range(args.calls):
+            kuli.set_com_value_by_id('AmbientTemp', 25.0)
+    return run, args.calls
+
+
+def bench_batch_get_value_loop(args):
+    ''' get_value in a loop over a large signal list, with latency '''
+    model = large_model(args.signals // 10 + 1)
+    kuli = start(model, args.latency)
+    refs = parse_connectors(signal_list(model, args.signals))
+    def run():
+        return [kuli.get_value(ref) for ref in refs]
+    return run, len(refs)
+
+
+def bench_batch_get_values(args):
+    ''' get_values over a large signal list, with latency '''
+    model = large_model(args.signals // 10 + 1)
+    kuli = start(model, args.latency)
+    refs = parse_connectors(signal_list(model, args.signals))
+    def run():
+        return kuli.get_values(refs, as_array=True)
+    return run, len(refs)
+
+
+def bench_batch_set_values(args):
+    ''' set_values over a large actuator list, with latency '''
+    model = large_model(args.signals // 4 + 1)
+    kuli = start(model, args.latency)
+    values = [(ref, 1.0) for ref in parse_connectors(signal_list(model, args.signals, 'A'))]
+    def run():
+        kuli.set_values(values)
+    return run, len(values)
+
+
+def bench_batch_set_values_buffered(args):
+    ''' set_values of unchanged values with the write buffer, with latency '''
+    model = large_model(args.signals // 4 + 1)
+    kuli = start(model, args.latency)
+    kuli.enable_write_buffer()
+    values = [(ref, 1.0) for ref in parse_connectors(signal_list(model, args.signals, 'A'))]
+    def run():
+        kuli.set_values(values)
+        kuli.flush_writes()
+    return run, len(values)
+
+
+def bench_parse_connectors_cold(args):
+    ''' parse_connectors of new strings '''
+    model = large_model(args.signals // 10 + 1)
+    signals = signal_list(model, args.signals)
+    def run():
+        parse_connector.cache_clear()
+        parse_connectors(signals)
+    return run, len(signals)
+
+
+def bench_validate_connectors(args):
+    ''' KuliAnalysisHelper.validate_connectors with a cached schema '''
+    model = large_model(args.signals // 10 + 1)
+    signals = signal_list(model, args.signals)
+    cache_dir = tempfile.mkdtemp()
+    kuli_file = os.path.join(cache_dir, 'benchmark.scs')
+    with open(kuli_file, 'w') as scs_file:
+        scs_file.write('benchmark')
+    load_schema(kuli_file, kuli=start(model), cache_dir=cache_dir)
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            KuliAnalysisHelper.validate_connectors(signals, False, kuli_file, cache_dir)
+    return run, len(signals)
+
+
+def bench_stepping(args):
+    ''' StepDriver over a transient run, per time step '''
+    model = fake.FakeModel(operating_points=1, time_steps=args.steps, iterations=5)
+    kuli = start(model)
+    driver = StepDriver(kuli, ['1.Fan.Speed', '1.Pump.Speed'], ['1.Rad.ExitTempIM', '1.Fan.Power'])
+    schedule = numpy.column_stack((numpy.linspace(1000.0, 3000.0, args.steps),
+                                   numpy.full(args.steps, 2500.0)))
+    def run():
+        driver.run(schedule)
+    return run, args.steps
+
+
+def bench_run_analysis_events(args):
+    ''' run_analysis firing events into a listener, per event '''
+    model = fake.FakeModel(operating_points=3, time_steps=50, iterations=20)
+    kuli = start(model)
+    counts = [0]
+    def listener(*event_args):
+        counts[0] += 1
+    kuli.add_event_listener('OnNextIteration', listener)
+    events = 3 * 50 * (20 * 2 + 2) + 3
+    def run():
+        kuli.run_analysis()
+    return run, events
+
+
+BENCHMARKS = dict((name[len('bench_'):], function) for name, function in sorted(globals().items())
+                  if name.startswith('bench_'))
+
+
+def measure(function, args):
+    run, operations = function(args)
+    run()  # warm up
+    times = []
+    for _ in range(args.repeat):
+        start_time = time.perf_counter()
+        run()
+        times.append((time.perf_counter() - start_time) / operations)
+    return {
+        'median': statistics.median(times),
+        'min': min(times),
+        'max': max(times),
+        'repeat': args.repeat,
+        'operations': operations,
+        'unit': 's/op',
+    }
+
+
+def current_commit():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                         stderr=subprocess.DEVNULL).decode().strip()
+        dirty = subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                        cwd=ROOT).strip()
+        return commit + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--filter', default='', help='run benchmarks whose name contains this')
+    parser.add_argument('--repeat', type=int, default=7, help='timed runs per benchmark')
+    parser.add_argument('--calls', type=int, default=20000, help='calls of the per call benchmarks')
+    parser.add_argument('--signals', type=int, default=2000, help='length of the signal lists')
+    parser.add_argument('--steps', type=int, default=1000, help='time steps of the stepping benchmark')
+    parser.add_argument('--latency', type=float, default=20e-6, help='seconds per COM call in batch benchmarks')
+    parser.add_argument('--output', help='result file, defaults to benchmarks/results/<commit>.json')
+    args = parser.parse_args()
+
+    commit = current_commit()
+    results = {}
+    for name, function in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+        results[name] = measure(function, args)
+        print('%-32s %12.3f us/op  (min %.3f)' % (name, 1e6 * results[name]['median'], 1e6 * results[name]['min']))
+
+    output = args.output or os.path.join(RESULTS_DIR, commit + '.json')
+    if not os.path.isdir(os.path.dirname(output)):
+        os.makedirs(os.path.dirname(output))
+    with open(output, 'w') as result_file:
+        json.dump({
+            'commit': commit,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'parameters': vars(args),
+            'results': results,
+        }, result_file, indent=2)
+    print('results written to %s' % output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+""" Python tools for the KULI analysis server
+
+The public classes are imported from their modules on first access, so
+"import kuli" only loads what a script actually uses:
+
+    from kuli import KuliAnalysis
+    kuli = KuliAnalysis('13')
+"""
+import importlib
+
+# public name -> module defining it
+_EXPORTS = {
+    'KuliAnalysis': 'kuli.kulianalysis',
+    'KuliEvents': 'kuli.kulianalysis',
+    'EVENTS': 'kuli.kulianalysis',
+    'ConnectorRef': 'kuli.connector',
+    'parse_connector': 'kuli.connector',
+    'parse_connectors': 'kuli.connector',
+    'signal_name': 'kuli.connector',
+    'ModelSchema': 'kuli.schema',
+    'load_schema': 'kuli.schema',
+    'KuliPool': 'kuli.pool',
+    'PoolResult': 'kuli.pool',
+    'WorkerHost': 'kuli.workerhost',
+    'InstancePool': 'kuli.warmpool',
+    'AsyncKuliAnalysis': 'kuli.aio',
+    'SignalRecorder': 'kuli.recorder',
+    'EventLog': 'kuli.eventlog',
+    'UnitRegistry': 'kuli.units',
+    'StepDriver': 'kuli.stepping',
+    'Profiler': 'kuli.profiling',
+    'ResultFile': 'kuli.results',
+    'Study': 'kuli.study',
+    'ResultStore': 'kuli.study',
+    'random_design': 'kuli.study',
+    'latin_hypercube': 'kuli.study',
+    'full_factorial': 'kuli.study',
+    'ResultCache': 'kuli.cache',
+    'CachedKuli': 'kuli.cache',
+    'ConvergenceMonitor': 'kuli.convergence',
+    'Snapshot': 'kuli.snapshot',
+    'SnapshotRecorder': 'kuli.snapshot',
+    'Surrogate': 'kuli.surrogate',
+    'RBFModel': 'kuli.surrogate',
+    'DifferentialEvolution': 'kuli.optimize',
+    'IncrementalRun': 'kuli.incremental',
+    'CompressedRecorder': 'kuli.compression',
+    'load_recording': 'kuli.compression',
+    'JobSpec': 'kuli.jobqueue',
+    'Coordinator': 'kuli.jobqueue',
+    'WorkerAgent': 'kuli.jobqueue',
+    'SQLiteTransport': 'kuli.jobqueue',
+    'FileTransport': 'kuli.jobqueue',
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError("module 'kuli' has no attribute '%s'" % name)
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,212 @@
+""" asyncio interface to KuliAnalysis
+
+Every AsyncKuliAnalysis owns one thread that creates and calls its COM
+server, so the COM apartment rules are kept while the event loop stays
+free. KULI events can be consumed as async iterators:
+
+    kuli = await AsyncKuliAnalysis.start('13')
+    await kuli.set('kuli_file_name', r'C:\\models\\ExCAR_COM.scs')
+    await kuli.initialize()
+    async with kuli.events('OnEndOfOperatingPoint') as events:
+        run = asyncio.ensure_future(kuli.run_analysis())
+        async for event in events:
+            print(event.name, event.args)
+            if event.args[0] == 3:
+                break
+        await run
+    await kuli.close()
+
+Pass dispatch=kuli.fake.DispatchWithEvents to start to run without a KULI server.
+"""
+import asyncio
+import collections
+import concurrent.futures
+import functools
+
+from kuli.kulianalysis import KuliAnalysis, EVENTS
+
+KuliEvent = collections.namedtuple('KuliEvent', 'name args')
+
+
+def _init_apartment():
+    ''' initializes COM for the thread of an instance '''
+    try:
+        import pythoncom
+    except ImportError:
+        return
+    pythoncom.CoInitializeEx(pythoncom.COINIT_APARTMENTTHREADED)
+
+
+def _release(instance):
+    ''' drops the COM server on its thread before leaving the apartment '''
+    instance.kuli = None
+    try:
+        import pythoncom
+    except ImportError:
+        return
+    pythoncom.CoUninitialize()
+
+
+class EventStream(object):
+    """ Async iterator over KULI events of one AsyncKuliAnalysis """
+
+    def __init__(self, kuli, names, maxsize=0):
+        self.__kuli = kuli
+        self.__loop = asyncio.get_running_loop()
+        self.__queue = asyncio.Queue(maxsize)
+        self.__listeners = []
+        self.dropped = 0
+        self.closed = False
+        self.__ended = False
+        for name in names:
+            listener = functools.partial(self.__fire, name)
+            kuli.add_event_listener(name, listener)
+            self.__listeners.append((name, listener))
+
+    def __fire(self, name, *args):
+        # runs on the COM thread
+        self.__loop.call_soon_threadsafe(self.__put, KuliEvent(name, args))
+
+    def __put(self, event):
+        try:
+            self.__queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def close(self):
+        ''' stops listening, the iteration ends after the queued events '''
+        if self.closed:
+            return
+        self.closed = True
+        for name, listener in self.__listeners:
+            self.__kuli.remove_event_listener(name, listener)
+        self.__listeners = []
+        self.__loop.call_soon_threadsafe(self.__end)
+
+    def __end(self):
+        self.__ended = True
+        try:
+            self.__queue.put_nowait(None)
+        except asyncio.QueueFull:
+            # nobody waits on a full queue, __anext__ ends once it is empty
+            pass
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.__ended and self.__queue.empty():
+            raise StopAsyncIteration
+        event = await self.__queue.get()
+        if event is None:
+            raise StopAsyncIteration
+        return event
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+class AsyncKuliAnalysis(object):
+    """ Awaitable wrapper running a KuliAnalysis on its own thread """
+
+    def __init__(self, kuli, executor):
+        '''
+        Use AsyncKuliAnalysis.start to create instances.
+        '''
+        self.kuli = kuli
+        self.__executor = executor
+
+    @classmethod
+    async def start(cls, versionstring='13', kuli_event_handler=None, dispatch=None, factory=None):
+        '''
+        Creates the KuliAnalysis on a new thread.
+        :param versionstring: KULI version, see KuliAnalysis
+        :param kuli_event_handler: event handler class, see KuliAnalysis
+        :param dispatch: dispatch function, see KuliAnalysis
+        :param factory: function without arguments returning a KuliAnalysis,
+        replaces the other arguments
+        '''
+        if factory is None:
+            factory = functools.partial(KuliAnalysis, versionstring, kuli_event_handler, dispatch)
+        executor = concurrent.futures.ThreadPoolExecutor(
+            1, thread_name_prefix='KuliAnalysis', initializer=_init_apartment)
+        try:
+            kuli = await asyncio.get_running_loop().run_in_executor(executor, factory)
+        except BaseException:
+            executor.shutdown(wait=False)
+            raise
+        return cls(kuli, executor)
+
+    async def call(self, name, *args):
+        '''
+        Calls a method of the KuliAnalysis on its thread.
+        :param name: name of the method, e.g. "get_version_str"
+        '''
+        return await asyncio.get_running_loop().run_in_executor(
+            self.__executor, functools.partial(getattr(self.kuli, name), *args))
+
+    def __getattr__(self, name):
+        # awaitable versions of all other KuliAnalysis methods
+        if not callable(getattr(KuliAnalysis, name, None)) or name.startswith('_'):
+            raise AttributeError(name)
+        return functools.partial(self.call, name)
+
+    async def get(self, name):
+        ''' returns a property of the KuliAnalysis, e.g. "kuli_file_name" '''
+        return await asyncio.get_running_loop().run_in_executor(
+            self.__executor, getattr, self.kuli, name)
+
+    async def set(self, name, value):
+        ''' sets a property of the KuliAnalysis, e.g. "kuli_file_name" '''
+        return await asyncio.get_running_loop().run_in_executor(
+            self.__executor, setattr, self.kuli, name, value)
+
+    async def initialize(self):
+        ''' see KuliAnalysis.initialize '''
+        return await self.call('initialize')
+
+    async def run_analysis(self):
+        ''' see KuliAnalysis.run_analysis '''
+        return await self.call('run_analysis')
+
+    async def simulate_operating_point(self, operating_point):
+        ''' see KuliAnalysis.simulate_operating_point '''
+        return await self.call('simulate_operating_point', operating_point)
+
+    async def get_values(self, signals, as_array=False):
+        ''' see KuliAnalysis.get_values '''
+        return await self.call('get_values', signals, as_array)
+
+    async def set_values(self, values):
+        ''' see KuliAnalysis.set_values '''
+        return await self.call('set_values', values)
+
+    async def get_com_values(self, com_ids, as_array=False):
+        ''' see KuliAnalysis.get_com_values '''
+        return await self.call('get_com_values', com_ids, as_array)
+
+    async def set_com_values(self, values):
+        ''' see KuliAnalysis.set_com_values '''
+        return await self.call('set_com_values', values)
+
+    def events(self, *names, maxsize=0):
+        '''
+        Returns an async iterator over the KULI events with the specified
+        names, all events if no name is given. Events arriving while maxsize
+        events are queued are dropped.
+        '''
+        for name in names:
+            if name not in EVENTS:
+                raise ValueError('unknown KULI event: %s' % name)
+        return EventStream(self.kuli, names or EVENTS, maxsize)
+
+    async def close(self):
+        ''' cleans up KULI and stops the thread '''
+        try:
+            await self.call('clean_up')
+        finally:
+            await asyncio.get_running_loop().run_in_executor(self.__executor, _release, self)
+            self.__executor.shutdown(wait=False)
@@ -0,0 +1,280 @@
+""" Cache of simulation results keyed by model, inputs and operating point
+
+CachedKuli wraps a KuliAnalysis instance. Before simulating it hashes the
+scs file, the values of all input COM objects and the operating point; if
+the result was stored before, the output COM values and signals are
+returned without running KULI:
+
+    cache = ResultCache(directory=r'C:\\temp\\kuli_results')
+    cached = CachedKuli(kuli, cache, outputs=['CoolantTemp'], signals=['1.Rad.ExitTempIM'])
+    result = cached.simulate_operating_point(1)
+    print(result.outputs, result.hit, cache.stats)
+
+Results live in an LRU dict in memory and, if a directory is given, as
+compressed .npz files on disk, which are evicted oldest first once their
+total size exceeds disk_limit. On a hit KULI is not called, so the state
+of the server (e.g. values read with get_value) is not the simulated one.
+"""
+import collections
+import hashlib
+import io
+import os
+import threading
+import time
+
+import numpy
+
+from kuli.connector import parse_connectors, signal_name
+from kuli.schema import model_digest
+
+# default directory of the on-disk layer
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.kuli', 'results')
+
+
+class CachedResult(collections.namedtuple('CachedResult', 'value outputs signals hit')):
+    """ Return value of a simulation and the values read after it """
+
+    __slots__ = ()
+
+
+def result_key(digest, inputs, operating_point, outputs=(), signals=()):
+    '''
+    Returns the cache key of a simulation as hex string.
+    :param digest: hash of the scs file, see model_digest
+    :param inputs: (com_id, value) pairs of all input COM objects
+    :param operating_point: simulated operating point, 0 for run_analysis
+    :param outputs: IDs of the output COM objects stored with the result
+    :param signals: names of the signals stored with the result
+    '''
+    key = hashlib.sha256()
+    key.update(digest.encode())
+    key.update(b'\0%d' % operating_point)
+    for com_id, value in sorted(inputs):
+        key.update(('\0%s=%s' % (com_id, float(value).hex())).encode())
+    key.update(b'\0outputs')
+    for com_id in outputs:
+        key.update(('\0' + com_id).encode())
+    key.update(b'\0signals')
+    for signal in signals:
+        key.update(('\0' + signal).encode())
+    return key.hexdigest()
+
+
+class ResultCache(object):
+    """ In-memory LRU layer over an optional on-disk layer of .npz files """
+
+    def __init__(self, memory_size=256, directory=None, disk_limit=1 << 30):
+        '''
+        :param memory_size: number of results kept in memory
+        :param directory: directory of the on-disk layer, None keeps results
+        in memory only
+        :param disk_limit: total size of the .npz files in bytes
+        '''
+        self.memory_size = memory_size
+        self.directory = directory
+        self.disk_limit = disk_limit
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        self.time_saved = 0.0
+        self.__memory = collections.OrderedDict()
+        # key -> file size, oldest first
+        self.__files = collections.OrderedDict()
+        self.__disk_size = 0
+        self.__lock = threading.Lock()
+        if directory is not None:
+            self.__scan()
+
+    def __file_name(self, key):
+        return os.path.join(self.directory, key[:2], key + '.npz')
+
+    def __scan(self):
+        ''' indexes the files written by earlier runs '''
+        files = []
+        if os.path.isdir(self.directory):
+            for sub_dir in os.scandir(self.directory):
+                if not sub_dir.is_dir():
+                    continue
+                for entry in os.scandir(sub_dir.path):
+                    if entry.name.endswith('.npz'):
+                        stat = entry.stat()
+                        files.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+        for _, key, size in sorted(files):
+            self.__files[key] = size
+            self.__disk_size += size
+
+    def __remember(self, key, entry):
+        memory = self.__memory
+        memory[key] = entry
+        memory.move_to_end(key)
+        while len(memory) > self.memory_size:
+            memory.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key):
+        '''
+        Returns the stored (value, outputs, signals, duration) or None.
+        '''
+        with self.__lock:
+            entry = self.__memory.get(key)
+            if entry is not None:
+                self.__memory.move_to_end(key)
+            elif key in self.__files:
+                entry = self.__load(key)
+                if entry is not None:
+                    self.disk_hits += 1
+                    self.__remember(key, entry)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.time_saved += entry[3]
+            return entry
+
+    def __load(self, key):
+        file_name = self.__file_name(key)
+        try:
+            with numpy.load(file_name) as data:
+                entry = (data['value'].item(), data['outputs'].tolist(), data['signals'].tolist(),
+                         float(data['duration']))
+            os.utime(file_name)
+        except (OSError, KeyError, ValueError):
+            self.__disk_size -= self.__files.pop(key)
+            return None
+        self.__files.move_to_end(key)
+        return entry
+
+    def put(self, key, value, outputs, signals, duration=0.0):
+        '''
+        Stores a result.
+        :param value: return value of the simulation
+        :param outputs: values of the output COM objects
+        :param signals: values of the signals
+        :param duration: time the simulation took in seconds
+        '''
+        entry = (value, list(outputs), list(signals), duration)
+        with self.__lock:
+            self.__remember(key, entry)
+            if self.directory is not None:
+                self.__store(key, entry)
+
+    def __store(self, key, entry):
+        buffer = io.BytesIO()
+        numpy.savez_compressed(buffer, value=entry[0], outputs=numpy.array(entry[1], dtype=float),
+                               signals=numpy.array(entry[2], dtype=float), duration=entry[3])
+        file_name = self.__file_name(key)
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        tmp_name = '%s.%d.tmp' % (file_name, os.getpid())
+        with open(tmp_name, 'wb') as npz_file:
+            npz_file.write(buffer.getvalue())
+        os.replace(tmp_name, file_name)
+
+        self.__disk_size -= self.__files.pop(key, 0)
+        self.__files[key] = len(buffer.getvalue())
+        self.__disk_size += self.__files[key]
+        while self.__disk_size > self.disk_limit and len(self.__files) > 1:
+            old_key, size = self.__files.popitem(last=False)
+            self.__disk_size -= size
+            self.disk_evictions += 1
+            try:
+                os.remove(self.__file_name(old_key))
+            except OSError:
+                pass
+
+    def clear(self):
+        ''' removes all results from memory and disk '''
+        with self.__lock:
+            self.__memory.clear()
+            for key in self.__files:
+                try:
+                    os.remove(self.__file_name(key))
+                except OSError:
+                    pass
+            self.__files.clear()
+            self.__disk_size = 0
+
+    @property
+    def stats(self):
+        ''' dict with hit rate, evictions and sizes '''
+        with self.__lock:
+            requests = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'memory_hits': self.hits - self.disk_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / requests if requests else 0.0,
+                'evictions': self.evictions,
+                'disk_evictions': self.disk_evictions,
+                'memory_entries': len(self.__memory),
+                'disk_entries': len(self.__files),
+                'disk_size': self.__disk_size,
+                'time_saved': self.time_saved,
+            }
+
+
+class CachedKuli(object):
+    """ Runs simulations of a KuliAnalysis instance through a ResultCache """
+
+    def __init__(self, kuli, cache, outputs=(), signals=()):
+        '''
+        :param kuli: initialized KuliAnalysis instance
+        :param cache: ResultCache, may be shared by several instances
+        :param outputs: IDs of the output COM objects returned per simulation
+        :param signals: sensors returned per simulation, see KuliAnalysis.get_values
+        '''
+        self.kuli = kuli
+        self.cache = cache
+        self.outputs = list(outputs)
+        self.signals = parse_connectors(signals)
+        self.__signal_names = [signal_name(signal) for signal in self.signals]
+        self.__model = None
+        self.__digest = None
+        self.__input_coms = None
+
+    def __model_key(self):
+        ''' digest of the scs file and input COM IDs, updated when the file changes '''
+        file_name = self.kuli.kuli_file_name
+        stat = os.stat(file_name)
+        model = (file_name, stat.st_size, stat.st_mtime_ns)
+        if model != self.__model:
+            self.__digest = model_digest(file_name)
+            self.__input_coms = list(self.kuli.get_com_codes(True) or ())
+            self.__model = model
+        return self.__digest
+
+    def key(self, operating_point):
+        ''' returns the cache key for the current inputs and an operating point '''
+        digest = self.__model_key()
+        inputs = zip(self.__input_coms, self.kuli.get_com_values(self.__input_coms))
+        return result_key(digest, inputs, operating_point, self.outputs, self.__signal_names)
+
+    def __run(self, operating_point, simulate):
+        key = self.key(operating_point)
+        entry = self.cache.get(key)
+        if entry is not None:
+            return CachedResult(entry[0], entry[1], entry[2], True)
+        start = time.perf_counter()
+        value = simulate()
+        duration = time.perf_counter() - start
+        outputs = self.kuli.get_com_values(self.outputs)
+        signals = self.kuli.get_values(self.signals)
+        if value:
+            self.cache.put(key, value, outputs, signals, duration)
+        return CachedResult(value, outputs, signals, False)
+
+    def simulate_operating_point(self, operating_point):
+        '''
+        Simulates an operating point unless the result is cached.
+        Returns a CachedResult.
+        '''
+        return self.__run(operating_point, lambda: self.kuli.simulate_operating_point(operating_point))
+
+    def run_analysis(self):
+        '''
+        Runs the analysis unless the result is cached. Returns a CachedResult
+        with the values after the last operating point.
+        '''
+        return self.__run(0, self.kuli.run_analysis)
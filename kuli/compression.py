@@ -0,0 +1,425 @@
+""" Decimated and compressed recording of long transient runs
+
+A CompressedRecorder listens to OnEndOfTimeStep like SignalRecorder, but
+keeps only the change points of every column: a value is stored when it
+differs from the last stored value of its column by more than the deadband
+tolerance of the column. Holding the last stored value therefore
+reconstructs every record within the tolerance, and a tolerance of 0 is
+lossless. Change points are collected in blocks per column, which are delta
+encoded and compressed with zlib once full:
+
+    recorder = CompressedRecorder(kuli, ['1.Rad.ExitTempIM', '1.Fan.Power'],
+                                  tolerance={'1.Rad.ExitTempIM': 0.01, '1.Fan.Power': 1.0},
+                                  file_name=r'C:\\temp\\cycle.kuliz')
+    kuli.run_analysis()
+    recorder.close()
+
+    recording = load_recording(r'C:\\temp\\cycle.kuliz')
+    times, values = recording.resample(step=0.5, operating_point=1)
+    print(recording.stats)
+
+Record indices are delta encoded as the smallest unsigned integer type that
+fits. Values are XOR encoded with their predecessor and byte shuffled, so
+the leading bytes shared by neighbouring values become runs of zeros.
+"""
+import json
+import struct
+import zlib
+
+import numpy
+
+from kuli.connector import signal_name
+from kuli.recorder import INDEX_COLUMNS
+
+# first and last bytes of a recording file
+MAGIC = b'KULIZ001'
+# dtypes of the record index deltas, smallest first
+_INDEX_DTYPES = ('uint8', 'uint16', 'uint32', 'uint64')
+
+
+def encode_values(values, level=6):
+    ''' returns float64 values XOR delta encoded, byte shuffled and compressed '''
+    bits = numpy.ascontiguousarray(values, dtype=numpy.float64).view(numpy.uint64)
+    deltas = bits.copy()
+    deltas[1:] ^= bits[:-1]
+    return zlib.compress(deltas.view(numpy.uint8).reshape(-1, 8).T.tobytes(), level)
+
+
+def decode_values(data, count):
+    ''' inverse of encode_values '''
+    shuffled = numpy.frombuffer(zlib.decompress(data), dtype=numpy.uint8).reshape(8, count)
+    deltas = numpy.ascontiguousarray(shuffled.T).view(numpy.uint64).ravel()
+    return numpy.bitwise_xor.accumulate(deltas).view(numpy.float64)
+
+
+def encode_indices(indices, level=6):
+    '''
+    Returns the differences of increasing record indices in the smallest
+    fitting dtype, compressed, and the name of the dtype.
+    '''
+    deltas = numpy.diff(numpy.asarray(indices, dtype=numpy.int64))
+    largest = int(deltas.max()) if len(deltas) else 0
+    dtype = next(name for name in _INDEX_DTYPES if largest <= numpy.iinfo(name).max)
+    return zlib.compress(deltas.astype(dtype).tobytes(), level), dtype
+
+
+def decode_indices(data, dtype, first, count):
+    ''' inverse of encode_indices, first is the first record index '''
+    indices = numpy.empty(count, dtype=numpy.int64)
+    indices[0] = first
+    numpy.cumsum(numpy.frombuffer(zlib.decompress(data), dtype=dtype), out=indices[1:])
+    indices[1:] += first
+    return indices
+
+
+class CompressedRecording(object):
+    """ Reader of change points, reconstructing columns and resampled arrays """
+
+    def __init__(self, names, tolerances, count=0, segments=(), blocks=(), file_name=None,
+                 segments_end=None):
+        '''
+        :param names: column names, INDEX_COLUMNS without the operating point
+        followed by the signals and COM objects
+        :param tolerances: deadband of every column
+        :param count: number of records
+        :param segments: (first record, operating point) pairs
+        :param blocks: block table, (column, count, first record, index
+        dtype, offset, index length, value length) per block
+        :param file_name: file holding the blocks, None keeps them in memory
+        :param segments_end: record after the last finished operating point,
+        defaults to count
+        '''
+        self.names = list(names)
+        self.tolerances = numpy.array(tolerances, dtype=float)
+        self.file_name = file_name
+        self._count = count
+        self._segments = [tuple(segment) for segment in segments]
+        self._segments_end = count if segments_end is None else segments_end
+        self._blocks = [tuple(block) for block in blocks]
+        self._positions = dict((name, position) for position, name in enumerate(self.names))
+        self._buffer = bytearray() if file_name is None else None
+        self._stored_size = sum(block[5] + block[6] for block in self._blocks)
+
+    def __len__(self):
+        return self._count
+
+    def _read(self, offset, length):
+        if self._buffer is not None:
+            return bytes(self._buffer[offset:offset + length])
+        with open(self.file_name, 'rb') as recording_file:
+            recording_file.seek(offset)
+            return recording_file.read(length)
+
+    def _pending(self, position):
+        ''' record indices and values not yet compressed into a block '''
+        return numpy.empty(0, dtype=numpy.int64), numpy.empty(0)
+
+    def __position(self, name):
+        if not isinstance(name, str):
+            name = signal_name(name)
+        return self._positions[name]
+
+    def change_points(self, name):
+        '''
+        Returns the record indices and values stored for a column.
+        :param name: signal name as given, COM ID, "time_step" or "time"
+        '''
+        position = self.__position(name)
+        indices, values = [], []
+        for column, count, first, dtype, offset, index_length, value_length in self._blocks:
+            if column == position:
+                indices.append(decode_indices(self._read(offset, index_length), dtype, first, count))
+                values.append(decode_values(self._read(offset + index_length, value_length), count))
+        pending_indices, pending_values = self._pending(position)
+        return numpy.concatenate(indices + [pending_indices]), numpy.concatenate(values + [pending_values])
+
+    def __lookup(self, name, records):
+        ''' values of a column at record indices, holding the last change point '''
+        indices, values = self.change_points(name)
+        if not len(indices):
+            return numpy.full(len(records), numpy.nan)
+        return values[numpy.maximum(numpy.searchsorted(indices, records, 'right') - 1, 0)]
+
+    def __operating_points(self, records):
+        if not self._segments:
+            return numpy.full(len(records), numpy.nan)
+        starts = numpy.array([start for start, _ in self._segments])
+        numbers = numpy.array([number for _, number in self._segments] + [numpy.nan], dtype=float)
+        segment = numpy.searchsorted(starts, records, 'right') - 1
+        ends = numpy.append(starts[1:], self._segments_end)
+        # records after the last finished operating point belong to none yet
+        segment = numpy.where((segment >= 0) & (records < ends[segment]), segment, len(self._segments))
+        return numbers[segment]
+
+    def column(self, name, start=0, stop=None):
+        '''
+        Returns the reconstructed values of a column at every record, each
+        within the tolerance of the column.
+        :param name: signal name as given, COM ID or one of INDEX_COLUMNS
+        :param start: first record
+        :param stop: record after the last, defaults to the number of records
+        '''
+        records = numpy.arange(start, self._count if stop is None else stop)
+        if name == INDEX_COLUMNS[0]:
+            return self.__operating_points(records)
+        return self.__lookup(name, records)
+
+    def records_of(self, operating_point):
+        ''' returns the first record and the record after the last of an operating point '''
+        for position, (start, number) in enumerate(self._segments):
+            if number == operating_point:
+                stop = self._segments[position + 1][0] if position + 1 < len(self._segments) else self._segments_end
+                return start, stop
+        raise KeyError('operating point %s was not recorded' % operating_point)
+
+    def resample(self, names=None, step=None, start=None, stop=None, operating_point=None,
+                 method='previous'):
+        '''
+        Returns a uniform time grid and an array of shape (names, grid points)
+        with the columns at the grid times.
+        :param names: columns to resample, defaults to all signals and COM objects
+        :param step: spacing of the grid, defaults to the mean spacing of the records
+        :param start: first grid time, defaults to the first record
+        :param stop: last grid time, defaults to the last record
+        :param operating_point: resample only the records of this operating
+        point, needed if the time restarts with every operating point
+        :param method: "previous" holds the last record before a grid time,
+        "linear" interpolates between the neighbouring records. Both are
+        within the tolerances of the same resampling of the original records.
+        '''
+        if method not in ('previous', 'linear'):
+            raise ValueError('unknown method: %s' % method)
+        if names is None:
+            names = self.names[len(INDEX_COLUMNS) - 1:]
+        first, last = self.records_of(operating_point) if operating_point is not None else (0, self._count)
+        times = self.column('time', first, last)
+        if len(times) == 0:
+            return numpy.empty(0), numpy.empty((len(names), 0))
+        if numpy.any(numpy.diff(times) < 0):
+            raise ValueError('time is not increasing, select an operating point')
+        start = times[0] if start is None else start
+        stop = times[-1] if stop is None else stop
+        if step is None:
+            step = (times[-1] - times[0]) / (len(times) - 1) if len(times) > 1 else 1.0
+        grid = start + step * numpy.arange(int(numpy.floor((stop - start) / step + 1e-9)) + 1)
+
+        lower = numpy.clip(numpy.searchsorted(times, grid, 'right') - 1, 0, len(times) - 1)
+        data = numpy.empty((len(names), len(grid)))
+        if method == 'previous':
+            for row, name in enumerate(names):
+                data[row] = self.__lookup(name, first + lower)
+            return grid, data
+        upper = numpy.minimum(lower + 1, len(times) - 1)
+        span = times[upper] - times[lower]
+        weight = numpy.clip(numpy.where(span > 0, (grid - times[lower]) / numpy.where(span > 0, span, 1.0), 0.0),
+                            0.0, 1.0)
+        for row, name in enumerate(names):
+            below = self.__lookup(name, first + lower)
+            data[row] = below + weight * (self.__lookup(name, first + upper) - below)
+        return grid, data
+
+    def _pending_count(self):
+        return 0
+
+    @property
+    def stats(self):
+        ''' dict with the numbers of records and change points and the sizes in bytes '''
+        stored_points = sum(block[1] for block in self._blocks) + self._pending_count()
+        raw_size = self._count * (len(self.names) + 1) * 8
+        stored_size = self._stored_size + 16 * self._pending_count() + 16 * len(self._segments)
+        return {
+            'records': self._count,
+            'columns': len(self.names) + 1,
+            'change_points': stored_points,
+            'blocks': len(self._blocks),
+            'raw_size': raw_size,
+            'stored_size': stored_size,
+            'ratio': raw_size / stored_size if stored_size else 0.0,
+        }
+
+
+class CompressedRecorder(CompressedRecording):
+    """ Decimates and compresses signals per time step as they stream in """
+
+    def __init__(self, kuli, signals, com_ids=(), tolerance=0.0, block_size=1024,
+                 file_name=None, level=6):
+        '''
+        :param kuli: KuliAnalysis instance to record from, None to feed
+        records with append
+        :param signals: sensors and actuators to record, see KuliAnalysis.get_values
+        :param com_ids: IDs of COM objects to record
+        :param tolerance: deadband, a number, a sequence with one value per
+        signal and COM object or a dict of name -> tolerance. The time step
+        and the time are always recorded without loss.
+        :param block_size: change points per column compressed together
+        :param file_name: file the compressed blocks are written to, None
+        keeps them in memory
+        :param level: zlib compression level
+        '''
+        self.kuli = kuli
+        self.signals = list(signals)
+        self.com_ids = list(com_ids)
+        self.block_size = max(2, block_size)
+        self.level = level
+        names = list(INDEX_COLUMNS[1:]) + [signal_name(signal) for signal in self.signals] + self.com_ids
+        tolerances = numpy.concatenate((numpy.zeros(len(INDEX_COLUMNS) - 1),
+                                        self.__tolerances(tolerance, names[len(INDEX_COLUMNS) - 1:])))
+        CompressedRecording.__init__(self, names, tolerances, file_name=file_name)
+
+        columns = len(names)
+        self.__last = numpy.full(columns, numpy.nan)
+        self.__started = False
+        self.__counts = numpy.zeros(columns, dtype=numpy.int64)
+        self.__indices = numpy.empty((columns, self.block_size), dtype=numpy.int64)
+        self.__values = numpy.empty((columns, self.block_size))
+        self.__operating_point_start = 0
+        self._segments_end = 0
+        self.__file = None
+        self.__offset = 0
+        if file_name is not None:
+            self.__file = open(file_name, 'w+b')
+            self.__file.write(MAGIC)
+            self.__offset = len(MAGIC)
+
+        self.__attached = False
+        if kuli is not None:
+            self.attach()
+
+    @staticmethod
+    def __tolerances(tolerance, names):
+        if hasattr(tolerance, 'items'):
+            unknown = set(tolerance) - set(names)
+            if unknown:
+                raise ValueError('tolerance given for unknown signals: %s' % ', '.join(sorted(unknown)))
+            return numpy.array([tolerance.get(name, 0.0) for name in names], dtype=float)
+        return numpy.broadcast_to(numpy.asarray(tolerance, dtype=float), (len(names),)).copy()
+
+    def attach(self):
+        ''' starts recording '''
+        if not self.__attached:
+            self.kuli.add_event_listener('OnEndOfTimeStep', self.__record)
+            self.kuli.add_event_listener('OnEndOfOperatingPoint', self.end_operating_point)
+            self.__attached = True
+
+    def detach(self):
+        ''' stops recording, the captured data stays available '''
+        if self.__attached:
+            self.kuli.remove_event_listener('OnEndOfTimeStep', self.__record)
+            self.kuli.remove_event_listener('OnEndOfOperatingPoint', self.end_operating_point)
+            self.__attached = False
+
+    def __record(self, time_step, time):
+        values = self.kuli.get_values(self.signals, as_array=True)
+        if self.com_ids:
+            values = numpy.concatenate((values, self.kuli.get_com_values(self.com_ids, as_array=True)))
+        self.append(time_step, time, values)
+
+    def append(self, time_step, time, values):
+        '''
+        Adds one record, keeping the values that left the deadband.
+        :param time_step: number of the time step
+        :param time: simulation time
+        :param values: values of the signals and COM objects
+        '''
+        row = numpy.empty(len(self.names))
+        row[0] = time_step
+        row[1] = time
+        row[2:] = values
+        last = self.__last
+        if self.__started:
+            changed = (numpy.abs(row - last) > self.tolerances) | (numpy.isnan(row) != numpy.isnan(last))
+            columns = numpy.flatnonzero(changed)
+        else:
+            columns = numpy.arange(len(row))
+            self.__started = True
+        if len(columns):
+            last[columns] = row[columns]
+            slots = self.__counts[columns]
+            self.__indices[columns, slots] = self._count
+            self.__values[columns, slots] = row[columns]
+            self.__counts[columns] += 1
+            for column in columns[self.__counts[columns] == self.block_size]:
+                self.__compress(column)
+        self._count += 1
+
+    def end_operating_point(self, operating_point):
+        ''' assigns the records since the previous call to an operating point '''
+        if self._count > self.__operating_point_start:
+            self._segments.append((self.__operating_point_start, int(operating_point)))
+            self.__operating_point_start = self._segments_end = self._count
+
+    def __compress(self, column):
+        count = int(self.__counts[column])
+        indices = self.__indices[column, :count]
+        index_data, dtype = encode_indices(indices, self.level)
+        value_data = encode_values(self.__values[column, :count], self.level)
+        offset = self.__offset
+        if self.__file is not None:
+            self.__file.write(index_data)
+            self.__file.write(value_data)
+        else:
+            self._buffer += index_data
+            self._buffer += value_data
+        self.__offset += len(index_data) + len(value_data)
+        self._stored_size += len(index_data) + len(value_data)
+        self._blocks.append((int(column), count, int(indices[0]), dtype, offset, len(index_data), len(value_data)))
+        self.__counts[column] = 0
+
+    def _read(self, offset, length):
+        if self.__file is not None and not self.__file.closed:
+            self.__file.flush()
+        return CompressedRecording._read(self, offset, length)
+
+    def _pending(self, position):
+        count = self.__counts[position]
+        return self.__indices[position, :count].copy(), self.__values[position, :count].copy()
+
+    def _pending_count(self):
+        return int(self.__counts.sum())
+
+    def flush(self):
+        ''' compresses the pending change points of all columns '''
+        for column in numpy.flatnonzero(self.__counts):
+            self.__compress(column)
+
+    def close(self):
+        ''' stops recording, compresses all change points and finishes the file '''
+        if self.kuli is not None:
+            self.detach()
+        self.flush()
+        if self.__file is None or self.__file.closed:
+            return
+        meta = json.dumps({
+            'names': self.names,
+            'tolerances': self.tolerances.tolist(),
+            'count': self._count,
+            'segments': self._segments,
+            'segments_end': self._segments_end,
+            'blocks': self._blocks,
+        }).encode()
+        self.__file.write(meta)
+        self.__file.write(struct.pack('<Q', self.__offset) + MAGIC)
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def load_recording(file_name):
+    '''
+    Opens a file written by a CompressedRecorder and returns a
+    CompressedRecording reading it.
+    '''
+    with open(file_name, 'rb') as recording_file:
+        recording_file.seek(-16, 2)
+        offset, magic = struct.unpack('<Q8s', recording_file.read(16))
+        if magic != MAGIC:
+            raise ValueError('%s is not a finished recording' % file_name)
+        end = recording_file.tell() - 16
+        recording_file.seek(offset)
+        meta = json.loads(recording_file.read(end - offset).decode())
+    return CompressedRecording(meta['names'], meta['tolerances'], meta['count'], meta['segments'],
+                               meta['blocks'], file_name, meta['segments_end'])
@@ -0,0 +1,114 @@
+""" Parsed references to component connectors
+
+Strings like "1.Rad.ExitTempIM[K]" are parsed once into a ConnectorRef and
+the result is memoized, so signal lists can be parsed up front and passed
+to KuliAnalysis without any string handling in the simulation loop:
+
+    refs = parse_connectors(['1.Rad.ExitTempIM[K]', '1.Fan.Speed'])
+    kuli.get_values(refs)
+"""
+import functools
+
+
+class ConnectorRef(object):
+    """ Component connector like "1.Rad.ExitTempIM[K]" split into its parts """
+
+    __slots__ = ('component_id', 'component_type', 'connector_id', 'unit', '_hash')
+
+    def __init__(self, component_id, component_type, connector_id, unit=''):
+        '''
+        :param component_id: ID of the component, e.g. "1.Rad"
+        :param component_type: type of the component, e.g. "Rad"
+        :param connector_id: ID of the connector without unit, e.g. "ExitTempIM"
+        :param unit: unit given in brackets, e.g. "K", or ""
+        '''
+        set_slot = object.__setattr__
+        set_slot(self, 'component_id', component_id)
+        set_slot(self, 'component_type', component_type)
+        set_slot(self, 'connector_id', connector_id)
+        set_slot(self, 'unit', unit)
+        set_slot(self, '_hash', hash((component_id, connector_id, unit)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('ConnectorRef is immutable')
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if not isinstance(other, ConnectorRef):
+            return NotImplemented
+        return (self.component_id == other.component_id
+                and self.connector_id == other.connector_id
+                and self.unit == other.unit
+                and self.component_type == other.component_type)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __reduce__(self):
+        return (ConnectorRef, (self.component_id, self.component_type, self.connector_id, self.unit))
+
+    def __repr__(self):
+        return 'ConnectorRef(%r)' % str(self)
+
+    def __str__(self):
+        return '%s.%s%s' % (self.component_id, self.connector_id, self.connector_unit_suffix)
+
+    @property
+    def connector_unit_suffix(self):
+        ''' the unit in brackets as given in the connector string, or "" '''
+        return '[%s]' % self.unit if self.unit else ''
+
+    @property
+    def valid(self):
+        ''' False if the string could not be parsed '''
+        return self.component_id != ''
+
+    @property
+    def is_com(self):
+        ''' True for COM objects like "COM.MeanEffPressure" '''
+        return self.component_id == 'COM'
+
+
+@functools.lru_cache(maxsize=65536)
+def parse_connector(component_connector):
+    '''
+    Parses a component connector string. Accepted forms are
+    "<instance>.<type>.<connector>[unit]" and "<type>.<connector>[unit]".
+    Other strings result in a ConnectorRef with empty fields.
+    :param component_connector: string like "1.Rad.ExitTempIM[K]"
+    '''
+    name, bracket, unit = component_connector.partition('[')
+    if bracket:
+        unit = unit.split(']', 1)[0]
+    parts = name.split('.')
+    if len(parts) == 3:
+        return ConnectorRef(parts[0] + '.' + parts[1], parts[1], parts[2], unit)
+    if len(parts) == 2:
+        return ConnectorRef(parts[0], parts[0], parts[1], unit)
+    return ConnectorRef('', '', '', '')
+
+
+def parse_connectors(component_connectors):
+    '''
+    Parses a list of component connector strings, returns a list of ConnectorRefs.
+    ConnectorRefs and (component_id, connector_id) pairs are passed through.
+    '''
+    parse = parse_connector
+    return [connector if isinstance(connector, ConnectorRef) else
+            parse(connector) if isinstance(connector, str) else
+            ConnectorRef(connector[0], connector[0].rsplit('.', 1)[-1], connector[1])
+            for connector in component_connectors]
+
+
+def signal_name(signal):
+    '''
+    Returns the name of a signal as used for columns and keys, e.g.
+    "1.Rad.ExitTempIM" for a string, a ConnectorRef or a
+    (component_id, connector_id) pair.
+    '''
+    if isinstance(signal, tuple):
+        return '.'.join(signal)
+    return str(signal)
@@ -0,0 +1,201 @@
+""" Early termination of converged operating points
+
+KULI iterates every operating point up to its iteration limit. A
+ConvergenceMonitor reads selected outputs on OnNextIteration, compares them
+with the previous iteration and calls cancel() in OnCheckForCancel once all
+changes are within tolerance:
+
+    monitor = ConvergenceMonitor(kuli, signals=['1.Rad.ExitTempIM'], com_ids=['CoolantTemp'],
+                                 atol=1e-3, rtol=1e-6, iteration_limit=200)
+    with monitor:
+        monitor.simulate_operating_points(range(1, 11))
+    print(monitor.iterations_saved, monitor.reports)
+
+cancel() ends the whole run, not only the current time step. The monitor
+therefore only cancels operating points simulated one by one with its
+simulate_operating_point(s); during run_analysis or other runs of several
+operating points it only reports. It also only cancels in the last time
+step of an operating point, the comparison restarts with every time step.
+The time steps per operating point are learned from the first operating
+point, which runs to its end, unless time_steps is given; pass
+time_steps=1 for steady state models. time_steps must match the model:
+with too few, transient operating points are cut short unnoticed.
+"""
+import collections
+
+import numpy
+
+from kuli.connector import parse_connectors, signal_name
+
+
+class OperatingPointReport(collections.namedtuple(
+        'OperatingPointReport', 'operating_point iterations converged iterations_saved')):
+    """ Iterations run for one operating point """
+
+    __slots__ = ()
+
+
+class ConvergenceMonitor(object):
+    """ Cancels the analysis once the watched outputs stop changing """
+
+    def __init__(self, kuli, signals=(), com_ids=(), atol=1e-6, rtol=1e-6,
+                 iteration_limit=None, min_iterations=2, patience=1, time_steps=None):
+        '''
+        :param kuli: KuliAnalysis instance
+        :param signals: sensors to watch, see KuliAnalysis.get_values
+        :param com_ids: IDs of output COM objects to watch
+        :param atol: absolute tolerance, a number, a sequence with one value
+        per signal and COM object or a dict of name -> tolerance
+        :param rtol: relative tolerance, given like atol
+        :param iteration_limit: iteration limit of the model, used to compute
+        the iterations saved
+        :param min_iterations: iterations before convergence is checked
+        :param patience: consecutive converged iterations before cancelling
+        :param time_steps: time steps per operating point of the model, the
+        analysis is only cancelled in the last one. None learns them from the
+        first operating point, which is not cancelled
+        '''
+        self.kuli = kuli
+        self.signals = parse_connectors(signals)
+        self.com_ids = list(com_ids)
+        self.names = [signal_name(signal) for signal in self.signals] + self.com_ids
+        self.atol = self.__tolerances(atol, 'atol')
+        self.rtol = self.__tolerances(rtol, 'rtol')
+        self.iteration_limit = iteration_limit
+        self.min_iterations = max(1, min_iterations)
+        self.patience = max(1, patience)
+        self.time_steps = None if time_steps is None else max(1, time_steps)
+        self.reports = []
+        self.attached = False
+        self.__armed = False
+        self.__reset()
+
+    def __tolerances(self, tolerance, name):
+        if hasattr(tolerance, 'items'):
+            unknown = set(tolerance) - set(self.names)
+            if unknown:
+                raise ValueError('%s given for unknown signals: %s' % (name, ', '.join(sorted(unknown))))
+            return numpy.array([tolerance.get(signal, 0.0) for signal in self.names], dtype=float)
+        tolerances = numpy.broadcast_to(numpy.asarray(tolerance, dtype=float), (len(self.names),))
+        return tolerances.copy()
+
+    def __reset(self):
+        self.__previous = None
+        self.__converged_count = 0
+        self.__cancel = False
+        self.__cancelled = False
+        self.__iterations = 0
+        self.__step_iterations = 0
+        self.__time_steps = 0
+
+    def __read(self):
+        values = self.kuli.get_values(self.signals, as_array=True)
+        if self.com_ids:
+            values = numpy.concatenate((values, self.kuli.get_com_values(self.com_ids, as_array=True)))
+        return values
+
+    def __on_next_iteration(self, iteration_number):
+        self.__iterations += 1
+        self.__step_iterations += 1
+        if self.__cancelled:
+            return
+        values = self.__read()
+        previous = self.__previous
+        self.__previous = values
+        if previous is None or iteration_number <= self.min_iterations:
+            return
+        change = numpy.abs(values - previous)
+        if (change <= self.atol + self.rtol * numpy.abs(values)).all():
+            self.__converged_count += 1
+            if self.__converged_count >= self.patience:
+                self.__cancel = True
+        else:
+            self.__converged_count = 0
+
+    def __on_check_for_cancel(self):
+        # cancel() ends the run, so only the last time step of a single operating point may be cut short
+        if self.__cancel and self.__armed and not self.__cancelled and self.time_steps is not None \
+                and self.__time_steps >= self.time_steps - 1:
+            self.__cancelled = True
+            self.kuli.cancel()
+
+    def __on_end_of_time_step(self, time_step, time):
+        self.__time_steps += 1
+        self.__previous = None
+        self.__converged_count = 0
+        self.__cancel = False
+        if not self.__cancelled:
+            self.__step_iterations = 0
+
+    def __on_end_of_operating_point(self, operating_point):
+        if self.time_steps is None and not self.__cancelled:
+            self.time_steps = max(1, self.__time_steps)
+        converged = self.__cancelled
+        saved = None
+        if self.iteration_limit is not None:
+            saved = max(0, self.iteration_limit - self.__step_iterations) if converged else 0
+        self.reports.append(OperatingPointReport(operating_point, self.__iterations, converged, saved))
+        self.__reset()
+
+    def __listeners(self):
+        return (('OnNextIteration', self.__on_next_iteration),
+                ('OnCheckForCancel', self.__on_check_for_cancel),
+                ('OnEndOfTimeStep', self.__on_end_of_time_step),
+                ('OnEndOfOperatingPoint', self.__on_end_of_operating_point))
+
+    def attach(self):
+        ''' starts watching the events of the instance '''
+        if not self.attached:
+            for event, listener in self.__listeners():
+                self.kuli.add_event_listener(event, listener)
+            self.attached = True
+            self.__reset()
+
+    def detach(self):
+        ''' stops watching the events of the instance '''
+        if self.attached:
+            for event, listener in self.__listeners():
+                self.kuli.remove_event_listener(event, listener)
+            self.attached = False
+
+    def __enter__(self):
+        self.attach()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.detach()
+
+    def simulate_operating_point(self, operating_point):
+        '''
+        Simulates one operating point, cancelling it once converged.
+        Returns the OperatingPointReport, or None if KULI did not finish the
+        operating point. Operating point 0 runs all of them without
+        cancelling.
+        '''
+        attached = self.attached
+        self.attach()
+        count = len(self.reports)
+        self.__armed = operating_point != 0
+        try:
+            self.kuli.simulate_operating_point(operating_point)
+        finally:
+            self.__armed = False
+            if not attached:
+                self.detach()
+        return self.reports[-1] if len(self.reports) > count else None
+
+    def simulate_operating_points(self, operating_points):
+        '''
+        Simulates the operating points one by one, returns their reports.
+        '''
+        return [self.simulate_operating_point(operating_point) for operating_point in operating_points]
+
+    @property
+    def iterations_saved(self):
+        ''' iterations saved in all reported operating points '''
+        return sum(report.iterations_saved or 0 for report in self.reports)
+
+    @property
+    def iterations_run(self):
+        ''' iterations run in all reported operating points '''
+        return sum(report.iterations for report in self.reports)
@@ -0,0 +1,199 @@
+""" Non-blocking logging of KULI messages and errors
+
+KuliEvents prints every OnMessage and OnError inside the COM callback. With
+an EventLog the callback only puts a small tuple into a queue. A background
+thread filters, deduplicates, rate limits, formats and writes the records:
+
+    log = EventLog(stream=open('kuli.log', 'w'), format='json')
+    kuli = KuliAnalysis('13', log.event_handler())
+    kuli.run_analysis()
+    print(log.close())
+"""
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+
+from kuli.kulianalysis import KuliEvents, init_colorama
+
+# levels of the KULI events, compatible with the logging module
+MESSAGE = logging.INFO
+ERROR = logging.ERROR
+
+
+class EventLog(object):
+    """ Queue backed writer for KULI messages and errors """
+
+    def __init__(self, stream=None, level=MESSAGE, format='text', dedup_window=1.0,
+                 rate_limit=None, max_queue=100000):
+        '''
+        :param stream: file object the records are written to, defaults to sys.stdout
+        :param level: records below this level are discarded in the callback
+        :param format: "text" for colored console output or "json" for JSON lines
+        :param dedup_window: repeats of the previous record within this time in
+        seconds are counted instead of written, 0 disables deduplication
+        :param rate_limit: maximum number of records written per second, None
+        for no limit
+        :param max_queue: records arriving while the queue is full are dropped
+        '''
+        if format not in ('text', 'json'):
+            raise ValueError('unknown format: %s' % format)
+        self.stream = stream if stream is not None else sys.stdout
+        self.level = level
+        self.format = format
+        self.dedup_window = dedup_window
+        self.rate_limit = rate_limit
+
+        self.received = 0
+        self.filtered = 0
+        self.dropped = 0
+        self.duplicates = 0
+        self.rate_limited = 0
+        self.written = 0
+        self.failed = 0
+        self.levels = {}
+        self.__window_start = 0.0
+        self.__window_count = 0
+
+        self.__queue = queue.Queue(max_queue)
+        self.__thread = threading.Thread(target=self.__run, name='KuliEventLog', daemon=True)
+        self.__thread.start()
+
+    def event_handler(self, base=KuliEvents):
+        '''
+        Returns an event handler class for KuliAnalysis passing messages and
+        errors to this log.
+        :param base: event handler class to extend
+        '''
+        return type(base.__name__, (base,), {'event_log': self})
+
+    # called from the COM callbacks
+    def put(self, level, function_name, message, additional_info, message_type):
+        '''
+        Queues a record, returns immediately.
+        :param level: MESSAGE or ERROR
+        '''
+        self.received += 1
+        if level < self.level:
+            self.filtered += 1
+            return
+        try:
+            self.__queue.put_nowait((time.time(), level, function_name, message,
+                                     additional_info, message_type))
+        except queue.Full:
+            self.dropped += 1
+
+    def message(self, function_name, message, additional_info, message_type):
+        ''' queues a KULI message '''
+        self.put(MESSAGE, function_name, message, additional_info, message_type)
+
+    def error(self, function_name, message, additional_info, message_type):
+        ''' queues a KULI error '''
+        self.put(ERROR, function_name, message, additional_info, message_type)
+
+    # background thread
+    def __run(self):
+        last_key = None
+        last_time = 0.0
+        repeats = 0
+        while True:
+            record = self.__queue.get()
+            if record is None:
+                break
+            while record:
+                stamp = record[0]
+                key = record[1:5]
+                if key == last_key and stamp - last_time < self.dedup_window:
+                    repeats += 1
+                    self.duplicates += 1
+                    last_time = stamp
+                else:
+                    if repeats:
+                        self.__write_repeats(last_time, last_key, repeats)
+                        repeats = 0
+                    last_key, last_time = key, stamp
+                    self.__emit(record)
+                try:
+                    record = self.__queue.get_nowait()
+                except queue.Empty:
+                    record = False
+            if repeats:
+                self.__write_repeats(last_time, last_key, repeats)
+                repeats = 0
+                last_key = None
+            try:
+                self.stream.flush()
+            except Exception:
+                self.failed += 1
+            if record is None:
+                break
+
+    def __write_repeats(self, stamp, key, repeats):
+        level, function_name, message, additional_info = key
+        self.__emit((stamp, level, function_name,
+                     'last message repeated %d times' % repeats, message, None))
+
+    def __emit(self, record):
+        ''' rate limits, counts and writes a record, a failing write must not stop the thread '''
+        stamp, level = record[0], record[1]
+        if self.rate_limit is not None:
+            if stamp - self.__window_start >= 1.0:
+                self.__window_start, self.__window_count = stamp, 0
+            self.__window_count += 1
+            if self.__window_count > self.rate_limit:
+                self.rate_limited += 1
+                return
+        self.levels[level] = self.levels.get(level, 0) + 1
+        try:
+            self.__write(record)
+        except Exception:
+            self.failed += 1
+
+    def __write(self, record):
+        stamp, level, function_name, message, additional_info, message_type = record
+        if self.format == 'json':
+            line = json.dumps({
+                'time': stamp,
+                'level': logging.getLevelName(level),
+                'function': function_name,
+                'message': message,
+                'info': additional_info,
+                'type': message_type,
+            })
+        elif level >= ERROR:
+            colorama = init_colorama()
+            line = '%sERROR: %s\t%s%s' % (colorama.Back.RED, message, additional_info or '',
+                                          colorama.Style.RESET_ALL)
+        else:
+            colorama = init_colorama()
+            line = '%s%s\t%s%s' % (colorama.Fore.GREEN, message, additional_info or '',
+                                   colorama.Style.RESET_ALL)
+        self.stream.write(line + '\n')
+        self.written += 1
+
+    @property
+    def stats(self):
+        ''' dict with the counters of the log '''
+        return {
+            'received': self.received,
+            'filtered': self.filtered,
+            'dropped': self.dropped,
+            'duplicates': self.duplicates,
+            'rate_limited': self.rate_limited,
+            'written': self.written,
+            'failed': self.failed,
+            'levels': dict((logging.getLevelName(level), count) for level, count in self.levels.items()),
+        }
+
+    def close(self, timeout=None):
+        '''
+        Writes the queued records, stops the background thread and returns
+        the counters.
+        :param timeout: time in seconds to wait for the queue to be written
+        '''
+        if self.__thread.is_alive():
+            self.__queue.put(None)
+            self.__thread.join(timeout)
+        return self.stats
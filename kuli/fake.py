@@ -0,0 +1,572 @@
+""" In-process stand-in for the KULI analysis server
+
+FakeKuliServer mimics the COM interface of KuliAnalysisCtr2 closely enough to
+run KuliAnalysis and the tools built on it on machines without a KULI
+installation, e.g. to test and benchmark them on Linux:
+
+    from kuli import KuliAnalysis, fake
+
+    kuli = KuliAnalysis('13', dispatch=fake.DispatchWithEvents)
+
+The simulated model is deterministic. Sensor and output COM values only
+depend on the input COM values, the actuator values, the operating point,
+the time step and the iteration.
+"""
+import fnmatch
+import time
+import zlib
+
+from kuli.kulianalysis import KuliAnalysis
+from kuli.units import UNITS, convert as convert_unit
+
+
+class FakeModel(object):
+    """ Description of the cooling system simulated by FakeKuliServer """
+
+    def __init__(self, components=None, connectors=None, input_coms=None,
+                 output_coms=None, operating_points=3, time_steps=1,
+                 iterations=20, time_step_size=1.0):
+        '''
+        :param components: dict of component ID -> component type
+        :param connectors: dict of component type -> {"S": {connector: unit},
+        "A": {connector: unit}}
+        :param input_coms: dict of input COM ID -> (unit, default value)
+        :param output_coms: dict of output COM ID -> unit
+        :param operating_points: number of operating points
+        :param time_steps: number of time steps per operating point
+        :param iterations: number of iterations per time step
+        :param time_step_size: simulated time between two time steps in seconds
+        '''
+        self.components = components if components is not None else {
+            '1.Rad': 'Rad',
+            '1.CAC': 'CAC',
+            '1.Fan': 'Fan',
+            '1.Pump': 'Pump',
+            '1.Eng': 'Eng',
+        }
+        self.connectors = connectors if connectors is not None else {
+            'Rad': {
+                'S': {'ExitTempIM': 'K', 'EntryTempIM': 'K', 'HeatFlow': 'W',
+                      'ExitTempAir': 'K', 'PressureDropIM': 'Pa'},
+                'A': {'MassFlowIM': 'kg/s', 'EntryTempIMAct': 'K'},
+            },
+            'CAC': {
+                'S': {'ExitTempIM': 'K', 'EntryTempIM': 'K', 'HeatFlow': 'W'},
+                'A': {'MassFlowIM': 'kg/s'},
+            },
+            'Fan': {
+                'S': {'Power': 'W', 'MassFlowAir': 'kg/s'},
+                'A': {'Speed': '1/min'},
+            },
+            'Pump': {
+                'S': {'Power': 'W', 'MassFlow': 'kg/s'},
+                'A': {'Speed': '1/min'},
+            },
+            'Eng': {
+                'S': {'HeatFlowToCoolant': 'W', 'OilTemp': 'K'},
+                'A': {'Load': '-', 'Speed': '1/min'},
+            },
+        }
+        self.input_coms = input_coms if input_coms is not None else {
+            'MeanEffPressure': ('bar', 10.0),
+            'VehicleSpeed': ('km/h', 100.0),
+            'AmbientTemp': ('degC', 25.0),
+            'EngineSpeed': ('1/min', 2000.0),
+        }
+        self.output_coms = output_coms if output_coms is not None else {
+            'CoolantTemp': 'degC',
+            'FanPower': 'W',
+            'HeatRejection': 'kW',
+            'OilTemp': 'degC',
+        }
+        self.operating_points = operating_points
+        self.time_steps = time_steps
+        self.iterations = iterations
+        self.time_step_size = time_step_size
+
+    def connector_unit(self, component_type, connector_id):
+        '''
+        returns the unit of a connector or "" if the connector does not exist
+        '''
+        connectors = self.connectors.get(component_type, {})
+        for kind in ('S', 'A'):
+            unit = connectors.get(kind, {}).get(connector_id)
+            if unit is not None:
+                return unit
+        return ''
+
+
+# typical magnitude of simulated values per base unit
+LEVELS = {'K': 250.0}
+
+
+def _weight(*names):
+    ''' returns a stable pseudo random weight in [0.5, 1.5) for a tuple of names '''
+    return 0.5 + (zlib.crc32('.'.join(names).encode()) % 1000) / 1000.0
+
+
+class FakeOleObject(object):
+    """ Stand-in for the PyIDispatch object exposed as _oleobj_ """
+
+    def __init__(self, server):
+        self.__server = server
+        self.__names = []
+        self.__dispids = {}
+
+    def GetIDsOfNames(self, name):
+        self.__server.name_lookups += 1
+        dispid = self.__dispids.get(name)
+        if dispid is None:
+            if not callable(getattr(type(self.__server), name, None)):
+                raise AttributeError(name)
+            dispid = self.__dispids[name] = len(self.__names)
+            self.__names.append(name)
+        return dispid
+
+    def Invoke(self, dispid, lcid, flags, result_wanted, *args):
+        server = self.__server
+        server._bound_call = True
+        try:
+            return getattr(server, self.__names[dispid])(*args)
+        finally:
+            server._bound_call = False
+
+
+class FakeKuliServer(object):
+    """ Deterministic stand-in for KuliAnalysisCtr2 """
+
+    def __init__(self, model=None, latency=0.0, progid=''):
+        '''
+        :param model: FakeModel to simulate, a default model is used if None
+        :param latency: time in seconds every COM call takes
+        :param progid: ProgID the server was dispatched with
+        '''
+        self.model = model if model is not None else FakeModel()
+        self.latency = latency
+        self.progid = progid
+
+        # call statistics
+        self.calls = {}
+        self.name_lookups = 0
+        self._bound_call = False
+
+        # properties
+        self.ACAdjustmentMode = 0
+        self.AnalysisLogEvents = False
+        self.AnalysisLogFile = ''
+        self.BatchMode = False
+        self.KuliFileName = ''
+        self.ResultFileName = ''
+        self.WriteResults = False
+
+        self.batch_list = []
+        self._oleobj_ = FakeOleObject(self)
+        self.__reset()
+
+    def __reset(self):
+        self.initialized = False
+        self.inputs = dict((com_id, value) for com_id, (_, value) in self.model.input_coms.items())
+        self.actuators = {}
+        self.operating_point = 0
+        self.time_step = 0
+        self.iteration = 0
+        self.finished = False
+        self.next_time_step = False
+        self.cancelled = False
+
+    def __enter(self, name):
+        ''' bookkeeping every COM call goes through '''
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if not self._bound_call:
+            self.name_lookups += 1
+        if self.latency:
+            end = time.perf_counter() + self.latency
+            while time.perf_counter() < end:
+                pass
+
+    def __fire(self, event, *args):
+        handler = getattr(self, event, None)
+        if handler is not None:
+            handler(*args)
+
+    def __error(self, function_name, message, additional_info=''):
+        self.__fire('OnError', function_name, message, additional_info, 1)
+
+    ###########################################################################
+    # simulated model
+
+    def __level(self):
+        ''' common excitation of all outputs for the current state '''
+        level = self.operating_point + 0.1 * self.time_step
+        for com_id, value in self.inputs.items():
+            level += 0.01 * _weight(com_id) * value
+        for (component_id, connector_id), value in self.actuators.items():
+            level += 0.001 * _weight(component_id, connector_id) * value
+        return level
+
+    def __converged(self, base_unit, *names):
+        ''' value of an output after the current number of iterations '''
+        target = LEVELS.get(base_unit, 0.0) + 100.0 * _weight(*names) \
+            + self.__level() * _weight(*(names + ('level',)))
+        return target + 10.0 * 0.5 ** self.iteration
+
+    def __component_type(self, component_id):
+        return self.model.components.get(component_id)
+
+    ###########################################################################
+    # simulation
+
+    def __simulate(self, operating_point):
+        ''' simulates one operating point, firing the KULI events '''
+        model = self.model
+        self.operating_point = operating_point
+        for time_step in range(1, model.time_steps + 1):
+            self.time_step = time_step
+            for iteration in range(1, model.iterations + 1):
+                self.iteration = iteration
+                self.__fire('OnNextIteration', iteration)
+                self.__fire('OnCheckForCancel')
+                if self.cancelled:
+                    break
+            sim_time = time_step * model.time_step_size
+            self.__fire('OnEndOfTimeStep', time_step, sim_time)
+            self.__fire('OnNextTime', time_step, sim_time)
+            if self.cancelled:
+                break
+        self.__fire('OnEndOfOperatingPoint', operating_point)
+
+    def __run(self, operating_points):
+        if not self.initialized:
+            self.__error('RunAnalysis', 'KULI is not initialized')
+            return False
+        self.cancelled = False
+        for operating_point in operating_points:
+            self.__simulate(operating_point)
+            if self.cancelled:
+                break
+        self.finished = True
+        return True
+
+    def Initialize(self):
+        self.__enter('Initialize')
+        if not self.KuliFileName:
+            self.__error('Initialize', 'No KULI file specified')
+            return 0
+        self.__reset()
+        self.initialized = True
+        return 1
+
+    def CleanUp(self):
+        self.__enter('CleanUp')
+        self.__reset()
+        return True
+
+    def Cancel(self):
+        self.__enter('Cancel')
+        self.cancelled = True
+        return True
+
+    def RunAnalysis(self):
+        self.__enter('RunAnalysis')
+        return self.__run(range(1, self.model.operating_points + 1))
+
+    def SimulateOperatingPoint(self, operating_point):
+        self.__enter('SimulateOperatingPoint')
+        if operating_point == 0:
+            return self.__run(range(1, self.model.operating_points + 1))
+        if not 0 < operating_point <= self.model.operating_points:
+            self.__error('SimulateOperatingPoint', 'Invalid operating point', str(operating_point))
+            return False
+        return self.__run([operating_point])
+
+    def RunOptimization(self):
+        self.__enter('RunOptimization')
+        return self.__run(range(1, self.model.operating_points + 1))
+
+    def RunParameterVariation(self):
+        self.__enter('RunParameterVariation')
+        return self.__run(range(1, self.model.operating_points + 1))
+
+    def RunMonteCarlo(self, no_of_samples):
+        self.__enter('RunMonteCarlo')
+        ok = True
+        for _ in range(no_of_samples):
+            ok = self.__run(range(1, self.model.operating_points + 1)) and ok
+        return ok
+
+    def AddToBatchList(self, file_name):
+        self.__enter('AddToBatchList')
+        self.batch_list.append(file_name)
+
+    def StartAnalysis(self):
+        self.__enter('StartAnalysis')
+        if not self.initialized:
+            self.__error('StartAnalysis', 'KULI is not initialized')
+            return False
+        self.operating_point = 1
+        self.time_step = 1
+        self.iteration = 0
+        self.finished = False
+        self.next_time_step = False
+        self.cancelled = False
+        return True
+
+    def NextKULIIteration(self):
+        self.__enter('NextKULIIteration')
+        if self.finished or self.operating_point == 0:
+            return False
+        model = self.model
+        if self.next_time_step:
+            # the finished time step stays visible until the next iteration
+            self.next_time_step = False
+            if self.time_step < model.time_steps:
+                self.time_step += 1
+            else:
+                self.operating_point += 1
+                self.time_step = 1
+            self.iteration = 0
+        self.iteration += 1
+        self.__fire('OnNextIteration', self.iteration)
+        if self.iteration < model.iterations:
+            return True
+
+        sim_time = self.time_step * model.time_step_size
+        self.__fire('OnEndOfTimeStep', self.time_step, sim_time)
+        self.__fire('OnNextTime', self.time_step, sim_time)
+        if self.time_step == model.time_steps:
+            self.__fire('OnEndOfOperatingPoint', self.operating_point)
+            if self.operating_point == model.operating_points:
+                self.finished = True
+                return True
+        self.next_time_step = True
+        return True
+
+    def IsNextTimeStep(self):
+        self.__enter('IsNextTimeStep')
+        return self.next_time_step
+
+    def IsFinished(self):
+        self.__enter('IsFinished')
+        return self.finished
+
+    def ResetCurrentSimulationStep(self):
+        self.__enter('ResetCurrentSimulationStep')
+        self.finished = False
+        self.iteration = 0
+        return True
+
+    ###########################################################################
+    # model information
+
+    def GetVersionID(self):
+        self.__enter('GetVersionID')
+        return 13
+
+    def GetVersionStr(self):
+        self.__enter('GetVersionStr')
+        return '13.0 (fake)'
+
+    def ListComponents(self, filter):
+        self.__enter('ListComponents')
+        return ' '.join(component_id for component_id in self.model.components
+                        if fnmatch.fnmatchcase(component_id, filter))
+
+    def ListComponentTypes(self):
+        self.__enter('ListComponentTypes')
+        return ' '.join(sorted(set(self.model.components.values())))
+
+    def ListConnectors(self, component_type, connector_type):
+        self.__enter('ListConnectors')
+        connectors = self.model.connectors.get(component_type, {})
+        ids = []
+        for kind in 'SA':
+            if kind in connector_type:
+                ids.extend(connectors.get(kind, {}))
+        return ' '.join(ids)
+
+    def GetComponentDescription(self, component_type_id):
+        self.__enter('GetComponentDescription')
+        return component_type_id if component_type_id in self.model.connectors else ''
+
+    def GetComponentConnectorUnit(self, component_type_id, connector_id):
+        self.__enter('GetComponentConnectorUnit')
+        return self.model.connector_unit(component_type_id, connector_id)
+
+    def GetConnectorUnit(self, connector_id):
+        self.__enter('GetConnectorUnit')
+        for component_type in self.model.connectors:
+            unit = self.model.connector_unit(component_type, connector_id)
+            if unit:
+                return unit
+        return ''
+
+    def ObjectExists(self, com_object_name, in_or_out):
+        self.__enter('ObjectExists')
+        if in_or_out == 'In':
+            return com_object_name in self.model.input_coms
+        return com_object_name in self.model.output_coms
+
+    ###########################################################################
+    # COM objects
+
+    def GetCOMCodes(self, is_input_com_object):
+        self.__enter('GetCOMCodes')
+        if is_input_com_object:
+            return tuple(self.model.input_coms)
+        return tuple(self.model.output_coms)
+
+    def __com_value(self, com_id):
+        if com_id in self.inputs:
+            return self.inputs[com_id]
+        unit = self.model.output_coms.get(com_id)
+        if unit is None:
+            self.__error('GetCOMValueByID', 'Unknown COM object', com_id)
+            return 0.0
+        base_unit = UNITS[unit][0]
+        return convert_unit(self.__converged(base_unit, 'COM', com_id), base_unit, unit)
+
+    def GetCOMValueByID(self, com_id):
+        self.__enter('GetCOMValueByID')
+        return self.__com_value(com_id)
+
+    def GetCOMValueByIDAsString(self, com_id):
+        self.__enter('GetCOMValueByIDAsString')
+        return repr(self.__com_value(com_id))
+
+    def GetCOMValueByIDAsString2(self, com_id):
+        self.__enter('GetCOMValueByIDAsString2')
+        return repr(self.__com_value(com_id))
+
+    def __set_com_value(self, com_id, value):
+        if com_id not in self.inputs:
+            self.__error('SetCOMValueByID', 'Unknown input COM object', com_id)
+            return False
+        self.inputs[com_id] = float(value)
+        return True
+
+    def SetCOMValueByID(self, component_id, value):
+        self.__enter('SetCOMValueByID')
+        return self.__set_com_value(component_id, value)
+
+    def SetCOMValueByIDAsStr(self, component_id, value):
+        self.__enter('SetCOMValueByIDAsStr')
+        return self.__set_com_value(component_id, value)
+
+    def SetCOMValueByIDAsStr2(self, component_id, value):
+        self.__enter('SetCOMValueByIDAsStr2')
+        return self.__set_com_value(component_id, value)
+
+    def GetInputCOMUnitByID(self, com_id):
+        self.__enter('GetInputCOMUnitByID')
+        return self.model.input_coms.get(com_id, ('',))[0]
+
+    def GetOutputCOMUnitByID(self, com_id):
+        self.__enter('GetOutputCOMUnitByID')
+        return self.model.output_coms.get(com_id, '')
+
+    ###########################################################################
+    # sensors and actuators
+
+    def __value(self, function_name, component_id, connector_id):
+        ''' returns the value of a connector in its base unit and the unit '''
+        component_type = self.__component_type(component_id)
+        unit = self.model.connector_unit(component_type, connector_id) if component_type else ''
+        if not unit:
+            self.__error(function_name, 'Unknown connector', '%s.%s' % (component_id, connector_id))
+            return 0.0, ''
+        key = (component_id, connector_id)
+        if key in self.actuators:
+            return self.actuators[key], unit
+        return self.__converged(unit, component_id, connector_id), unit
+
+    def __set_value(self, function_name, component_id, actuator_id, value, unit=None):
+        component_type = self.__component_type(component_id)
+        actuators = self.model.connectors.get(component_type, {}).get('A', {})
+        if actuator_id not in actuators:
+            self.__error(function_name, 'Unknown actuator', '%s.%s' % (component_id, actuator_id))
+            return
+        value = float(value)
+        if unit is not None:
+            value = self.__convert(function_name, value, unit, actuators[actuator_id])
+        self.actuators[(component_id, actuator_id)] = value
+
+    def GetValue(self, component_id, connector_id):
+        self.__enter('GetValue')
+        return self.__value('GetValue', component_id, connector_id)[0]
+
+    def GetValueAsStr(self, component_id, connector_id):
+        self.__enter('GetValueAsStr')
+        return repr(self.__value('GetValueAsStr', component_id, connector_id)[0])
+
+    def __convert(self, function_name, value, from_unit, to_unit):
+        try:
+            return convert_unit(value, from_unit, to_unit)
+        except (KeyError, ValueError):
+            self.__error(function_name, 'Invalid unit', to_unit)
+            return 0.0
+
+    def GetValueUnit(self, component_id, connector_id, unit):
+        self.__enter('GetValueUnit')
+        value, base_unit = self.__value('GetValueUnit', component_id, connector_id)
+        return self.__convert('GetValueUnit', value, base_unit, unit) if base_unit else value
+
+    def GetValueUnitAsStr(self, component_id, connector_id, unit):
+        self.__enter('GetValueUnitAsStr')
+        value, base_unit = self.__value('GetValueUnitAsStr', component_id, connector_id)
+        return repr(self.__convert('GetValueUnitAsStr', value, base_unit, unit) if base_unit else value)
+
+    def SetValue(self, component_id, actuator_id, value):
+        self.__enter('SetValue')
+        self.__set_value('SetValue', component_id, actuator_id, value)
+
+    def SetValueAsStr(self, component_id, actuator_id, value):
+        self.__enter('SetValueAsStr')
+        self.__set_value('SetValueAsStr', component_id, actuator_id, value)
+
+    def SetValueUnit(self, component_id, actuator_id, unit, value):
+        self.__enter('SetValueUnit')
+        self.__set_value('SetValueUnit', component_id, actuator_id, value, unit)
+
+    def SetValueUnitAsStr(self, component_id, actuator_id, unit, value):
+        self.__enter('SetValueUnitAsStr')
+        self.__set_value('SetValueUnitAsStr', component_id, actuator_id, value, unit)
+
+
+class FakeDispatch(object):
+    """ Replacement for win32com.client.DispatchWithEvents creating fake servers """
+
+    def __init__(self, model=None, latency=0.0):
+        '''
+        :param model: FakeModel simulated by the created servers
+        :param latency: time in seconds every COM call takes
+        '''
+        self.model = model
+        self.latency = latency
+
+    def __call__(self, progid, event_handler):
+        # like DispatchWithEvents, the event handler is mixed into the server
+        # class, so events are fired as methods of the server object
+        server_class = FakeKuliServer
+        if event_handler is not None:
+            server_class = type('FakeKuliServer' + event_handler.__name__,
+                                (FakeKuliServer, event_handler), {})
+        return server_class(self.model, self.latency, progid)
+
+
+# default dispatcher using the default model without latency
+DispatchWithEvents = FakeDispatch()
+
+
+def start_kuli(kuli_file_name, model=None, latency=0.0):
+    '''
+    Counterpart of KuliAnalysisHelper.start_kuli running on a fake server.
+    :param kuli_file_name: name of the scs file, it does not need to exist
+    :param model: FakeModel to simulate
+    :param latency: time in seconds every COM call takes
+    '''
+    kuli = KuliAnalysis('13', dispatch=FakeDispatch(model, latency))
+    kuli.kuli_file_name = kuli_file_name
+    kuli.write_results = False
+    if kuli.initialize() == 0:
+        return None
+    return kuli
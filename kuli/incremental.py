@@ -0,0 +1,330 @@
+""" Incremental re-simulation of the operating points of a model
+
+simulate_operating_point(0) recomputes every operating point after any
+change. An IncrementalRun records per operating point the values of the
+input COM objects it was simulated with and the outputs it produced. On the
+next run only operating points affected by changed inputs are simulated,
+the results of the others are reused:
+
+    run = IncrementalRun(kuli, range(1, 21), outputs=['CoolantTemp'],
+                         dependencies={1: ['AmbientTemp'], 2: ['AmbientTemp', 'VehicleSpeed']})
+    result = run.run()                            # simulates all 20
+    kuli.set_com_value_by_id('VehicleSpeed', 80.0)
+    result = run.run()                            # simulates operating point 2 and 3..20
+    print(result.simulated, result.reused, result.reasons[2])
+    run.save(r'C:\\temp\\excar_incremental.npz')
+
+An operating point depends on the input COM objects listed for it in
+dependencies, or on all input COM objects if it is not listed. With
+learn=True the run also observes sensitivity: if an operating point was
+simulated after confirmations separate changes of a single input and its
+outputs and signals stayed within tolerance every time, it is treated as
+independent of that input. Changes of that input are not simulated any
+more, so a wrong conclusion goes unnoticed. Learning is therefore off by
+default; it is a heuristic for inputs that have no effect at all, e.g.
+parameters of components that are switched off in some operating points.
+
+A change of the scs file invalidates all records. If the client cannot
+read the file, pass a digest identifying the model version instead, or file
+changes go unnoticed. Reused operating points are not simulated, so the
+state of the server is not the one of them.
+"""
+import collections
+import json
+import os
+
+import numpy
+
+from kuli.connector import parse_connectors, signal_name
+from kuli.schema import model_digest
+
+
+class IncrementalResult(collections.namedtuple(
+        'IncrementalResult', 'operating_points values outputs signals simulated reused reasons')):
+    """ Results of all operating points and which of them were simulated """
+
+    __slots__ = ()
+
+    def report(self):
+        ''' returns one line per operating point saying why it was simulated or reused '''
+        return '\n'.join('%4d %-9s %s' % (operating_point,
+                                          'simulated' if operating_point in self.simulated else 'reused',
+                                          self.reasons[operating_point])
+                         for operating_point in self.operating_points)
+
+
+class IncrementalRun(object):
+    """ Simulates only the operating points affected by changed inputs """
+
+    def __init__(self, kuli, operating_points, outputs=(), signals=(), inputs=None,
+                 dependencies=None, learn=False, confirmations=3, atol=1e-9, rtol=1e-9, digest=None):
+        '''
+        :param kuli: initialized KuliAnalysis instance
+        :param operating_points: numbers of the operating points of the model
+        :param outputs: IDs of the output COM objects stored per operating point
+        :param signals: sensors stored per operating point, see KuliAnalysis.get_values
+        :param inputs: IDs of the input COM objects compared between runs,
+        defaults to all input COM objects of the model
+        :param dependencies: dict of operating point -> IDs of the input COM
+        objects it depends on, operating points not listed depend on all
+        :param learn: treat operating points as independent of inputs whose
+        change did not change their results
+        :param confirmations: unchanged results after separate changes of an
+        input needed before an operating point is treated as independent of it
+        :param atol: absolute tolerance of the results when learning
+        :param rtol: relative tolerance of the results when learning
+        :param digest: identifies the model version instead of the content of
+        the scs file, for files the client cannot read. Without it, changes of
+        a file that cannot be read go unnoticed
+        '''
+        self.kuli = kuli
+        self.operating_points = [int(operating_point) for operating_point in operating_points]
+        self.outputs = list(outputs)
+        self.signals = parse_connectors(signals)
+        self.signal_names = [signal_name(signal) for signal in self.signals]
+        self.dependencies = dict((int(operating_point), frozenset(com_ids))
+                                 for operating_point, com_ids in (dependencies or {}).items())
+        self.learn = learn
+        self.confirmations = max(1, confirmations)
+        self.atol = atol
+        self.rtol = rtol
+        self.digest = digest
+        self.simulations = 0
+        self.reuses = 0
+        self.__inputs = list(inputs) if inputs is not None else None
+        self.__model = None
+        self.__digest = None
+        # operating point -> (input values, value, outputs, signals)
+        self.__records = {}
+        # operating point -> input COM IDs observed to have no effect
+        self.__insensitive = collections.defaultdict(set)
+        # operating point -> input COM ID -> unchanged results observed
+        self.__unchanged = collections.defaultdict(collections.Counter)
+
+    @property
+    def inputs(self):
+        ''' IDs of the input COM objects compared between runs '''
+        if self.__inputs is None:
+            self.__inputs = list(self.kuli.get_com_codes(True) or ())
+        return self.__inputs
+
+    def __check_model(self):
+        ''' forgets all records if the scs file or the given digest changed '''
+        digest = self.digest
+        if digest is None:
+            file_name = self.kuli.kuli_file_name
+            try:
+                stat = os.stat(file_name)
+                model = (file_name, stat.st_size, stat.st_mtime_ns)
+                if model == self.__model:
+                    return
+                digest = model_digest(file_name)
+            except (OSError, TypeError):
+                return  # e.g. a file on the server only, no change detection
+            self.__model = model
+        if digest != self.__digest:
+            self.__records.clear()
+            self.__insensitive.clear()
+            self.__unchanged.clear()
+        self.__digest = digest
+
+    def __read_inputs(self):
+        return self.kuli.get_com_values(self.inputs, as_array=True)
+
+    def __changed(self, operating_point, inputs):
+        ''' returns the IDs of the inputs that changed since the operating point was simulated '''
+        recorded = self.__records[operating_point][0]
+        changed = numpy.flatnonzero(~((recorded == inputs) | (numpy.isnan(recorded) & numpy.isnan(inputs))))
+        return [self.inputs[position] for position in changed]
+
+    def __relevant(self, operating_point, changed):
+        ''' returns the changed inputs the operating point depends on '''
+        dependencies = self.dependencies.get(operating_point)
+        if dependencies is not None:
+            changed = [com_id for com_id in changed if com_id in dependencies]
+        if self.learn:
+            insensitive = self.__insensitive.get(operating_point, ())
+            changed = [com_id for com_id in changed if com_id not in insensitive]
+        return changed
+
+    def plan(self, operating_points=None):
+        '''
+        Returns a dict of operating point -> reason for the operating points
+        that have to be simulated with the current inputs, without simulating.
+        :param operating_points: operating points to check, defaults to all
+        '''
+        self.__check_model()
+        inputs = self.__read_inputs()
+        plan = collections.OrderedDict()
+        for operating_point in operating_points or self.operating_points:
+            if operating_point not in self.__records:
+                plan[operating_point] = 'not simulated before'
+                continue
+            relevant = self.__relevant(operating_point, self.__changed(operating_point, inputs))
+            if relevant:
+                plan[operating_point] = 'changed: ' + ', '.join(relevant)
+        return plan
+
+    def __read_results(self):
+        outputs = self.kuli.get_com_values(self.outputs, as_array=True)
+        signals = self.kuli.get_values(self.signals, as_array=True)
+        return outputs, signals
+
+    def __close(self, values, previous):
+        return (numpy.abs(values - previous) <= self.atol + self.rtol * numpy.abs(previous)).all()
+
+    def __observe(self, operating_point, changed, outputs, signals):
+        ''' updates the observed sensitivity from a simulation after a change '''
+        if not self.learn or not changed:
+            return
+        _, _, previous_outputs, previous_signals = self.__records[operating_point]
+        insensitive = self.__insensitive[operating_point]
+        if self.__close(outputs, previous_outputs) and self.__close(signals, previous_signals):
+            # with several changes at once the effects might cancel out
+            if len(changed) == 1:
+                unchanged = self.__unchanged[operating_point]
+                unchanged[changed[0]] += 1
+                if unchanged[changed[0]] >= self.confirmations:
+                    insensitive.add(changed[0])
+        else:
+            insensitive.difference_update(changed)
+            for com_id in changed:
+                self.__unchanged[operating_point].pop(com_id, None)
+
+    def run(self, force=False):
+        '''
+        Simulates the affected operating points and returns an
+        IncrementalResult with the results of all operating points.
+        :param force: simulate all operating points
+        '''
+        self.__check_model()
+        inputs = self.__read_inputs()
+        count = len(self.operating_points)
+        values = numpy.zeros(count, dtype=bool)
+        outputs = numpy.full((count, len(self.outputs)), numpy.nan)
+        signals = numpy.full((count, len(self.signals)), numpy.nan)
+        simulated, reused, reasons = [], [], {}
+
+        for row, operating_point in enumerate(self.operating_points):
+            record = self.__records.get(operating_point)
+            changed = self.__changed(operating_point, inputs) if record is not None else []
+            relevant = self.__relevant(operating_point, changed)
+            if record is not None and not relevant and not force:
+                values[row], outputs[row], signals[row] = record[1:]
+                reused.append(operating_point)
+                reasons[operating_point] = 'unchanged' if not changed \
+                    else 'independent of ' + ', '.join(changed)
+                continue
+
+            if force:
+                reasons[operating_point] = 'forced'
+            elif record is None:
+                reasons[operating_point] = 'not simulated before'
+            else:
+                reasons[operating_point] = 'changed: ' + ', '.join(relevant)
+            self.simulations += 1
+            value = bool(self.kuli.simulate_operating_point(operating_point))
+            row_outputs, row_signals = self.__read_results()
+            values[row], outputs[row], signals[row] = value, row_outputs, row_signals
+            simulated.append(operating_point)
+            if not value:
+                reasons[operating_point] += ' (failed)'
+                self.__records.pop(operating_point, None)
+                continue
+            if record is not None:
+                self.__observe(operating_point, changed, row_outputs, row_signals)
+            self.__records[operating_point] = (inputs.copy(), value, row_outputs, row_signals)
+
+        self.reuses += len(reused)
+        return IncrementalResult(list(self.operating_points), values, outputs, signals,
+                                 simulated, reused, reasons)
+
+    def invalidate(self, operating_points=None):
+        '''
+        Forgets the records of operating points, so the next run simulates them.
+        :param operating_points: operating points to forget, defaults to all
+        '''
+        if operating_points is None:
+            self.__records.clear()
+            self.__insensitive.clear()
+            self.__unchanged.clear()
+            return
+        for operating_point in operating_points:
+            self.__records.pop(operating_point, None)
+            self.__insensitive.pop(operating_point, None)
+            self.__unchanged.pop(operating_point, None)
+
+    def insensitive(self, operating_point):
+        ''' returns the input COM IDs the operating point was observed to be independent of '''
+        return sorted(self.__insensitive.get(operating_point, ()))
+
+    def save(self, file_name):
+        '''
+        Writes the records to an .npz file, so a later session can continue
+        incrementally with load.
+        '''
+        recorded = [operating_point for operating_point in self.operating_points
+                    if operating_point in self.__records]
+        records = [self.__records[operating_point] for operating_point in recorded]
+        inputs = self.inputs
+        meta = {
+            'digest': self.__digest,
+            'inputs': inputs,
+            'outputs': self.outputs,
+            'signals': self.signal_names,
+            'insensitive': dict((str(operating_point), sorted(com_ids))
+                                for operating_point, com_ids in self.__insensitive.items() if com_ids),
+            'unchanged': dict((str(operating_point), dict(counts))
+                              for operating_point, counts in self.__unchanged.items() if counts),
+        }
+        numpy.savez_compressed(
+            file_name,
+            meta=numpy.array(json.dumps(meta)),
+            operating_points=numpy.array(recorded, dtype=numpy.int64),
+            inputs=self.__table(records, 0, len(inputs)),
+            values=numpy.array([record[1] for record in records], dtype=bool),
+            outputs=self.__table(records, 2, len(self.outputs)),
+            signals=self.__table(records, 3, len(self.signals)))
+
+    @staticmethod
+    def __table(records, position, width):
+        ''' array of shape (records, width) of one item of the records, also for width 0 '''
+        table = numpy.empty((len(records), width))
+        for row, record in enumerate(records):
+            table[row] = record[position]
+        return table
+
+    def load(self, file_name):
+        '''
+        Reads records written by save. Records of another scs file are
+        dropped on the next run.
+        '''
+        with numpy.load(file_name) as data:
+            meta = json.loads(data['meta'].item())
+            if meta['outputs'] != self.outputs or meta['signals'] != self.signal_names:
+                raise ValueError('%s holds records of other outputs or signals' % file_name)
+            if self.__inputs is not None and meta['inputs'] != self.__inputs:
+                raise ValueError('%s holds records of other inputs' % file_name)
+            self.__inputs = meta['inputs']
+            self.__records = dict(
+                (int(operating_point), (inputs, bool(value), outputs, signals))
+                for operating_point, inputs, value, outputs, signals
+                in zip(data['operating_points'], data['inputs'], data['values'], data['outputs'], data['signals']))
+        self.__insensitive = collections.defaultdict(set, (
+            (int(operating_point), set(com_ids)) for operating_point, com_ids in meta['insensitive'].items()))
+        self.__unchanged = collections.defaultdict(collections.Counter, (
+            (int(operating_point), collections.Counter(counts))
+            for operating_point, counts in meta.get('unchanged', {}).items()))
+        self.__digest = meta['digest']
+        self.__model = None
+
+    @property
+    def stats(self):
+        ''' dict with the numbers of simulated and reused operating points '''
+        total = self.simulations + self.reuses
+        return {
+            'simulations': self.simulations,
+            'reuses': self.reuses,
+            'reuse_rate': self.reuses / total if total else 0.0,
+            'records': len(self.__records),
+        }
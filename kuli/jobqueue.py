@@ -0,0 +1,769 @@
+""" Job queue distributing KULI runs to worker agents on several hosts
+
+A Coordinator submits JobSpecs to a transport, WorkerAgents on the
+simulation hosts claim them, run them on warm instances of an InstancePool
+and push the results back:
+
+    transport = SQLiteTransport(r'\\\\fileserver\\kuli\\jobs.sqlite')
+
+    # coordinator
+    coordinator = Coordinator(transport)
+    job_ids = [coordinator.submit(JobSpec(r'\\\\fileserver\\models\\ExCAR_COM.scs',
+                                          inputs={'AmbientTemp': temp},
+                                          operating_points=[1, 2],
+                                          outputs=['CoolantTemp'],
+                                          signals=['1.Rad.ExitTempIM']))
+               for temp in (20.0, 30.0, 40.0)]
+    for result in coordinator.wait(job_ids):
+        print(result.job_id, result.status, result.outputs)
+    print(coordinator.metrics)
+
+    # on every simulation host
+    WorkerAgent(transport).run()
+
+Jobs with higher priority are claimed first, jobs of equal priority in the
+order they were submitted. A claimed job is leased to its worker, which
+renews the lease while the job runs. Failed jobs and jobs whose lease ran
+out, e.g. because the host crashed, are queued again until max_retries is
+used up, so a job may run more than once. FileTransport keeps the queue in
+a directory instead of a database. Pass factory=kuli.fake.start_kuli to the
+InstancePool of the workers to run the queue without a KULI server.
+"""
+import abc
+import collections
+import contextlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import urllib.parse
+import uuid
+
+from kuli.connector import parse_connectors, signal_name
+
+# states of a job
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+STATES = (PENDING, RUNNING, DONE, FAILED, CANCELLED)
+FINISHED = (DONE, FAILED, CANCELLED)
+# directory of FileTransport marking the job IDs in use
+SUBMITTED = 'submitted'
+
+
+class JobSpec(collections.namedtuple(
+        'JobSpec', 'kuli_file_name inputs operating_points outputs signals priority max_retries')):
+    """ A model, its input COM values, the operating points to simulate and what to collect """
+
+    __slots__ = ()
+
+    def __new__(cls, kuli_file_name, inputs=None, operating_points=(1,), outputs=(), signals=(),
+                priority=0, max_retries=2):
+        '''
+        :param kuli_file_name: name of the scs file as seen by the workers
+        :param inputs: dict of input COM ID -> value set before simulating
+        :param operating_points: operating points simulated one by one
+        :param outputs: IDs of the output COM objects read after every operating point
+        :param signals: sensors read after every operating point, see KuliAnalysis.get_values
+        :param priority: jobs with higher priority are run first
+        :param max_retries: how often a failed job is queued again
+        '''
+        return super(JobSpec, cls).__new__(
+            cls, kuli_file_name, dict(inputs or {}), [int(point) for point in operating_points],
+            list(outputs), [signal_name(signal) for signal in signals], int(priority), int(max_retries))
+
+    def to_json(self):
+        return json.dumps(self._asdict())
+
+    @classmethod
+    def from_json(cls, text):
+        return cls(**json.loads(text))
+
+
+class JobResult(collections.namedtuple(
+        'JobResult', 'job_id status values outputs signals error worker attempts duration')):
+    """ Return values, outputs and signals per operating point of a job """
+
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        ''' True if the job finished successfully '''
+        return self.status == DONE
+
+
+###########################################################################
+# transports
+
+class Transport(abc.ABC):
+    """
+    Storage of the queue shared by coordinator and workers. Jobs are dicts
+    with the keys id, status, priority, spec, attempts, max_attempts,
+    worker, lease_until, submitted, started, finished, result and error.
+    """
+
+    @abc.abstractmethod
+    def submit(self, job_id, spec):
+        ''' adds a pending JobSpec, raises ValueError if the job ID is taken '''
+
+    @abc.abstractmethod
+    def claim(self, worker, lease):
+        '''
+        Marks the pending job of highest priority as running on the worker
+        for lease seconds and returns (job ID, JobSpec, attempt), or None if
+        no job is pending.
+        '''
+
+    @abc.abstractmethod
+    def renew(self, job_id, worker, lease):
+        ''' extends the lease of a running job, returns False if the worker lost it '''
+
+    @abc.abstractmethod
+    def complete(self, job_id, worker, result):
+        ''' stores the result dict of a job and marks it done '''
+
+    @abc.abstractmethod
+    def fail(self, job_id, worker, error):
+        ''' queues a failed job again or marks it failed once its attempts are used up '''
+
+    @abc.abstractmethod
+    def requeue_expired(self):
+        ''' handles running jobs whose lease ran out like failed ones, returns their number '''
+
+    @abc.abstractmethod
+    def cancel(self, job_id):
+        ''' cancels a pending job, returns False if it was claimed already '''
+
+    @abc.abstractmethod
+    def get(self, job_id):
+        ''' returns the job dict or None '''
+
+    @abc.abstractmethod
+    def jobs(self):
+        ''' returns the job dicts of all jobs without spec and result '''
+
+
+class SQLiteTransport(Transport):
+    """ Queue in one SQLite database, safe for several processes """
+
+    def __init__(self, file_name, timeout=30.0, journal_mode='WAL'):
+        '''
+        :param file_name: name of the database file, created if missing
+        :param timeout: seconds to wait for a lock held by another process
+        :param journal_mode: SQLite journal mode, WAL only works for
+        processes on one host, use DELETE for a database on a network share
+        '''
+        self.file_name = file_name
+        self.timeout = timeout
+        self.journal_mode = journal_mode
+        self.__local = threading.local()
+        with self.__transaction() as connection:
+            connection.execute('''CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY, status TEXT NOT NULL, priority INTEGER NOT NULL,
+                spec TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL, worker TEXT, lease_until REAL,
+                submitted REAL NOT NULL, started REAL, finished REAL,
+                result TEXT, error TEXT)''')
+            connection.execute('CREATE INDEX IF NOT EXISTS pending_jobs ON jobs (status, priority DESC, submitted)')
+
+    def __connection(self):
+        # sqlite3 connections must not be shared between threads
+        connection = getattr(self.__local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.file_name, timeout=self.timeout, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA journal_mode=%s' % self.journal_mode)
+            self.__local.connection = connection
+        return connection
+
+    @contextlib.contextmanager
+    def __transaction(self):
+        ''' takes the write lock of the database for the block '''
+        connection = self.__connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def submit(self, job_id, spec):
+        try:
+            with self.__transaction() as connection:
+                connection.execute(
+                    'INSERT INTO jobs (id, status, priority, spec, max_attempts, submitted) VALUES (?, ?, ?, ?, ?, ?)',
+                    (job_id, PENDING, spec.priority, spec.to_json(), spec.max_retries + 1, time.time()))
+        except sqlite3.IntegrityError:
+            raise ValueError('job %s was submitted already' % job_id)
+
+    def claim(self, worker, lease):
+        with self.__transaction() as connection:
+            row = connection.execute(
+                'SELECT id, spec, attempts FROM jobs WHERE status = ? ORDER BY priority DESC, submitted LIMIT 1',
+                (PENDING,)).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            connection.execute(
+                'UPDATE jobs SET status = ?, worker = ?, lease_until = ?, started = ?, attempts = attempts + 1 '
+                'WHERE id = ?', (RUNNING, worker, now + lease, now, row['id']))
+        return row['id'], JobSpec.from_json(row['spec']), row['attempts'] + 1
+
+    def renew(self, job_id, worker, lease):
+        with self.__transaction() as connection:
+            cursor = connection.execute(
+                'UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = ?',
+                (time.time() + lease, job_id, worker, RUNNING))
+            return cursor.rowcount == 1
+
+    def complete(self, job_id, worker, result):
+        with self.__transaction() as connection:
+            connection.execute(
+                'UPDATE jobs SET status = ?, result = ?, error = NULL, finished = ?, worker = ? '
+                'WHERE id = ? AND status != ?',
+                (DONE, json.dumps(result), time.time(), worker, job_id, CANCELLED))
+
+    def __retry_or_fail(self, connection, where, arguments, error):
+        now = time.time()
+        connection.execute(
+            'UPDATE jobs SET status = CASE WHEN attempts < max_attempts THEN ? ELSE ? END, error = ?, '
+            'lease_until = NULL, finished = CASE WHEN attempts < max_attempts THEN NULL ELSE ? END '
+            'WHERE ' + where, (PENDING, FAILED, error, now) + arguments)
+
+    def fail(self, job_id, worker, error):
+        with self.__transaction() as connection:
+            self.__retry_or_fail(connection, 'id = ? AND worker = ? AND status = ?', (job_id, worker, RUNNING), error)
+
+    def requeue_expired(self):
+        with self.__transaction() as connection:
+            count = connection.execute('SELECT COUNT(*) FROM jobs WHERE status = ? AND lease_until < ?',
+                                       (RUNNING, time.time())).fetchone()[0]
+            if count:
+                self.__retry_or_fail(connection, 'status = ? AND lease_until < ?', (RUNNING, time.time()),
+                                     'lease expired')
+        return count
+
+    def cancel(self, job_id):
+        with self.__transaction() as connection:
+            cursor = connection.execute('UPDATE jobs SET status = ?, finished = ? WHERE id = ? AND status = ?',
+                                        (CANCELLED, time.time(), job_id, PENDING))
+            return cursor.rowcount == 1
+
+    def get(self, job_id):
+        row = self.__connection().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['spec'] = JobSpec.from_json(job['spec'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def jobs(self):
+        rows = self.__connection().execute(
+            'SELECT id, status, priority, attempts, max_attempts, worker, lease_until, submitted, started, '
+            'finished, error FROM jobs')
+        return [dict(row) for row in rows]
+
+    def close(self):
+        ''' closes the connection of the calling thread '''
+        connection = getattr(self.__local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self.__local.connection = None
+
+
+class FileTransport(Transport):
+    """
+    Queue of JSON files in one directory per state. Jobs are claimed by
+    renaming their file, which is atomic on local and SMB file systems. A
+    job is moved on by renaming its file to a claim of its own first, so a
+    worker and the callers of requeue_expired never handle it twice.
+    """
+
+    def __init__(self, directory, claim_timeout=60.0):
+        '''
+        :param directory: directory of the queue, created if missing
+        :param claim_timeout: seconds after which a claim that was never
+        finished, e.g. because the process died while moving the job, is
+        handled like a job whose lease ran out
+        '''
+        self.directory = directory
+        self.claim_timeout = claim_timeout
+        for state in STATES + (SUBMITTED,):
+            os.makedirs(os.path.join(directory, state), exist_ok=True)
+
+    def __path(self, state, name):
+        return os.path.join(self.directory, state, name)
+
+    @staticmethod
+    def __file_id(job_id):
+        # escaped, so names split unambiguously at dashes and dots
+        return urllib.parse.quote(job_id, safe='').replace('.', '%2E').replace('-', '%2D')
+
+    @classmethod
+    def __pending_name(cls, job):
+        # sorting the names orders by priority, then by submission
+        return '%011d-%020d-%s.json' % (2 ** 31 - job['priority'], int(job['submitted'] * 1e6),
+                                        cls.__file_id(job['id']))
+
+    def __job_path(self, state, job_id):
+        return self.__path(state, self.__file_id(job_id) + '.json')
+
+    def __claim_path(self, file_id):
+        # the time of the claim is part of the name, see requeue_expired
+        return self.__path(RUNNING, '%s.json.%d.%s.claim' % (file_id, int(time.time() * 1e6), uuid.uuid4().hex))
+
+    def __read(self, path):
+        with open(path) as job_file:
+            return json.load(job_file)
+
+    def __write(self, path, job):
+        tmp_name = '%s.%d.%d.tmp' % (path, os.getpid(), threading.get_ident())
+        with open(tmp_name, 'w') as job_file:
+            json.dump(job, job_file)
+        os.replace(tmp_name, path)
+
+    def __find_pending(self, job_id):
+        file_id = self.__file_id(job_id)
+        for name in os.listdir(os.path.join(self.directory, PENDING)):
+            if name.endswith('.json') and name[:-5].split('-', 2)[2] == file_id:
+                return self.__path(PENDING, name)
+        return None
+
+    def submit(self, job_id, spec):
+        try:
+            open(self.__path(SUBMITTED, self.__file_id(job_id)), 'x').close()
+        except FileExistsError:
+            raise ValueError('job %s was submitted already' % job_id)
+        job = {
+            'id': job_id, 'status': PENDING, 'priority': spec.priority, 'spec': spec._asdict(),
+            'attempts': 0, 'max_attempts': spec.max_retries + 1, 'worker': None, 'lease_until': None,
+            'submitted': time.time(), 'started': None, 'finished': None, 'result': None, 'error': None,
+        }
+        self.__write(self.__path(PENDING, self.__pending_name(job)), job)
+
+    def claim(self, worker, lease):
+        for name in sorted(name for name in os.listdir(os.path.join(self.directory, PENDING))
+                           if name.endswith('.json')):
+            claimed = self.__claim_path(name[:-5].split('-', 2)[2])
+            try:
+                os.rename(self.__path(PENDING, name), claimed)
+            except OSError:
+                continue  # claimed by another worker
+            job = self.__read(claimed)
+            now = time.time()
+            job.update(status=RUNNING, worker=worker, lease_until=now + lease, started=now,
+                       attempts=job['attempts'] + 1)
+            self.__put_back(claimed, job)
+            return job['id'], JobSpec(**job['spec']), job['attempts']
+        return None
+
+    def __take(self, job_id):
+        '''
+        Renames the running file of the job to a claim, so that only one
+        caller moves the job on. Returns (claimed path, job), or (None, None)
+        if the file is gone, i.e. handled by someone else.
+        '''
+        file_id = self.__file_id(job_id)
+        claimed = self.__claim_path(file_id)
+        try:
+            os.rename(self.__path(RUNNING, file_id + '.json'), claimed)
+        except OSError:
+            return None, None
+        return claimed, self.__read(claimed)
+
+    def __put_back(self, claimed, job):
+        ''' makes a claimed job running with the given content '''
+        self.__write(claimed, job)
+        os.replace(claimed, self.__job_path(RUNNING, job['id']))
+
+    def renew(self, job_id, worker, lease):
+        for _ in range(3):
+            claimed, job = self.__take(job_id)
+            if claimed is not None:
+                break
+            time.sleep(0.01)  # requeue_expired may hold it for a moment
+        else:
+            return False
+        if job['worker'] == worker:
+            job['lease_until'] = time.time() + lease
+        self.__put_back(claimed, job)
+        return job['worker'] == worker
+
+    def complete(self, job_id, worker, result):
+        claimed, job = self.__take(job_id)
+        if job is None:
+            # the lease ran out and the job was queued again, the result is kept anyway
+            pending = self.__find_pending(job_id)
+            if pending is None:
+                return
+            claimed = self.__claim_path(self.__file_id(job_id))
+            try:
+                os.rename(pending, claimed)
+            except OSError:
+                return  # claimed or cancelled meanwhile
+            job = self.__read(claimed)
+        job.update(status=DONE, result=result, error=None, finished=time.time(), worker=worker)
+        self.__write(self.__job_path(DONE, job_id), job)
+        os.remove(claimed)
+
+    def __retry_or_fail(self, claimed, job, error):
+        job.update(error=error, lease_until=None)
+        if job['attempts'] < job['max_attempts']:
+            job['status'] = PENDING
+            target = self.__path(PENDING, self.__pending_name(job))
+        else:
+            job.update(status=FAILED, finished=time.time())
+            target = self.__job_path(FAILED, job['id'])
+        self.__write(target, job)
+        os.remove(claimed)
+
+    def fail(self, job_id, worker, error):
+        claimed, job = self.__take(job_id)
+        if job is None:
+            return
+        if job['worker'] != worker:
+            self.__put_back(claimed, job)  # queued again and claimed by another worker
+            return
+        self.__retry_or_fail(claimed, job, error)
+
+    def __expired(self, path, job, now):
+        if job['lease_until'] is None:
+            # written by an older version or damaged, the file time stands in for the lease
+            return os.path.getmtime(path) + self.claim_timeout < now
+        return job['lease_until'] < now
+
+    def requeue_expired(self):
+        count = 0
+        now = time.time()
+        for name in os.listdir(os.path.join(self.directory, RUNNING)):
+            path = self.__path(RUNNING, name)
+            if name.endswith('.claim'):
+                # file ID, "json", time of the claim, unique part, "claim"
+                file_id, _, claimed_at, _, _ = name.split('.')
+                if int(claimed_at) / 1e6 + self.claim_timeout >= now:
+                    continue
+                claimed = self.__claim_path(file_id)
+                try:
+                    os.rename(path, claimed)
+                except OSError:
+                    continue  # finished or handled by another caller
+                self.__retry_or_fail(claimed, self.__read(claimed), 'claim abandoned')
+                count += 1
+                continue
+            if not name.endswith('.json'):
+                continue
+            try:
+                job = self.__read(path)
+                if not self.__expired(path, job, now):
+                    continue
+            except (OSError, ValueError):
+                continue  # moved meanwhile
+            claimed, job = self.__take(job['id'])
+            if job is None:
+                continue  # handled by another caller
+            if job['lease_until'] is not None and job['lease_until'] >= now:
+                self.__put_back(claimed, job)  # renewed meanwhile
+                continue
+            self.__retry_or_fail(claimed, job, 'lease expired')
+            count += 1
+        return count
+
+    def cancel(self, job_id):
+        pending = self.__find_pending(job_id)
+        if pending is None:
+            return False
+        cancelled = self.__job_path(CANCELLED, job_id)
+        try:
+            os.rename(pending, cancelled)
+        except OSError:
+            return False
+        job = self.__read(cancelled)
+        job.update(status=CANCELLED, finished=time.time())
+        self.__write(cancelled, job)
+        return True
+
+    def __lookup(self, job_id):
+        for state in (DONE, RUNNING, FAILED, CANCELLED):
+            try:
+                return self.__read(self.__job_path(state, job_id))
+            except (OSError, ValueError):
+                continue
+        prefix = self.__file_id(job_id) + '.json.'
+        paths = [self.__find_pending(job_id)] + [
+            self.__path(RUNNING, name) for name in os.listdir(os.path.join(self.directory, RUNNING))
+            if name.startswith(prefix) and name.endswith('.claim')]
+        for path in paths:
+            if path is not None:
+                try:
+                    return self.__read(path)
+                except (OSError, ValueError):
+                    continue
+        return None
+
+    def get(self, job_id):
+        # the file may move to another state between the lookups, look twice
+        job = self.__lookup(job_id) or self.__lookup(job_id)
+        if job is None:
+            return None
+        job['spec'] = JobSpec(**job['spec'])
+        return job
+
+    def jobs(self):
+        jobs = []
+        for state in STATES:
+            path = os.path.join(self.directory, state)
+            for name in os.listdir(path):
+                if not name.endswith('.json'):
+                    continue
+                try:
+                    job = self.__read(os.path.join(path, name))
+                except (OSError, ValueError):
+                    continue  # moved meanwhile
+                del job['spec'], job['result']
+                jobs.append(job)
+        return jobs
+
+
+###########################################################################
+# coordinator and workers
+
+def _job_result(job):
+    result = job['result'] or {}
+    return JobResult(job['id'], job['status'], result.get('values'), result.get('outputs'),
+                     result.get('signals'), job['error'], job['worker'], job['attempts'], result.get('duration'))
+
+
+class Coordinator(object):
+    """ Submits jobs to a transport and collects their results """
+
+    def __init__(self, transport, poll_interval=1.0):
+        '''
+        :param transport: SQLiteTransport, FileTransport or another Transport
+        :param poll_interval: seconds between checks while waiting for results
+        '''
+        self.transport = transport
+        self.poll_interval = poll_interval
+
+    def submit(self, spec, job_id=None):
+        '''
+        Queues a JobSpec and returns its job ID.
+        :param job_id: ID of the job, defaults to a random one, raises
+        ValueError if it was submitted already
+        '''
+        job_id = job_id or uuid.uuid4().hex
+        self.transport.submit(job_id, spec)
+        return job_id
+
+    def submit_many(self, specs):
+        ''' queues several JobSpecs and returns their job IDs '''
+        return [self.submit(spec) for spec in specs]
+
+    def cancel(self, job_id):
+        ''' cancels a job that was not claimed yet '''
+        return self.transport.cancel(job_id)
+
+    def status(self, job_id):
+        ''' returns the state of a job or None for unknown IDs '''
+        job = self.transport.get(job_id)
+        return job['status'] if job is not None else None
+
+    def result(self, job_id, timeout=None):
+        '''
+        Waits until a job is finished and returns its JobResult.
+        :param timeout: maximum time to wait in seconds
+        '''
+        return next(self.wait([job_id], timeout))
+
+    def wait(self, job_ids, timeout=None):
+        '''
+        Generator yielding the JobResults of the jobs in the order they
+        finish. Jobs whose lease ran out are queued again meanwhile.
+        :param timeout: maximum time to wait in seconds
+        '''
+        deadline = None if timeout is None else time.monotonic() + timeout
+        waiting = list(job_ids)
+        while waiting:
+            self.transport.requeue_expired()
+            for job_id in list(waiting):
+                job = self.transport.get(job_id)
+                if job is None:
+                    raise KeyError('unknown job %s' % job_id)
+                if job['status'] in FINISHED:
+                    waiting.remove(job_id)
+                    yield _job_result(job)
+            if waiting:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise TimeoutError('%d jobs did not finish in time' % len(waiting))
+                time.sleep(self.poll_interval)
+
+    def requeue_expired(self):
+        ''' queues jobs of crashed workers again, returns their number '''
+        return self.transport.requeue_expired()
+
+    @property
+    def metrics(self):
+        '''
+        dict with the number of jobs per state, retries, throughput and mean
+        queue and run times of the finished jobs
+        '''
+        jobs = self.transport.jobs()
+        counts = dict((state, 0) for state in STATES)
+        for job in jobs:
+            counts[job['status']] += 1
+        done = [job for job in jobs if job['status'] == DONE]
+        waits = [job['started'] - job['submitted'] for job in done if job['started'] is not None]
+        runs = [job['finished'] - job['started'] for job in done if job['started'] is not None]
+        span = 0.0
+        if done:
+            span = max(job['finished'] for job in done) - min(job['submitted'] for job in jobs)
+        metrics = {
+            'jobs': len(jobs),
+            'retries': sum(max(0, job['attempts'] - 1) for job in jobs),
+            'throughput': len(done) / span if span > 0 else 0.0,
+            'mean_queue_time': sum(waits) / len(waits) if waits else 0.0,
+            'mean_run_time': sum(runs) / len(runs) if runs else 0.0,
+            'workers': len(set(job['worker'] for job in jobs if job['status'] == RUNNING)),
+        }
+        metrics.update(counts)
+        return metrics
+
+
+class WorkerAgent(object):
+    """ Claims jobs from a transport and runs them on warm KULI instances """
+
+    def __init__(self, transport, pool=None, worker_id=None, lease=300.0, poll_interval=1.0):
+        '''
+        :param transport: SQLiteTransport, FileTransport or another Transport
+        :param pool: InstancePool the instances are taken from, defaults to
+        a pool starting KULI with KuliAnalysisHelper.start_kuli
+        :param worker_id: name of the worker, defaults to host name and process ID
+        :param lease: seconds a claimed job stays with the worker without
+        renewal, it is renewed every third of it while the job runs
+        :param poll_interval: seconds between checks of an empty queue
+        '''
+        if pool is None:
+            from kuli.warmpool import InstancePool
+            pool = InstancePool()
+        self.transport = transport
+        self.pool = pool
+        self.worker_id = worker_id or '%s:%d' % (socket.gethostname(), os.getpid())
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.completed = 0
+        self.failed = 0
+        self.busy_time = 0.0
+        self.__started = time.monotonic()
+        self.__stop = threading.Event()
+        # scs file -> input COM values of a fresh instance
+        self.__defaults = {}
+
+    def stop(self):
+        ''' lets run return after the current job '''
+        self.__stop.set()
+
+    def __prepare(self, kuli, spec):
+        '''
+        Sets the input COM objects of the job. An instance reused without
+        initialize, e.g. by a pool with reset="step", still has the inputs of
+        the previous job, so all inputs the job does not set are restored to
+        the values found in the first instance of the file.
+        '''
+        if spec.kuli_file_name not in self.__defaults:
+            com_ids = list(kuli.get_com_codes(True) or ())
+            self.__defaults[spec.kuli_file_name] = dict(zip(com_ids, kuli.get_com_values(com_ids)))
+        values = dict(self.__defaults[spec.kuli_file_name])
+        values.update(spec.inputs)
+        if not all(kuli.set_com_values(values.items())):
+            raise RuntimeError('input COM objects could not be set: %r' % (spec.inputs,))
+
+    def execute(self, spec):
+        '''
+        Runs a JobSpec and returns the result dict pushed to the transport.
+        Raises if KULI fails.
+        '''
+        start = time.perf_counter()
+        signals = parse_connectors(spec.signals)
+        values, outputs, signal_values = [], [], []
+        with self.pool.instance(spec.kuli_file_name) as kuli:
+            self.__prepare(kuli, spec)
+            for operating_point in spec.operating_points:
+                value = kuli.simulate_operating_point(operating_point)
+                if not value:
+                    raise RuntimeError('operating point %d failed' % operating_point)
+                values.append(value)
+                outputs.append(kuli.get_com_values(spec.outputs))
+                signal_values.append(kuli.get_values(signals))
+        return {'values': values, 'outputs': outputs, 'signals': signal_values,
+                'duration': time.perf_counter() - start}
+
+    def __renew(self, job_id, done):
+        while not done.wait(self.lease / 3.0):
+            if not self.transport.renew(job_id, self.worker_id, self.lease):
+                return
+
+    def run_once(self):
+        '''
+        Claims and runs one job. Returns its ID, or None if no job was pending.
+        '''
+        claimed = self.transport.claim(self.worker_id, self.lease)
+        if claimed is None:
+            return None
+        job_id, spec, attempt = claimed
+        done = threading.Event()
+        renewer = threading.Thread(target=self.__renew, args=(job_id, done), daemon=True)
+        renewer.start()
+        start = time.monotonic()
+        try:
+            result = self.execute(spec)
+        except Exception:
+            self.failed += 1
+            self.transport.fail(job_id, self.worker_id, traceback.format_exc())
+        else:
+            self.completed += 1
+            self.transport.complete(job_id, self.worker_id, result)
+        finally:
+            done.set()
+            renewer.join()
+            self.busy_time += time.monotonic() - start
+        return job_id
+
+    def run(self, max_jobs=None, idle_timeout=None):
+        '''
+        Runs jobs until stop is called.
+        :param max_jobs: return after this number of jobs
+        :param idle_timeout: return after the queue was empty this long in seconds
+        '''
+        self.__stop.clear()
+        jobs = 0
+        idle_since = time.monotonic()
+        while not self.__stop.is_set() and (max_jobs is None or jobs < max_jobs):
+            self.transport.requeue_expired()
+            if self.run_once() is not None:
+                jobs += 1
+                idle_since = time.monotonic()
+                continue
+            if idle_timeout is not None and time.monotonic() - idle_since >= idle_timeout:
+                break
+            self.__stop.wait(self.poll_interval)
+        return jobs
+
+    @property
+    def metrics(self):
+        ''' dict with the jobs run, throughput, utilization and the metrics of the pool '''
+        elapsed = time.monotonic() - self.__started
+        jobs = self.completed + self.failed
+        return {
+            'worker': self.worker_id,
+            'completed': self.completed,
+            'failed': self.failed,
+            'throughput': jobs / elapsed if elapsed > 0 else 0.0,
+            'utilization': self.busy_time / elapsed if elapsed > 0 else 0.0,
+            'pool': self.pool.metrics,
+        }
@@ -0,0 +1,990 @@
+""" KULI Analysis simulation interface
+
+win32com and colorama are imported on first use, and the COM server is
+dispatched on the first call that needs it, so importing this module and
+creating a KuliAnalysis instance are cheap.
+"""
+import functools
+import re
+
+from kuli.connector import ConnectorRef, parse_connector
+
+# pythoncom.DISPATCH_METHOD
+DISPATCH_METHOD = 1
+
+
+@functools.lru_cache(maxsize=None)
+def init_colorama():
+    '''
+    Returns the colorama module, imported and initialized on first use.
+    '''
+    import colorama
+    colorama.init()
+    return colorama
+
+
+def _win32com_client():
+    try:
+        import win32com.client
+    except ImportError:  # no KULI server on this machine, only fake backends work
+        raise ImportError('win32com is required to dispatch the KULI server')
+    return win32com.client
+
+
+def _dispatch(progid, event_handler):
+    ''' starts a new KULI server '''
+    return _win32com_client().DispatchWithEvents(progid, event_handler)
+
+
+def _connect(progid, event_handler):
+    ''' connects to a KULI server that is already running '''
+    client = _win32com_client()
+    return client.DispatchWithEvents(client.GetActiveObject(progid), event_handler)
+
+
+def _bind_com_method(server, name):
+    '''
+    Returns a callable for the COM method with the specified name. The dispatch
+    ID is resolved once, so calling the result skips the name lookup.
+    :param server: dispatched COM object
+    :param name: name of the COM method
+    '''
+    oleobj = getattr(server, '_oleobj_', None)
+    if oleobj is None:
+        return getattr(server, name)
+    dispid = oleobj.GetIDsOfNames(name)
+    return functools.partial(oleobj.Invoke, dispid, 0, DISPATCH_METHOD, True)
+
+
+# default of the optional arguments of the set_value methods, None is a valid COM argument
+_MISSING = object()
+
+
+def _check_actuator_args(function_name, component_id, actuator_id, *rest):
+    '''
+    Raises TypeError unless a set_value method got a ConnectorRef and a
+    value or the full argument list.
+    '''
+    if type(component_id) is ConnectorRef:
+        if actuator_id is _MISSING or any(arg is not _MISSING for arg in rest):
+            raise TypeError('%s() takes a ConnectorRef and a value' % function_name)
+    elif actuator_id is _MISSING or any(arg is _MISSING for arg in rest):
+        raise TypeError('%s() takes a component ID, an actuator ID%s and a value'
+                        % (function_name, ', a unit' if len(rest) == 2 else ''))
+
+
+def _split_signal(signal):
+    '''
+    Returns the component ID and connector ID of a signal.
+    :param signal: a ConnectorRef, a (component_id, connector_id) pair or a
+    string like "1.Rad.ExitTempIM[K]"
+    '''
+    if type(signal) is ConnectorRef:
+        return signal.component_id, signal.connector_id
+    if isinstance(signal, str):
+        signal = parse_connector(signal)
+        return signal.component_id, signal.connector_id
+    return signal
+
+
+# names of the events fired by KULI
+EVENTS = ('OnCheckForCancel', 'OnEndOfOperatingPoint', 'OnEndOfTimeStep', 'OnError',
+          'OnMessage', 'OnNextIteration', 'OnNextTime')
+
+
+class _EventListeners(dict):
+    """ event name -> tuple of listeners, plus an optional event profiler """
+
+    profiler = None
+
+
+class _WriteBuffer(object):
+    """ Last values sent to actuators and COM objects and the writes not sent yet """
+
+    def __init__(self):
+        # target -> (method, unit, value) last sent to KULI
+        self.written = {}
+        # target -> (method, args, (method, unit, value)) waiting for the next flush
+        self.pending = {}
+        self.writes = 0
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.flushes = 0
+
+    def put(self, target, method, args, state):
+        '''
+        Buffers a write unless it repeats the value last sent.
+        :param target: ("A", component ID, actuator ID) or ("COM", COM ID)
+        :param method: name of the COM method sending the value
+        :param args: arguments of the COM method
+        :param state: (method, unit, value) compared with the last write
+        '''
+        self.writes += 1
+        pending = self.pending
+        if target in pending:
+            self.coalesced += 1
+            if self.written.get(target) == state:
+                del pending[target]
+            else:
+                pending[target] = (method, args, state)
+        elif self.written.get(target) == state:
+            self.dropped += 1
+        else:
+            pending[target] = (method, args, state)
+
+    def discard(self, target):
+        ''' forgets a target written around the buffer '''
+        self.pending.pop(target, None)
+        self.written.pop(target, None)
+
+    def stats(self):
+        return {
+            'writes': self.writes,
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'avoided': self.dropped + self.coalesced,
+            'failed': self.failed,
+            'flushes': self.flushes,
+            'pending': len(self.pending),
+        }
+
+
+def _event_handler_with_listeners(event_handler, listeners):
+    '''
+    Returns a subclass of the event handler that also calls the listeners
+    registered for an event.
+    :param event_handler: event handler class, e.g. KuliEvents
+    :param listeners: _EventListeners of the KuliAnalysis instance
+    '''
+    def forward(name):
+        handler = getattr(event_handler, name, None)
+        def dispatch(self, args):
+            if handler is not None:
+                handler(self, *args)
+            for listener in listeners.get(name, ()):
+                listener(*args)
+        def event(self, *args):
+            profiler = listeners.profiler
+            if profiler is not None:
+                return profiler.profile_event(name, dispatch, self, args)
+            dispatch(self, args)
+        event.__name__ = name
+        return event
+
+    return type(event_handler.__name__, (event_handler,),
+                dict((name, forward(name)) for name in EVENTS))
+
+
+class KuliEvents(object):
+    """ KuliEvents """
+
+    # kuli.eventlog.EventLog receiving messages and errors instead of printing
+    # them in the callback, see EventLog.event_handler
+    event_log = None
+
+    def OnCheckForCancel(self):
+        '''
+        Event if fired if the user may interrupt the analysis. To interrupt, call
+        Cancel() within this event.
+        '''
+        pass
+
+    def OnEndOfOperatingPoint(self, operating_point):
+        '''
+        Event if fired at the end of each operating point.
+        :param operating_point: the operting point number.
+        '''
+        pass
+
+    def OnEndOfTimeStep(self, time_step, time):
+        '''
+        Event if fired at the end of each operating point.
+        :param time_step: the number of the finished time step.
+        :param time: actual value of the time.
+        '''
+        pass
+
+    def OnError(self, function_name, message, additional_info, message_type):
+        '''
+        Event is fired if some error occured.
+        :param function_name: name of the offending function.
+        :param message: error message.
+        :param additional_info: additional message information.
+        :param message_type: error severity value.
+        '''
+        if self.event_log is not None:
+            self.event_log.error(function_name, message, additional_info, message_type)
+            return
+        colorama = init_colorama()
+        print(colorama.Back.RED + 'ERROR: ' + message + '\t' + additional_info + colorama.Style.RESET_ALL)
+
+    def OnMessage(self, function_name, message, additional_info, message_type):
+        '''
+        Event forwards the messages from KULI.
+        :param function_name: name of the function where the message is raised.
+        :param message: message text.
+        :param additional_info: additional message information.
+        :param message_type: does currently not give any value.
+        '''
+        if self.event_log is not None:
+            self.event_log.message(function_name, message, additional_info, message_type)
+            return
+        colorama = init_colorama()
+        print(colorama.Fore.GREEN + message + '\t' + additional_info + colorama.Style.RESET_ALL)
+
+    def OnNextIteration(self, iteration_number):
+        '''
+        Event if fired when the next iteration has begun.
+        :param iteration_number: the number of the iteration.
+        '''
+        pass
+
+    def OnNextTime(self, time_step_number, time):
+        '''
+        Event if fired when the next time step has been reached. Requires the
+        simulation to be started either by using RunAnalysis() or SimualteOperatingPoint(...).
+        :param time_step_number: the number of the time step.
+        :param time_step_number: actual value of the time.
+        '''
+        pass
+
+
+class KuliAnalysis(object):
+    """ Python wrapper for KULIAnalysis2Ctr"""
+
+    # True once the COM server is dispatched
+    dispatched = False
+
+    def __init__(self, versionstring, kuli_event_handler=None, dispatch=None, connect=False, lazy=True):
+        """ Constructur
+        :param versionstring: e.g. 11.1
+        :param dispatch: replacement for win32com.client.DispatchWithEvents,
+        e.g. kuli.fake.DispatchWithEvents to run without a KULI server
+        :param connect: connect to a KULI server that is already running
+        instead of starting one, ignored if dispatch is given
+        :param lazy: dispatch the server on the first call that needs it
+        instead of in the constructor
+        """
+        server_name = 'KuliAnalysis2.KuliAnalysisCtr2.'
+        versionnumber = int(re.search('^[0-9]+', versionstring).group())
+        if versionnumber is not None and versionnumber >= 13:
+            server_name = 'KuliAnalysisServer.KuliAnalysisCtr2.'
+
+        versionid = server_name + versionstring
+
+        event_handler = kuli_event_handler
+        if event_handler is None:
+            event_handler = KuliEvents
+        self.__listeners = _EventListeners()
+        event_handler = _event_handler_with_listeners(event_handler, self.__listeners)
+
+        if dispatch is None:
+            dispatch = _connect if connect else _dispatch
+        self.__dispatch = functools.partial(dispatch, versionid, event_handler)
+        self.__com_methods = {}
+        self.__write_buffer = None
+        if not lazy:
+            self.connect()
+
+    def __getattr__(self, name):
+        # only called while the server is not dispatched yet
+        if name == '_KuliAnalysis__kuli':
+            self.connect()
+            return self.__kuli
+        raise AttributeError("'%s' object has no attribute '%s'" % (type(self).__name__, name))
+
+    def connect(self):
+        '''
+        Dispatches the KULI server or connects to the running one, unless
+        already done. Called by the first method that needs the server.
+        '''
+        if not self.dispatched:
+            self.__kuli = self.__dispatch()
+            self.dispatched = True
+
+    # ACAdjustmentMode property
+    def __get_ac_adjustment_mode(self):
+        return self.__kuli.ACAdjustmentMode()
+
+    def __set_ac_adjustement_mode(self, val):
+        self.__kuli.ACAdjustmentMode = val
+
+    ac_adjustment_mode = property(__get_ac_adjustment_mode, __set_ac_adjustement_mode)
+
+    # AddToBatchList
+    def add_to_batch_list(self, file_name):
+        ''' add_to_batch_list '''
+        self.__kuli.AddToBatchList(file_name)
+
+    # event listeners
+    def add_event_listener(self, event, listener):
+        '''
+        Registers a function that is called with the event arguments every time
+        KULI fires the event, after the event handler.
+        :param event: name of the event, e.g. "OnEndOfTimeStep"
+        :param listener: function to be called
+        '''
+        if event not in EVENTS:
+            raise ValueError('unknown KULI event: %s' % event)
+        self.__listeners[event] = self.__listeners.get(event, ()) + (listener,)
+
+    def remove_event_listener(self, event, listener):
+        '''
+        Removes a function registered with add_event_listener.
+        :param event: name of the event
+        :param listener: function to be removed
+        '''
+        listeners = list(self.__listeners.get(event, ()))
+        listeners.remove(listener)
+        self.__listeners[event] = tuple(listeners)
+
+    def set_event_profiler(self, profiler):
+        '''
+        Sets an object whose profile_event(name, dispatch, *args) method runs
+        every event, see kuli.profiling. None removes it.
+        '''
+        self.__listeners.profiler = profiler
+
+    # AnalysisLogEvents property
+    def __get_analysis_log_events(self):
+        return self.__kuli.AnalysisLogEvents
+
+    def __set_analysis_log_events(self, val):
+        self.__kuli.AnalysisLogEvents = val
+
+    analysis_log_events = property(__get_analysis_log_events, __set_analysis_log_events)
+
+    # AnalysisLogFile property
+    def __get_analysis_log_file(self):
+        return self.__kuli.AnalysisLogFile
+
+    def __set_analysis_log_file(self, val):
+        self.__kuli.AnalysisLogFile = val
+
+    analysis_log_file = property(__get_analysis_log_file, __set_analysis_log_file)
+
+    # BatchMode property
+    def __get_batch_mode(self):
+        return self.__kuli.BatchMode
+
+    def __set_batch_mode(self, val):
+        self.__kuli.BatchMode = val
+
+    batchMode = property(__get_batch_mode, __set_batch_mode)
+
+    # Cancel
+    def cancel(self):
+        """ cancel """
+        return self.__kuli.Cancel()
+
+    # CleanUp
+    def clean_up(self):
+        """ clean_up """
+        self.__forget_written()
+        return self.__kuli.CleanUp()
+
+    def get_com_codes(self, is_input_com_object):
+        '''
+        returns either all input or output COM object
+        :param is_input_com_object: True for input COM objects, otherwise False
+        '''
+        return self.__kuli.GetCOMCodes(is_input_com_object)
+
+    def get_com_value_by_id(self, com_id):
+        '''
+        returns the numerical value of a COM with the specified ID
+        :param com_id: ID of the COM object
+        '''
+        self.__sync()
+        return self.__kuli.GetCOMValueByID(com_id)
+
+    def get_com_value_by_id_as_string(self, com_id):
+        '''
+        returns the a string value of a COM with the specified ID
+        :param com_id: ID of the COM object
+        '''
+        self.__sync()
+        return self.__kuli.GetCOMValueByIDAsString(com_id)
+
+    # GetCOMValueByIDAsString2
+    def get_com_value_by_id_as_string2(self, com_id):
+        '''
+        returns the a string value of a COM with the specified ID
+        :param com_id: ID of the COM object
+        '''
+        self.__sync()
+        return self.__kuli.GetCOMValueByIDAsString2(com_id)
+
+    #GetInputCOMUnitByID
+    def get_input_com_unit_by_id(self, com_id):
+        '''
+        returns the unit of a input COM with the specified ID
+        :param com_id: ID of the COM object
+        '''
+        return self.__kuli.GetInputCOMUnitByID(com_id)
+
+
+    #GetOutputCOMUnitByID
+    def get_output_com_unit_by_id(self, com_id):
+        '''
+        returns the unit of a output COM with the specified ID
+        :param com_id: ID of the COM object
+        '''
+        return self.__kuli.GetOutputCOMUnitByID(com_id)    
+
+    # GetComponentDescription
+    def get_component_description(self, component_type_id):
+        '''
+        returns the full name of a component with the specified ID
+        :param component_type_id: ID of the component type
+        '''
+        return self.__kuli.GetComponentDescription(component_type_id)
+
+    # GetComponentConnectorUnit
+    def get_component_connector_unit(self, component_type_id, connector_id):
+        '''
+        returns the unit for a specified component connector
+        :param component_type_id: ID of the component type
+        :param connector_id: ID of the connector
+        '''
+        return self.__kuli.GetComponentConnectorUnit(component_type_id, connector_id)
+
+    # GetConnectorUnit
+    def get_connector_unit(self, connector_id):
+        '''
+        returns the unit for a specified connector
+        :param connector_id: ID of the connector
+        '''
+        return self.__kuli.GetConnectorUnit(connector_id)
+
+    # GetErrorInfo
+    ######## This does not work ###########
+    # strings are immuteable
+    # def get_error_info(self):
+    #     '''
+    #     returns the number of errors and errors texts
+    #     '''
+    #     number_of_errors = self.__kuli.GetConnectorUnit(errors)
+    #     return number_of_errors, errors
+
+    # GetValue
+    def get_value(self, component_id, connector_id=None):
+        """
+        returns the double value of a sensor or actuator
+        :param component_id: id of the component or a ConnectorRef
+        :param connector_id: id of the sensor or actuator
+        """
+        self.__sync()
+        if connector_id is None:
+            return self.__kuli.GetValue(component_id.component_id, component_id.connector_id)
+        return self.__kuli.GetValue(component_id, connector_id)
+
+    # GetValueAsStr
+    def get_value_as_str(self, component_id, connector_id=None):
+        """
+        returns the string value of a sensor or actuator
+        :param component_id: ID of the component or a ConnectorRef
+        :param connector_id: ID of the sensor or actuator
+        """
+        self.__sync()
+        if connector_id is None:
+            return self.__kuli.GetValueAsStr(component_id.component_id, component_id.connector_id)
+        return self.__kuli.GetValueAsStr(component_id, connector_id)
+
+    # GetValueUnit
+    def get_value_unit(self, component_id, connector_id=None, unit=None):
+        """
+        returns the double value of a sensor or actuator converted to the specified unit
+        :param component_id: ID of the component or a ConnectorRef, whose unit
+        is used if no unit is given
+        :param connector_id: ID of the sensor or actuator
+        :param unit: unit of the value
+        """
+        self.__sync()
+        if connector_id is None:
+            ref = component_id
+            return self.__kuli.GetValueUnit(ref.component_id, ref.connector_id, unit or ref.unit)
+        return self.__kuli.GetValueUnit(component_id, connector_id, unit)
+
+    # GetValueUnitAsStr
+    def get_value_unit_as_str(self, component_id, connector_id=None, unit=None):
+        """
+        returns the string value of a sensor or actuator converted to the specified unit
+        :param component_id: ID of the component or a ConnectorRef, whose unit
+        is used if no unit is given
+        :param connector_id: ID of the sensor or actuator
+        :param unit: unit of the value
+        """
+        self.__sync()
+        if connector_id is None:
+            ref = component_id
+            return self.__kuli.GetValueUnitAsStr(ref.component_id, ref.connector_id, unit or ref.unit)
+        return self.__kuli.GetValueUnitAsStr(component_id, connector_id, unit)
+
+    # GetWarningInfo
+    ######## This does not work ###########
+    # strings are immuteable
+    # def get_warning_info(self):
+    #     '''
+    #     returns the number of warnings the warning texts
+    #     '''
+    #     number_of_warnings = self.__kuli.GetWarningInfo(warning)
+    #     return number_of_warnings, warning
+
+    # GetVersionID
+    def get_version_id(self):
+        '''
+        returns the version id of KULI
+        '''
+        return self.__kuli.GetVersionID()
+
+    # GetVersionStr
+    def get_version_str(self):
+        '''
+        returns the version string of KULI
+        '''
+        return self.__kuli.GetVersionStr()
+
+    # Initialize
+    def initialize(self):
+        '''
+        initalizes the specified scs file
+        '''
+        if self.__kuli is None:
+            return False
+        self.__forget_written()
+        return self.__kuli.Initialize()
+
+    # IsFinished
+    def is_finished(self):
+        '''
+        Returns True if the computation of the current simultion is finished,
+        otherwise False.
+        '''
+        return self.__kuli.IsFinished()
+
+    # IsNextTimeStep
+    def is_next_time_step(self):
+        '''
+        Returns True is the compution of the current time step succeeded and
+        an additional time step is left, otherwise false.
+        '''
+        return self.__kuli.IsNextTimeStep()
+
+    # ListComponents
+    def list_components(self, filter):
+        '''
+        Returns a string containing a list of components of the KULI model, separated
+        by spaces.
+        :param filter: string to filter data
+        '''
+        return self.__kuli.ListComponents(filter)
+
+    # ListComponentTypes
+    def list_component_types(self):
+        '''
+        Returns a string containg the IDs of all KULI component types seperated with blanks.
+        '''
+        return self.__kuli.ListComponentTypes()
+
+    # ListConnectors
+    def list_connectors(self, component_type, connector_type):
+        '''
+        Returns a string with the IDs of all connectors of a component type separated
+        by spaces.
+        :param connector_type: can be "SA" to return all connectors,
+        "S" for sensors and "A" for actuators
+        '''
+        return self.__kuli.ListConnectors(component_type, connector_type)
+
+    # IsNextTimeStep
+    def next_kuli_iteration(self):
+        '''
+        Starts the computation of the next iteration of the current operating point.
+        Returns True is the calculation was successful.
+        '''
+        self.__sync()
+        return self.__kuli.NextKULIIteration()
+
+    # ObjectExists
+    def object_exists(self, com_object_name, in_or_out):
+        '''
+        Returns true if the object could be found.
+        :param com_object_name: the name of the COM object
+        :param in_or_out: can be "In" (Input COM object) or "Out" (Output COM object).
+        '''
+        return self.__kuli.ObjectExists(com_object_name, in_or_out)
+
+    # ResetCurrentSimulationStep
+    def reset_current_simulation_step(self):
+        '''
+        Sets the IsFinished flag to false and forces a recalculation of the current
+        simulation step.
+        Returns true if the simulation was successful.
+        '''
+        self.__sync()
+        return self.__kuli.ResetCurrentSimulationStep()
+
+    # RunAnalysis
+    def run_analysis(self):
+        '''
+        Performs a complete run of a cooling system simulation.
+        Returns True if the simulation was successful.
+        '''
+        self.__sync()
+        return self.__kuli.RunAnalysis()
+
+    # RunOptimization
+    def run_optimization(self):
+        '''
+        Performs an optimization.
+        Returns True if the simulation was successful.
+        '''
+        self.__sync()
+        return self.__kuli.RunOptimization()
+
+    # RunParameterVariation
+    def run_parameter_variation(self):
+        '''
+        Performs a parameter variation simulation.
+        Returns True if the simulation was successful.
+        '''
+        self.__sync()
+        return self.__kuli.RunParameterVariation()
+
+    # RunMonteCarlo
+    def run_monte_carlo(self, no_of_samples):
+        '''
+        Performs a monte carlo simulation.
+        Returns True if the simulation was successful.
+        :param no_of_samples: number of samples.
+        '''
+        self.__sync()
+        return self.__kuli.RunMonteCarlo(no_of_samples)
+
+    # KuliFileName property
+    def __get_kuli_file_name(self):
+        return self.__kuli.KuliFileName
+
+    def __set_kuli_file_name(self, val):
+        self.__forget_written()
+        self.__kuli.KuliFileName = val
+
+    kuli_file_name = property(__get_kuli_file_name, __set_kuli_file_name)
+
+    # ResultFileName
+    def __get_result_file_name(self):
+        return self.__kuli.ResultFileName
+
+    def __set_result_file_name(self, val):
+        self.__kuli.ResultFileName = val
+
+    result_file_name = property(__get_result_file_name, __set_result_file_name)
+
+    # SetCOMValueByID
+    def set_com_value_by_id(self, component_id, value):
+        '''
+        Sets the double value of an input COM object.
+        Returns True if the value was set successfully.
+        :param component_id: ID of the COM object.
+        :param value: value to be set.
+        '''
+        if self.__write_buffer is not None:
+            self.__write_buffer.put(('COM', component_id), 'SetCOMValueByID', (component_id, value),
+                                    ('SetCOMValueByID', '', value))
+            return True
+        return self.__kuli.SetCOMValueByID(component_id, value)
+
+    # SetCOMValueByIDAsStr
+    def set_com_value_by_id_as_str(self, component_id, value):
+        '''
+        Sets the string value of an input COM object.
+        Returns True if the value was set successfully.
+        :param component_id: ID of the COM object.
+        :param value: value to be set.
+        '''
+        if self.__write_buffer is not None:
+            self.__write_buffer.discard(('COM', component_id))
+        return self.__kuli.SetCOMValueByIDAsStr(component_id, value)
+
+    # SetCOMValueByIDAsStr2
+    def set_com_value_by_id_as_str2(self, component_id, value):
+        '''
+        Sets the string value of an input COM object.
+        Returns True if the value was set successfully.
+        :param component_id: ID of the COM object.
+        :param value: value to be set.
+        '''
+        if self.__write_buffer is not None:
+            self.__write_buffer.discard(('COM', component_id))
+        return self.__kuli.SetCOMValueByIDAsStr2(component_id, value)
+
+    # SetValue
+    def set_value(self, component_id, actuator_id=_MISSING, value=_MISSING):
+        '''
+        Sets the double value of an actuator for the specified component.
+        Can also be called as set_value(connector_ref, value).
+        :param component_id: ID of the component.
+        :param connector_id: ID of the actuator.
+        :param value: value to be set.
+        '''
+        _check_actuator_args('set_value', component_id, actuator_id, value)
+        if type(component_id) is ConnectorRef:
+            ref, value = component_id, actuator_id
+            component_id, actuator_id = ref.component_id, ref.connector_id
+        if self.__write_buffer is not None:
+            self.__write_buffer.put(('A', component_id, actuator_id), 'SetValue',
+                                    (component_id, actuator_id, value), ('SetValue', '', value))
+            return
+        self.__kuli.SetValue(component_id, actuator_id, value)
+
+    # SetValueAsStr
+    def set_value_as_str(self, component_id, actuator_id=_MISSING, value=_MISSING):
+        '''
+        Sets the string value of an actuator for the specified component.
+        Can also be called as set_value_as_str(connector_ref, value).
+        :param component_id: ID of the component.
+        :param connector_id: ID of the actuator.
+        :param value: value to be set.
+        '''
+        _check_actuator_args('set_value_as_str', component_id, actuator_id, value)
+        if type(component_id) is ConnectorRef:
+            ref, value = component_id, actuator_id
+            component_id, actuator_id = ref.component_id, ref.connector_id
+        if self.__write_buffer is not None:
+            self.__write_buffer.discard(('A', component_id, actuator_id))
+        self.__kuli.SetValueAsStr(component_id, actuator_id, value)
+
+    # SetValueUnit
+    def set_value_unit(self, component_id, actuator_id=_MISSING, unit=_MISSING, value=_MISSING):
+        '''
+        Sets the double value of an actuator for the specified component.
+        Can also be called as set_value_unit(connector_ref, value) using the
+        unit of the reference.
+        :param component_id: ID of the component.
+        :param connector_id: ID of the actuator.
+        :param unit: unit of the value to be set.
+        :param value: value to be set.
+        '''
+        _check_actuator_args('set_value_unit', component_id, actuator_id, unit, value)
+        if type(component_id) is ConnectorRef:
+            ref, value = component_id, actuator_id
+            component_id, actuator_id, unit = ref.component_id, ref.connector_id, ref.unit
+        if self.__write_buffer is not None:
+            self.__write_buffer.put(('A', component_id, actuator_id), 'SetValueUnit',
+                                    (component_id, actuator_id, unit, value), ('SetValueUnit', unit, value))
+            return
+        self.__kuli.SetValueUnit(component_id, actuator_id, unit, value)
+
+    # SetValueUnitAsStr
+    def set_value_unit_as_str(self, component_id, actuator_id=_MISSING, unit=_MISSING, value=_MISSING):
+        '''
+        Sets the string value of an actuator for the specified component.
+        Can also be called as set_value_unit_as_str(connector_ref, value) using
+        the unit of the reference.
+        :param component_id: ID of the component.
+        :param connector_id: ID of the actuator.
+        :param unit: unit of the value to be set.
+        :param value: value to be set.
+        '''
+        _check_actuator_args('set_value_unit_as_str', component_id, actuator_id, unit, value)
+        if type(component_id) is ConnectorRef:
+            ref, value = component_id, actuator_id
+            component_id, actuator_id, unit = ref.component_id, ref.connector_id, ref.unit
+        if self.__write_buffer is not None:
+            self.__write_buffer.discard(('A', component_id, actuator_id))
+        self.__kuli.SetValueUnitAsStr(component_id, actuator_id, unit, value)
+
+    # SimulateOperatingPoint
+    def simulate_operating_point(self, operating_point):
+        '''
+        Simululates the specified operating point.
+        :param operating_point: operating point to be simulated. A value
+        of 0 simulates all operating points.
+        '''
+        self.__sync()
+        return self.__kuli.SimulateOperatingPoint(operating_point)
+
+    # StartAnalysis
+    def start_analysis(self):
+        '''
+        Initializes the system and starts the analysis.
+        '''
+        self.__sync()
+        return self.__kuli.StartAnalysis()
+
+    # WriteResults
+    def __get_write_results(self):
+        return self.__kuli.WriteResults
+
+    def __set_write_results(self, val):
+        self.__kuli.WriteResults = val
+
+    write_results = property(__get_write_results, __set_write_results)
+
+    ###########################################################################
+    # batched access
+
+    def __com_method(self, name):
+        method = self.__com_methods.get(name)
+        if method is None:
+            method = self.__com_methods[name] = _bind_com_method(self.__kuli, name)
+        return method
+
+    def get_values(self, signals, as_array=False):
+        '''
+        Returns the double values of several sensors or actuators as a list.
+        :param signals: ConnectorRefs, (component_id, connector_id) pairs or
+        strings like "1.Rad.ExitTempIM"
+        :param as_array: return a NumPy array instead of a list
+        '''
+        self.__sync()
+        get_value = self.__com_method('GetValue')
+        values = [get_value(*_split_signal(signal)) for signal in signals]
+        if as_array:
+            import numpy
+            return numpy.array(values, dtype=float)
+        return values
+
+    def set_values(self, values):
+        '''
+        Sets the double values of several actuators.
+        :param values: dict or (signal, value) pairs, signals are given like
+        for get_values
+        '''
+        items = values.items() if hasattr(values, 'items') else values
+        buffer = self.__write_buffer
+        if buffer is not None:
+            for signal, value in items:
+                component_id, actuator_id = _split_signal(signal)
+                value = float(value)
+                buffer.put(('A', component_id, actuator_id), 'SetValue',
+                           (component_id, actuator_id, value), ('SetValue', '', value))
+            return
+        set_value = self.__com_method('SetValue')
+        for signal, value in items:
+            component_id, actuator_id = _split_signal(signal)
+            set_value(component_id, actuator_id, float(value))
+
+    def get_com_values(self, com_ids, as_array=False):
+        '''
+        Returns the numerical values of several COM objects as a list.
+        :param com_ids: IDs of the COM objects
+        :param as_array: return a NumPy array instead of a list
+        '''
+        self.__sync()
+        get_com_value = self.__com_method('GetCOMValueByID')
+        values = [get_com_value(com_id) for com_id in com_ids]
+        if as_array:
+            import numpy
+            return numpy.array(values, dtype=float)
+        return values
+
+    def set_com_values(self, values):
+        '''
+        Sets the double values of several input COM objects.
+        Returns a list with True for each value that was set successfully.
+        :param values: dict or (com_id, value) pairs
+        '''
+        items = values.items() if hasattr(values, 'items') else values
+        buffer = self.__write_buffer
+        if buffer is not None:
+            results = []
+            for com_id, value in items:
+                value = float(value)
+                buffer.put(('COM', com_id), 'SetCOMValueByID', (com_id, value), ('SetCOMValueByID', '', value))
+                results.append(True)
+            return results
+        set_com_value = self.__com_method('SetCOMValueByID')
+        return [set_com_value(com_id, float(value)) for com_id, value in items]
+
+    def snapshot(self, is_input_com_object=False, label=None):
+        '''
+        Returns the values of all output or input COM objects as
+        kuli.snapshot.Snapshot, read in one batched pass.
+        :param is_input_com_object: True for input COM objects
+        :param label: label of the snapshot, e.g. the operating point
+        '''
+        from kuli.snapshot import take_snapshot
+        return take_snapshot(self, is_input_com_object, label)
+
+    ###########################################################################
+    # write buffer
+
+    def enable_write_buffer(self):
+        '''
+        Buffers set_value, set_value_unit and set_com_value_by_id (and the
+        batched setters) until the next read or simulation step. Writes of
+        the value last sent to a target are dropped and repeated writes to a
+        target are coalesced into one. Assumes that the targets are not
+        changed by anyone else, see invalidate_write_buffer.
+        '''
+        if self.__write_buffer is None:
+            self.__write_buffer = _WriteBuffer()
+
+    def disable_write_buffer(self):
+        ''' sends the pending writes and stops buffering '''
+        self.flush_writes()
+        self.__write_buffer = None
+
+    def flush_writes(self):
+        '''
+        Sends the pending writes. Called before reads and simulation steps.
+        Returns the IDs of the COM objects that could not be set.
+        '''
+        buffer = self.__write_buffer
+        if buffer is None or not buffer.pending:
+            return []
+        pending = buffer.pending
+        failed = []
+        written = buffer.written
+        com_method = self.__com_method
+        try:
+            # an entry leaves pending only once it was sent, so a raising
+            # call keeps it and all later writes for the next flush
+            for target, (method, args, state) in list(pending.items()):
+                try:
+                    result = com_method(method)(*args)
+                except BaseException:
+                    # the value on the server is unknown now
+                    written.pop(target, None)
+                    raise
+                del pending[target]
+                buffer.sent += 1
+                if result is False and target[0] == 'COM':
+                    failed.append(target[1])
+                    written.pop(target, None)
+                else:
+                    written[target] = state
+        finally:
+            buffer.failed += len(failed)
+            buffer.flushes += 1
+        return failed
+
+    def invalidate_write_buffer(self):
+        '''
+        Sends the pending writes and forgets the values last sent, e.g.
+        after the model changed actuators or COM objects itself.
+        '''
+        self.__forget_written()
+
+    @property
+    def write_buffer_stats(self):
+        ''' dict with the counts of buffered, sent and avoided writes, None if disabled '''
+        if self.__write_buffer is None:
+            return None
+        return self.__write_buffer.stats()
+
+    def __sync(self):
+        buffer = self.__write_buffer
+        if buffer is not None and buffer.pending:
+            self.flush_writes()
+
+    def __forget_written(self):
+        buffer = self.__write_buffer
+        if buffer is not None:
+            self.__sync()
+            buffer.written.clear()
@@ -0,0 +1,221 @@
+""" Differential evolution over input COM objects on a KuliPool
+
+Replaces run_optimization, which evaluates one candidate at a time inside a
+single KULI instance. Every generation is dealt out to the warm workers of a
+KuliPool as 'sample' tasks, which set the input COM objects with
+set_com_value_by_id and simulate one operating point:
+
+    def objective(outputs):
+        return outputs['FanPower']
+
+    def coolant_limit(outputs):                   # feasible if <= 0
+        return outputs['CoolantTemp'] - 110.0
+
+    with KuliPool(r'C:\\models\\ExCAR_COM.scs', outputs=['FanPower', 'CoolantTemp']) as pool:
+        optimizer = DifferentialEvolution(pool, {'EngineSpeed': (1000.0, 4000.0)}, objective,
+                                          constraints=[coolant_limit], budget=500,
+                                          events=KuliEvents())
+        result = optimizer.run()
+
+Candidates already evaluated are looked up instead of simulated again.
+Progress is reported to a KuliEvents instance: OnNextIteration after every
+generation, OnMessage with the best value and OnError for failed
+evaluations. OnCheckForCancel is called before every generation, the
+handler may call cancel() on the optimizer.
+"""
+import collections
+
+import numpy
+
+
+class OptimizationResult(collections.namedtuple(
+        'OptimizationResult', 'inputs objective violation outputs evaluations generations cancelled')):
+    """ Best candidate found by an optimizer """
+
+    __slots__ = ()
+
+    @property
+    def feasible(self):
+        return self.violation <= 0.0
+
+
+class DifferentialEvolution(object):
+    """ DE/rand/1/bin with feasibility rules and an evaluation budget """
+
+    def __init__(self, pool, parameters, objective, constraints=(), operating_point=1,
+                 population=None, mutation=0.8, crossover=0.9, budget=1000, generations=None,
+                 tolerance=0.0, resolution=1e-9, seed=None, events=None):
+        '''
+        :param pool: KuliPool whose outputs are passed to the objective
+        :param parameters: dict of input COM ID -> (lower bound, upper bound),
+        equal bounds keep a parameter fixed
+        :param objective: function(outputs) returning the value to minimize,
+        outputs is a dict of output COM ID -> value
+        :param constraints: functions(outputs), a candidate is feasible if
+        all of them return values <= 0
+        :param operating_point: operating point simulated per candidate
+        :param population: candidates per generation, at least 4, defaults to
+        ten per parameter
+        :param mutation: differential weight F
+        :param crossover: crossover probability CR
+        :param budget: number of simulations after which the search stops
+        :param generations: number of generations after which the search stops
+        :param tolerance: the search stops once the objective values of the
+        population differ by less than this
+        :param resolution: candidates closer than this fraction of the
+        parameter ranges are evaluated only once
+        :param seed: seed of the random generator
+        :param events: KuliEvents instance receiving the progress
+        '''
+        self.pool = pool
+        self.com_ids = list(parameters)
+        bounds = numpy.array([parameters[com_id] for com_id in self.com_ids], dtype=float)
+        self.lower, self.upper = bounds[:, 0], bounds[:, 1]
+        if (self.lower > self.upper).any():
+            raise ValueError('lower bounds must not exceed upper bounds: %s'
+                             % ', '.join(numpy.array(self.com_ids)[self.lower > self.upper]))
+        # grid spacing of the duplicate lookup, fixed parameters get a span of 1
+        self.__step = numpy.where(self.upper > self.lower, self.upper - self.lower, 1.0) * resolution
+        self.objective = objective
+        self.constraints = list(constraints)
+        self.operating_point = operating_point
+        self.population = population or max(5, 10 * len(self.com_ids))
+        if self.population < 4:
+            # DE/rand/1 mutates with three members other than the target
+            raise ValueError('population must be at least 4, got %d' % self.population)
+        self.mutation = mutation
+        self.crossover = crossover
+        self.budget = budget
+        self.generations = generations
+        self.tolerance = tolerance
+        self.resolution = resolution
+        self.random = numpy.random.default_rng(seed)
+        self.events = events
+        self.evaluations = 0
+        self.duplicates = 0
+        self.failures = 0
+        self.history = []
+        self.__cache = {}
+        self.__cancelled = False
+
+    def cancel(self):
+        ''' stops the search after the running generation '''
+        self.__cancelled = True
+
+    def __key(self, candidate):
+        steps = numpy.round((candidate - self.lower) / self.__step)
+        return tuple(steps.astype(numpy.int64).tolist())
+
+    def __score(self, outputs):
+        ''' returns objective and total constraint violation of an evaluation '''
+        if outputs is None:
+            return numpy.inf, numpy.inf
+        violation = sum(max(0.0, float(constraint(outputs))) for constraint in self.constraints)
+        return float(self.objective(outputs)), violation
+
+    def evaluate(self, candidates):
+        '''
+        Evaluates candidates on the pool, looking up known ones. Returns the
+        objective values, the violations and the outputs of the candidates.
+        Candidates beyond the budget are not evaluated and get infinite values.
+        '''
+        keys = [self.__key(candidate) for candidate in candidates]
+        new = []
+        for position, key in enumerate(keys):
+            if key in self.__cache or key in (keys[other] for other in new):
+                self.duplicates += 1
+            elif self.evaluations + len(new) < self.budget:
+                new.append(position)
+
+        items = [(list(zip(self.com_ids, candidates[position].tolist())), self.operating_point)
+                 for position in new]
+        for result in self.pool.imap('sample', items):
+            outputs = None
+            if result.ok:
+                outputs = dict(zip(self.pool.outputs, result.outputs or ()))
+            else:
+                self.failures += 1
+                self.__report('OnError', 'DifferentialEvolution', 'evaluation failed',
+                              str(result.error).strip().splitlines()[-1] if result.error else '', 0)
+            self.__cache[keys[new[result.index]]] = (self.__score(outputs), outputs)
+        self.evaluations += len(new)
+
+        objectives = numpy.full(len(candidates), numpy.inf)
+        violations = numpy.full(len(candidates), numpy.inf)
+        outputs = [None] * len(candidates)
+        for position, key in enumerate(keys):
+            cached = self.__cache.get(key)
+            if cached is not None:
+                (objectives[position], violations[position]), outputs[position] = cached
+        return objectives, violations, outputs
+
+    def __report(self, event, *args):
+        if self.events is not None:
+            getattr(self.events, event)(*args)
+
+    @staticmethod
+    def _better(objective, violation, other_objective, other_violation):
+        ''' feasibility rules: less violation wins, then the lower objective '''
+        return (violation < other_violation) | ((violation == other_violation) & (objective <= other_objective))
+
+    def run(self):
+        '''
+        Runs the search until the budget, the generation limit or the
+        tolerance is reached, or until cancelled. Returns the best candidate
+        as OptimizationResult.
+        '''
+        size, dimensions = self.population, len(self.com_ids)
+        span = self.upper - self.lower
+        # Latin hypercube start population
+        strata = numpy.argsort(self.random.random((size, dimensions)), axis=0)
+        members = self.lower + span * (strata + self.random.random((size, dimensions))) / size
+        objectives, violations, outputs = self.evaluate(members)
+
+        generation = 0
+        self.__cancelled = False
+        while True:
+            best = self.__best(objectives, violations)
+            self.history.append((generation, self.evaluations, float(objectives[best]), float(violations[best])))
+            self.__report('OnNextIteration', generation)
+            self.__report('OnMessage', 'DifferentialEvolution',
+                          'generation %d: best objective %.6g, violation %.3g'
+                          % (generation, objectives[best], violations[best]),
+                          'evaluations %d of %d' % (self.evaluations, self.budget), 0)
+            self.__report('OnCheckForCancel')
+            finite = objectives[numpy.isfinite(objectives)]
+            if self.__cancelled or self.evaluations >= self.budget \
+                    or (self.generations is not None and generation >= self.generations) \
+                    or (len(finite) == size and finite.max() - finite.min() <= self.tolerance):
+                break
+            generation += 1
+
+            # DE/rand/1 with three distinct members other than the target
+            choices = numpy.argsort(self.random.random((size, size - 1)), axis=1)[:, :3]
+            choices += choices >= numpy.arange(size)[:, None]
+            mutants = members[choices[:, 0]] + self.mutation * (members[choices[:, 1]] - members[choices[:, 2]])
+            # reflect at the bounds
+            mutants = numpy.where(mutants < self.lower, 2 * self.lower - mutants, mutants)
+            mutants = numpy.where(mutants > self.upper, 2 * self.upper - mutants, mutants)
+            mutants = numpy.clip(mutants, self.lower, self.upper)
+            crossed = self.random.random((size, dimensions)) < self.crossover
+            crossed[numpy.arange(size), self.random.integers(0, dimensions, size)] = True
+            trials = numpy.where(crossed, mutants, members)
+
+            trial_objectives, trial_violations, trial_outputs = self.evaluate(trials)
+            better = self._better(trial_objectives, trial_violations, objectives, violations)
+            better &= numpy.isfinite(trial_objectives) | ~numpy.isfinite(objectives)
+            members[better] = trials[better]
+            objectives[better] = trial_objectives[better]
+            violations[better] = trial_violations[better]
+            for position in numpy.flatnonzero(better):
+                outputs[position] = trial_outputs[position]
+
+        best = self.__best(objectives, violations)
+        return OptimizationResult(dict(zip(self.com_ids, members[best].tolist())), float(objectives[best]),
+                                  float(violations[best]), outputs[best], self.evaluations, generation,
+                                  self.__cancelled)
+
+    @staticmethod
+    def __best(objectives, violations):
+        order = numpy.lexsort((objectives, violations))
+        return int(order[0])
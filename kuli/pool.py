@@ -0,0 +1,309 @@
+""" Process pool running KULI simulations in parallel
+
+Every worker process owns one KuliAnalysis instance, created by a factory
+with the signature of KuliAnalysisHelper.start_kuli. Tasks are dealt out to
+per worker queues and idle workers steal from the queues of busy ones, so
+long operating points do not leave the other workers waiting:
+
+    with KuliPool(r'C:\\models\\ExCAR_COM.scs', processes=8,
+                  outputs=['CoolantTemp']) as pool:
+        for result in pool.map_operating_points(range(1, 101)):
+            print(result.item, result.outputs, result.error)
+
+Pass factory=kuli.fake.start_kuli to run the pool without a KULI server.
+"""
+import collections
+import multiprocessing
+import queue
+import time
+import traceback
+
+
+class PoolResult(collections.namedtuple(
+        'PoolResult', 'index item value outputs signals error worker')):
+    """ Result of one task run by a KuliPool """
+
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        ''' True if the task finished without error '''
+        return self.error is None
+
+
+def _use_model(kuli, kuli_file_name, state):
+    ''' (re)initializes the worker instance if it has another model loaded '''
+    if state.get('model') == kuli_file_name:
+        return
+    kuli.kuli_file_name = kuli_file_name
+    state['model'] = None
+    if kuli.initialize() == 0:
+        raise RuntimeError('KULI could not be initialized with %s' % kuli_file_name)
+    state['model'] = kuli_file_name
+
+
+def _simulate_operating_point(kuli, operating_point, state):
+    _use_model(kuli, state['kuli_file_name'], state)
+    return kuli.simulate_operating_point(operating_point)
+
+
+def _run_batch_file(kuli, file_name, state):
+    _use_model(kuli, file_name, state)
+    return kuli.run_analysis()
+
+
+def _simulate_sample(kuli, sample, state):
+    _use_model(kuli, state['kuli_file_name'], state)
+    com_values, operating_point = sample
+    if not all(kuli.set_com_values(com_values)):
+        raise RuntimeError('input COM objects could not be set: %r' % (com_values,))
+    return kuli.simulate_operating_point(operating_point)
+
+
+# task kinds a worker can run: kind -> function(kuli, item, state)
+TASKS = {
+    'operating_point': _simulate_operating_point,
+    'batch_file': _run_batch_file,
+    # item: ((com_id, value) pairs, operating point)
+    'sample': _simulate_sample,
+}
+
+
+def _next_task(worker_id, task_queues, timeout):
+    ''' takes a task from the own queue or steals one from another worker '''
+    try:
+        return task_queues[worker_id].get(timeout=timeout)
+    except queue.Empty:
+        pass
+    count = len(task_queues)
+    for offset in range(1, count):
+        try:
+            return task_queues[(worker_id + offset) % count].get_nowait()
+        except queue.Empty:
+            pass
+    return None
+
+
+def _worker(worker_id, task_queues, result_queue, stop, factory, kuli_file_name, outputs, signals):
+    ''' main function of the worker processes '''
+    try:
+        kuli = factory(kuli_file_name)
+        if kuli is None:
+            raise RuntimeError('KULI could not be initialized with %s' % kuli_file_name)
+    except Exception:
+        result_queue.put(('dead', worker_id, traceback.format_exc()))
+        return
+
+    state = {'kuli_file_name': kuli_file_name, 'model': kuli_file_name}
+    result_queue.put(('ready', worker_id, None))
+    try:
+        while not stop.is_set():
+            task = _next_task(worker_id, task_queues, 0.05)
+            if task is None:
+                continue
+            run_id, index, kind, item = task
+            result_queue.put(('start', worker_id, (run_id, index)))
+            value = error = None
+            output_values = signal_values = None
+            try:
+                value = TASKS[kind](kuli, item, state)
+                if value is False:
+                    error = 'KULI reported a failed simulation'
+                if outputs:
+                    output_values = kuli.get_com_values(outputs)
+                if signals:
+                    signal_values = kuli.get_values(signals)
+            except Exception:
+                error = traceback.format_exc()
+            result_queue.put(('done', worker_id,
+                              (run_id, index, value, output_values, signal_values, error)))
+    finally:
+        kuli.clean_up()
+
+
+class KuliPool(object):
+    """ Runs operating points and batch files on several KULI processes """
+
+    def __init__(self, kuli_file_name, processes=None, factory=None,
+                 outputs=(), signals=(), context='spawn', lost_task_timeout=10.0):
+        '''
+        :param kuli_file_name: scs file every worker initializes
+        :param processes: number of worker processes, defaults to the number of CPUs
+        :param factory: function creating an initialized KuliAnalysis from a
+        file name, defaults to KuliAnalysisHelper.start_kuli. It must be picklable.
+        :param outputs: IDs of output COM objects read after every task
+        :param signals: sensors read after every task, see KuliAnalysis.get_values
+        :param context: multiprocessing start method
+        :param lost_task_timeout: after a worker died, pending tasks are
+        failed as lost once no task was known to run and no message arrived
+        for this time in seconds. A worker dying right after taking a task
+        from a queue cannot report which task it took.
+        '''
+        if factory is None:
+            from KuliAnalysisHelper import start_kuli as factory
+        self.kuli_file_name = kuli_file_name
+        self.lost_task_timeout = lost_task_timeout
+        self.processes = processes or multiprocessing.cpu_count()
+        self.outputs = list(outputs)
+        self.signals = list(signals)
+
+        self.errors = {}
+        ctx = multiprocessing.get_context(context)
+        self.__task_queues = [ctx.Queue() for _ in range(self.processes)]
+        self.__result_queue = ctx.Queue()
+        self.__stop = ctx.Event()
+        self.__workers = {}
+        self.__running = {}
+        self.__run_id = 0
+        for worker_id in range(self.processes):
+            process = ctx.Process(
+                target=_worker, name='KuliPool-%d' % worker_id,
+                args=(worker_id, self.__task_queues, self.__result_queue, self.__stop,
+                      factory, kuli_file_name, self.outputs, self.signals))
+            process.daemon = True
+            process.start()
+            self.__workers[worker_id] = process
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def __alive_workers(self):
+        return [worker_id for worker_id, process in self.__workers.items()
+                if worker_id not in self.errors and process.is_alive()]
+
+    def imap(self, kind, items):
+        '''
+        Runs a task for every item and yields PoolResults in the order the
+        tasks finish.
+        :param kind: task kind, a key of TASKS
+        :param items: items passed to the task function
+        '''
+        if kind not in TASKS:
+            raise ValueError('unknown task kind: %s' % kind)
+        self.__run_id += 1
+        run_id = self.__run_id
+        items = list(items)
+        for index, item in enumerate(items):
+            self.__task_queues[index % self.processes].put((run_id, index, kind, item))
+
+        pending = set(range(len(items)))
+        alive = len(self.__alive_workers())
+        last_message = time.monotonic()
+        try:
+            while pending:
+                try:
+                    message, worker_id, data = self.__result_queue.get(timeout=0.5)
+                except queue.Empty:
+                    for result in self.__check_workers(run_id, items, pending):
+                        yield result
+                    lost = self.__lost_tasks(run_id, items, pending, alive, last_message)
+                    for result in lost:
+                        yield result
+                    continue
+
+                last_message = time.monotonic()
+                if message == 'dead':
+                    self.errors[worker_id] = data
+                elif message == 'start':
+                    self.__running[worker_id] = data
+                elif message == 'done':
+                    self.__running.pop(worker_id, None)
+                    task_run_id, index, value, outputs, signals, error = data
+                    if task_run_id == run_id and index in pending:
+                        pending.discard(index)
+                        yield PoolResult(index, items[index], value, outputs, signals, error, worker_id)
+        finally:
+            if pending:
+                # the generator was abandoned, the tasks still queued are dropped
+                self.__drain(run_id)
+
+    def __drain(self, run_id):
+        ''' removes the queued tasks of a run and of earlier runs '''
+        for task_queue in self.__task_queues:
+            kept = []
+            while True:
+                try:
+                    task = task_queue.get(timeout=0.05)
+                except (queue.Empty, OSError, ValueError):
+                    break
+                if task[0] > run_id:
+                    kept.append(task)
+            for task in kept:
+                task_queue.put(task)
+
+    def __lost_tasks(self, run_id, items, pending, alive, last_message):
+        '''
+        Fails the pending tasks once a worker died during the run, no task of
+        the run is known to run and the workers stayed silent for
+        lost_task_timeout: the dead worker took them without reporting.
+        '''
+        if len(self.__alive_workers()) >= alive or not pending:
+            return []
+        if any(task[0] == run_id for task in self.__running.values()):
+            return []
+        if time.monotonic() - last_message < self.lost_task_timeout:
+            return []
+        results = [PoolResult(index, items[index], None, None, None,
+                              'task lost, a worker died after taking it', None)
+                   for index in sorted(pending)]
+        pending.clear()
+        return results
+
+    def __check_workers(self, run_id, items, pending):
+        ''' fails tasks that were lost because their worker died '''
+        for worker_id, process in self.__workers.items():
+            if process.is_alive():
+                continue
+            task = self.__running.pop(worker_id, None)
+            if task is not None and task[0] == run_id and task[1] in pending:
+                index = task[1]
+                pending.discard(index)
+                yield PoolResult(index, items[index], None, None, None,
+                                 'worker %d died with exit code %s' % (worker_id, process.exitcode),
+                                 worker_id)
+
+        if not self.__alive_workers():
+            error = 'no KULI worker is running'
+            if self.errors:
+                error += ', last worker error:\n' + list(self.errors.values())[-1]
+            for index in sorted(pending):
+                yield PoolResult(index, items[index], None, None, None, error, None)
+            pending.clear()
+
+    def map(self, kind, items):
+        '''
+        Runs a task for every item and returns the PoolResults in item order.
+        '''
+        results = list(self.imap(kind, items))
+        results.sort(key=lambda result: result.index)
+        return results
+
+    def map_operating_points(self, operating_points):
+        '''
+        Simulates the operating points, one task per operating point.
+        :param operating_points: numbers of the operating points
+        '''
+        return self.map('operating_point', operating_points)
+
+    def run_batch_files(self, file_names):
+        '''
+        Runs a complete analysis of each scs file, one task per file.
+        :param file_names: names of the scs files
+        '''
+        return self.map('batch_file', file_names)
+
+    def close(self, timeout=10.0):
+        '''
+        Stops the workers and cleans up their KULI instances.
+        :param timeout: time in seconds to wait for each worker
+        '''
+        self.__stop.set()
+        deadline = time.time() + timeout
+        for process in self.__workers.values():
+            process.join(max(0.0, deadline - time.time()))
+            if process.is_alive():
+                process.terminate()
+        self.__workers.clear()
@@ -0,0 +1,206 @@
+""" Opt-in timing of KuliAnalysis calls and KULI event callbacks
+
+A Profiler replaces the methods of one KuliAnalysis instance with timing
+wrappers and times every event callback. Instances that are not
+instrumented run without any overhead:
+
+    profiler = Profiler()
+    profiler.instrument(kuli)
+    kuli.run_analysis()
+    profiler.uninstrument(kuli)
+    print(profiler.summary())
+    profiler.to_json('profile.json')
+
+Times of calls that fire events, like run_analysis, contain the time spent
+in the callbacks. The exclusive time excludes it and thus approximates the
+time spent in KULI itself, solver and COM marshalling.
+"""
+import json
+import math
+import time
+
+from kuli.kulianalysis import KuliAnalysis
+
+# methods that are not timed
+UNTIMED = ('add_event_listener', 'remove_event_listener', 'set_event_profiler')
+
+# events whose spacing is measured
+INTERVAL_EVENTS = ('OnNextIteration', 'OnEndOfTimeStep')
+
+
+class LatencyHistogram(object):
+    """ Histogram with logarithmic buckets from 1 us to 1000 s """
+
+    # buckets per decade
+    RESOLUTION = 5
+    MIN_EXPONENT = -6
+    MAX_EXPONENT = 3
+
+    def __init__(self):
+        self.counts = [0] * ((self.MAX_EXPONENT - self.MIN_EXPONENT) * self.RESOLUTION + 2)
+        self.count = 0
+        self.total = 0.0
+        self.exclusive = 0.0
+        self.minimum = math.inf
+        self.maximum = 0.0
+
+    def add(self, seconds, exclusive=None):
+        '''
+        Adds a measurement.
+        :param seconds: duration
+        :param exclusive: duration without nested calls, defaults to seconds
+        '''
+        self.count += 1
+        self.total += seconds
+        self.exclusive += seconds if exclusive is None else exclusive
+        if seconds < self.minimum:
+            self.minimum = seconds
+        if seconds > self.maximum:
+            self.maximum = seconds
+        if seconds <= 0.0:
+            bucket = 0
+        else:
+            bucket = int((math.log10(seconds) - self.MIN_EXPONENT) * self.RESOLUTION) + 1
+            bucket = min(max(bucket, 0), len(self.counts) - 1)
+        self.counts[bucket] += 1
+
+    def upper_bound(self, bucket):
+        ''' returns the upper limit of a bucket in seconds '''
+        return 10.0 ** (self.MIN_EXPONENT + bucket / self.RESOLUTION)
+
+    def percentile(self, fraction):
+        '''
+        Returns the upper limit of the bucket containing the percentile.
+        :param fraction: e.g. 0.99
+        '''
+        if not self.count:
+            return 0.0
+        needed = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= needed and count:
+                return min(self.upper_bound(bucket), self.maximum)
+        return self.maximum
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total': self.total,
+            'exclusive': self.exclusive,
+            'mean': self.total / self.count if self.count else 0.0,
+            'min': self.minimum if self.count else 0.0,
+            'max': self.maximum,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+            'buckets': dict(('%.3g' % self.upper_bound(bucket), count)
+                            for bucket, count in enumerate(self.counts) if count),
+        }
+
+
+class Profiler(object):
+    """ Collects call counts, times and latency histograms """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.calls = {}
+        self.events = {}
+        self.intervals = {}
+        self.__last_event = {}
+        # time spent in nested calls, one entry per active call
+        self.__nested = [0.0]
+
+    def __histogram(self, table, name):
+        histogram = table.get(name)
+        if histogram is None:
+            histogram = table[name] = LatencyHistogram()
+        return histogram
+
+    def __timed(self, table, name, function, args):
+        clock = self.clock
+        nested = self.__nested
+        nested.append(0.0)
+        start = clock()
+        try:
+            return function(*args)
+        finally:
+            elapsed = clock() - start
+            child = nested.pop()
+            nested[-1] += elapsed
+            self.__histogram(table, name).add(elapsed, elapsed - child)
+
+    def profile_event(self, name, dispatch, *args):
+        ''' runs an event callback, called by KuliAnalysis '''
+        if name in INTERVAL_EVENTS:
+            now = self.clock()
+            last = self.__last_event.get(name)
+            if last is not None:
+                self.__histogram(self.intervals, name).add(now - last)
+            self.__last_event[name] = now
+        return self.__timed(self.events, name, dispatch, args)
+
+    def wrap(self, name, method):
+        ''' returns a timing wrapper of a method '''
+        timed = self.__timed
+        calls = self.calls
+        def wrapper(*args, **kwargs):
+            if kwargs:
+                return timed(calls, name, lambda *a: method(*a, **kwargs), args)
+            return timed(calls, name, method, args)
+        wrapper.__name__ = name
+        wrapper.__doc__ = method.__doc__
+        return wrapper
+
+    def instrument(self, kuli):
+        '''
+        Times all methods and events of a KuliAnalysis instance. Properties
+        like kuli_file_name are not timed.
+        '''
+        for name in dir(KuliAnalysis):
+            if name.startswith('_') or name in UNTIMED:
+                continue
+            if not callable(getattr(KuliAnalysis, name)) or isinstance(getattr(KuliAnalysis, name), type):
+                continue
+            setattr(kuli, name, self.wrap(name, getattr(kuli, name)))
+        kuli.set_event_profiler(self)
+
+    def uninstrument(self, kuli):
+        ''' removes the timing wrappers from the instance '''
+        for name in list(vars(kuli)):
+            if getattr(vars(kuli)[name], '__name__', None) == name and name in dir(KuliAnalysis):
+                delattr(kuli, name)
+        kuli.set_event_profiler(None)
+        self.__last_event.clear()
+
+    def reset(self):
+        ''' discards all measurements '''
+        self.calls.clear()
+        self.events.clear()
+        self.intervals.clear()
+        self.__last_event.clear()
+
+    def to_dict(self):
+        ''' returns all measurements as JSON serializable dict '''
+        return {
+            'calls': dict((name, histogram.to_dict()) for name, histogram in self.calls.items()),
+            'events': dict((name, histogram.to_dict()) for name, histogram in self.events.items()),
+            'intervals': dict((name, histogram.to_dict()) for name, histogram in self.intervals.items()),
+        }
+
+    def to_json(self, file_name):
+        ''' writes the measurements to a JSON file '''
+        with open(file_name, 'w') as json_file:
+            json.dump(self.to_dict(), json_file, indent=2)
+
+    def summary(self):
+        ''' returns a text table of the measurements sorted by total time '''
+        lines = ['%-34s %9s %11s %11s %11s %11s %11s' % (
+            'name', 'count', 'total [s]', 'excl. [s]', 'mean [us]', 'p99 [us]', 'max [us]')]
+        for title, table in (('call', self.calls), ('event', self.events), ('interval', self.intervals)):
+            for name, histogram in sorted(table.items(), key=lambda item: -item[1].total):
+                lines.append('%-34s %9d %11.4f %11.4f %11.1f %11.1f %11.1f' % (
+                    '%s %s' % (title, name), histogram.count, histogram.total, histogram.exclusive,
+                    1e6 * histogram.total / histogram.count, 1e6 * histogram.percentile(0.99),
+                    1e6 * histogram.maximum))
+        return '\n'.join(lines)
@@ -0,0 +1,189 @@
+""" Recording of signals at every time step into NumPy buffers
+
+SignalRecorder listens to OnEndOfTimeStep (or OnEndOfOperatingPoint) of a
+KuliAnalysis instance, reads all signals in one batch and writes them into a
+columnar buffer that grows by doubling. Long runs can spill the buffer into a
+memory-mapped file:
+
+    recorder = SignalRecorder(kuli, ['1.Rad.ExitTempIM', '1.Fan.Power'])
+    kuli.run_analysis()
+    recorder.detach()
+    temperatures = recorder.column('1.Rad.ExitTempIM')
+"""
+import numpy
+
+from kuli.connector import signal_name
+
+# columns written for every record besides the signals
+INDEX_COLUMNS = ('operating_point', 'time_step', 'time')
+
+
+class SignalRecorder(object):
+    """ Captures signals per time step into growable columnar buffers """
+
+    def __init__(self, kuli, signals, com_ids=(), event='OnEndOfTimeStep',
+                 capacity=1024, spill_file=None, memory_limit=0):
+        '''
+        :param kuli: KuliAnalysis instance to record from
+        :param signals: sensors and actuators to record, see KuliAnalysis.get_values
+        :param com_ids: IDs of COM objects to record
+        :param event: "OnEndOfTimeStep" or "OnEndOfOperatingPoint"
+        :param capacity: initial number of records the buffer can take
+        :param spill_file: name of a file the buffer is moved to once it
+        exceeds memory_limit
+        :param memory_limit: buffer size in bytes at which the buffer is
+        moved to spill_file
+        '''
+        if event not in ('OnEndOfTimeStep', 'OnEndOfOperatingPoint'):
+            raise ValueError('cannot record on %s' % event)
+        self.kuli = kuli
+        self.signals = list(signals)
+        self.com_ids = list(com_ids)
+        self.event = event
+        self.names = list(INDEX_COLUMNS) + [signal_name(signal) for signal in self.signals] \
+            + list(self.com_ids)
+        self.__positions = dict((name, position) for position, name in enumerate(self.names))
+
+        self.spill_file = spill_file
+        self.memory_limit = memory_limit
+        self.__mmap = None
+        self.__count = 0
+        self.__operating_point_start = 0
+        self.__capacity = max(1, capacity)
+        self.__data = numpy.empty((len(self.names), self.__capacity))
+        if spill_file is not None and self.__data.nbytes > memory_limit:
+            self.__spill(self.__capacity)
+
+        self.__attached = False
+        self.attach()
+
+    def attach(self):
+        ''' starts recording '''
+        if not self.__attached:
+            self.kuli.add_event_listener(self.event, self.__record)
+            if self.event == 'OnEndOfTimeStep':
+                self.kuli.add_event_listener('OnEndOfOperatingPoint', self.__end_of_operating_point)
+            self.__attached = True
+
+    def detach(self):
+        ''' stops recording, the captured data stays available '''
+        if self.__attached:
+            self.kuli.remove_event_listener(self.event, self.__record)
+            if self.event == 'OnEndOfTimeStep':
+                self.kuli.remove_event_listener('OnEndOfOperatingPoint', self.__end_of_operating_point)
+            self.__attached = False
+        if self.__mmap is not None:
+            self.__mmap.flush()
+
+    def __record(self, step, time=numpy.nan):
+        row = self.__count
+        if row == self.__capacity:
+            self.__grow()
+        if self.event == 'OnEndOfTimeStep':
+            # the operating point is filled in at its end
+            values = [numpy.nan, step, time]
+        else:
+            values = [step, 0, numpy.nan]
+        values += self.kuli.get_values(self.signals)
+        if self.com_ids:
+            values += self.kuli.get_com_values(self.com_ids)
+        self.__data[:, row] = values
+        self.__count = row + 1
+
+    def __end_of_operating_point(self, operating_point):
+        # the operating point of the time steps is only known at its end
+        self.__data[0, self.__operating_point_start:self.__count] = operating_point
+        self.__operating_point_start = self.__count
+
+    def __grow(self):
+        capacity = self.__capacity * 2
+        if self.__mmap is not None or (self.spill_file is not None
+                                       and self.__data.itemsize * self.__data.shape[0] * capacity
+                                       > self.memory_limit):
+            self.__spill(capacity)
+            return
+        data = numpy.empty((len(self.names), capacity))
+        data[:, :self.__count] = self.__data[:, :self.__count]
+        self.__data = data
+        self.__capacity = capacity
+
+    def __spill(self, capacity):
+        '''
+        Moves the buffer to the spill file or enlarges the file. The file keeps
+        the records in rows, so it only needs to be extended to grow.
+        '''
+        columns = len(self.names)
+        size = capacity * columns * numpy.dtype(numpy.float64).itemsize
+        mode = 'r+' if self.__mmap is not None else 'w+'
+        if self.__mmap is not None:
+            self.__mmap.flush()
+            # Windows cannot resize a file with a mapped view, so the map is
+            # released first, as in close. Views returned by column keep it
+            # alive, so they should not be held across a growth.
+            self.__mmap = self.__data = None
+            with open(self.spill_file, 'r+b') as spill:
+                spill.truncate(size)
+            old = None
+        else:
+            old = self.__data[:, :self.__count]
+        mmap = numpy.memmap(self.spill_file, dtype=numpy.float64, mode=mode,
+                            shape=(capacity, columns))
+        if old is not None:
+            mmap[:self.__count] = old.T
+        self.__mmap = mmap
+        self.__data = mmap.T
+        self.__capacity = capacity
+
+    def __len__(self):
+        return self.__count
+
+    @property
+    def spilled(self):
+        ''' True if the buffer is stored in the spill file '''
+        return self.__mmap is not None
+
+    def column(self, name):
+        '''
+        Returns a view of the captured values of a column without copying.
+        Columns of a spilled buffer are strided views into the file.
+        :param name: signal name as given, COM ID or one of INDEX_COLUMNS
+        '''
+        if not isinstance(name, str):
+            name = signal_name(name)
+        return self.__data[self.__positions[name], :self.__count]
+
+    @property
+    def columns(self):
+        ''' dict of column name -> view of the captured values '''
+        return dict((name, self.__data[position, :self.__count])
+                    for name, position in self.__positions.items())
+
+    @property
+    def times(self):
+        ''' view of the simulation time of the records '''
+        return self.__data[2, :self.__count]
+
+    def as_array(self):
+        '''
+        Returns a view of shape (signals + COM objects, records) holding the
+        captured values without the index columns.
+        '''
+        return self.__data[len(INDEX_COLUMNS):, :self.__count]
+
+    def clear(self):
+        ''' discards the captured records but keeps the buffer '''
+        self.__count = 0
+        self.__operating_point_start = 0
+
+    def close(self):
+        ''' stops recording and trims the spill file to the captured records '''
+        self.detach()
+        if self.__mmap is not None and self.__count:
+            columns = len(self.names)
+            self.__mmap = self.__data = None
+            with open(self.spill_file, 'r+b') as spill:
+                spill.truncate(self.__count * columns * numpy.dtype(numpy.float64).itemsize)
+            self.__mmap = numpy.memmap(self.spill_file, dtype=numpy.float64, mode='r+',
+                                       shape=(self.__count, columns))
+            self.__data = self.__mmap.T
+            self.__capacity = self.__count
@@ -0,0 +1,147 @@
+""" Reader for KULI result files
+
+With write_results set, KULI writes its results as delimited text: a line
+with the signal names, optionally a line with the units, then one line of
+numbers per operating point or time step. ResultFile memory-maps the file
+and parses it in chunks of whole lines with the C parser of numpy.loadtxt.
+Only the requested columns are converted:
+
+    results = ResultFile(kuli.result_file_name)
+    columns = results.read(['Time', '1.Rad.ExitTempIM'])
+
+    for chunk in results.iter_chunks(['Time', '1.Rad.ExitTempIM']):
+        ...  # files larger than memory
+"""
+import io
+import mmap
+import os
+
+import numpy
+
+# default size of the parsed chunks in bytes
+CHUNK_SIZE = 64 << 20
+
+
+def _is_number(field):
+    try:
+        float(field)
+    except ValueError:
+        return False
+    return True
+
+
+class ResultFile(object):
+    """ Memory-mapped, chunked reader of a KULI result file """
+
+    def __init__(self, file_name, delimiter=None, encoding='latin-1', comments='#'):
+        '''
+        :param file_name: name of the result file
+        :param delimiter: column delimiter, None detects tab, semicolon,
+        comma or whitespace from the header
+        :param encoding: encoding of the header lines
+        :param comments: lines starting with this string are skipped
+        '''
+        self.file_name = file_name
+        self.encoding = encoding
+        self.comments = comments
+        self.size = os.path.getsize(file_name)
+        self.__read_header(delimiter)
+
+    def __read_header(self, delimiter):
+        with open(self.file_name, 'rb') as result_file:
+            offset = 0
+            lines = []
+            while len(lines) < 2:
+                line = result_file.readline()
+                if not line:
+                    break
+                offset += len(line)
+                text = line.decode(self.encoding).strip('\r\n')
+                if not text.strip() or text.startswith(self.comments):
+                    if not lines:
+                        continue
+                    break
+                lines.append((text, offset))
+
+        if not lines:
+            raise ValueError('%s has no header' % self.file_name)
+        header, self.data_offset = lines[0]
+        if delimiter is None:
+            delimiter = next((candidate for candidate in ('\t', ';', ',') if candidate in header), None)
+        self.delimiter = delimiter
+        self.names = [name.strip() for name in header.split(delimiter)]
+        self.units = [''] * len(self.names)
+        if len(lines) > 1:
+            fields = lines[1][0].split(delimiter)
+            if not all(_is_number(field) for field in fields if field.strip()):
+                self.units = [unit.strip().strip('[]') for unit in fields]
+                self.data_offset = lines[1][1]
+        self.__positions = dict((name, position) for position, name in enumerate(self.names))
+
+    def columns_of(self, names):
+        ''' returns the positions of the named columns '''
+        if names is None:
+            return list(range(len(self.names)))
+        try:
+            return [self.__positions[name] for name in names]
+        except KeyError as error:
+            raise KeyError('no column %s in %s' % (error.args[0], self.file_name))
+
+    def __parse(self, data, positions, dtypes):
+        table = numpy.loadtxt(io.BytesIO(data), delimiter=self.delimiter, usecols=positions,
+                              comments=self.comments, encoding=self.encoding, ndmin=2)
+        columns = {}
+        for index, position in enumerate(positions):
+            column = table[:, index]
+            dtype = dtypes.get(self.names[position]) if dtypes else None
+            columns[self.names[position]] = column.astype(dtype) if dtype is not None else column
+        return columns
+
+    def iter_chunks(self, names=None, chunk_size=CHUNK_SIZE, dtypes=None):
+        '''
+        Yields dicts of column name -> array for consecutive blocks of lines,
+        so files larger than memory can be processed.
+        :param names: columns to decode, all if None
+        :param chunk_size: approximate number of bytes parsed at once
+        :param dtypes: dict of column name -> dtype, float64 otherwise
+        '''
+        positions = self.columns_of(names)
+        if self.size <= self.data_offset:
+            return
+        with open(self.file_name, 'rb') as result_file:
+            with mmap.mmap(result_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                start = self.data_offset
+                while start < self.size:
+                    end = min(start + chunk_size, self.size)
+                    if end < self.size:
+                        # end the chunk after the last complete line
+                        newline = data.rfind(b'\n', start, end)
+                        if newline < 0:
+                            newline = data.find(b'\n', end)
+                        end = self.size if newline < 0 else newline + 1
+                    chunk = data[start:end]
+                    start = end
+                    if chunk.strip():
+                        yield self.__parse(chunk, positions, dtypes)
+
+    def read(self, names=None, chunk_size=CHUNK_SIZE, dtypes=None):
+        '''
+        Returns a dict of column name -> array with all rows of the file.
+        :param names: columns to decode, all if None
+        :param chunk_size: approximate number of bytes parsed at once
+        :param dtypes: dict of column name -> dtype, float64 otherwise
+        '''
+        chunks = list(self.iter_chunks(names, chunk_size, dtypes))
+        positions = self.columns_of(names)
+        if not chunks:
+            return dict((self.names[position], numpy.empty(0)) for position in positions)
+        return dict((self.names[position], numpy.concatenate([chunk[self.names[position]]
+                                                              for chunk in chunks]))
+                    for position in positions)
+
+    def read_array(self, names=None, chunk_size=CHUNK_SIZE):
+        '''
+        Returns the columns as one float64 array of shape (rows, columns).
+        '''
+        columns = self.read(names, chunk_size)
+        return numpy.column_stack([columns[self.names[position]] for position in self.columns_of(names)])
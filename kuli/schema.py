@@ -0,0 +1,211 @@
+""" Cached index of the components, connectors and COM objects of a model
+
+Asking KULI for the connectors of a component type is a COM round-trip, and
+so is every unit lookup. ModelSchema collects this information once per scs
+file and keeps it in sets and dicts for fast membership checks. The index is
+stored on disk under the hash of the scs file, so later runs with an
+unchanged model do not need to start KULI at all:
+
+    schema = load_schema(r'C:\\models\\ExCAR_COM.scs')
+    schema.has_connector('Rad', 'ExitTempIM', 'S')
+"""
+import hashlib
+import json
+import os
+
+# version of the stored index format
+SCHEMA_VERSION = 1
+
+# default directory of stored indexes
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.kuli', 'schema')
+
+
+def split_ids(ids):
+    '''
+    Returns a list of IDs from either a string of IDs separated by spaces,
+    as returned by list_components, or a sequence of IDs.
+    '''
+    if ids is None:
+        return []
+    if isinstance(ids, str):
+        return ids.split()
+    return list(ids)
+
+
+def model_digest(kuli_file_name):
+    '''
+    Returns the SHA-256 hex digest of the content of a scs file.
+    :param kuli_file_name: name of the scs file
+    '''
+    digest = hashlib.sha256()
+    with open(kuli_file_name, 'rb') as scs_file:
+        for chunk in iter(lambda: scs_file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelSchema(object):
+    """ Components, connectors, units and COM objects of a KULI model """
+
+    def __init__(self, components=None, component_types=None, connectors=None,
+                 units=None, com_codes=None, digest=''):
+        '''
+        :param components: dict of component ID -> component type
+        :param component_types: set of all KULI component types
+        :param connectors: dict of component type -> {"S": set of sensors,
+        "A": set of actuators}
+        :param units: dict of component type -> {connector ID: unit}
+        :param com_codes: {"In": set of input COM IDs, "Out": set of output COM IDs}
+        :param digest: hash of the scs file the schema was built from
+        '''
+        self.components = components or {}
+        self.component_types = component_types or set()
+        self.connectors = connectors or {}
+        self.units = units or {}
+        self.com_codes = com_codes or {'In': set(), 'Out': set()}
+        self.digest = digest
+
+    @classmethod
+    def build(cls, kuli, digest=''):
+        '''
+        Collects the schema of the model loaded by an initialized KuliAnalysis.
+        :param kuli: initialized KuliAnalysis instance
+        :param digest: hash of the scs file, see model_digest
+        '''
+        components = {}
+        for component_id in split_ids(kuli.list_components('*')):
+            components[component_id] = component_id.rsplit('.', 1)[-1]
+        used_types = set(components.values())
+        component_types = set(split_ids(kuli.list_component_types())) | used_types
+
+        connectors = {}
+        for component_type in component_types:
+            connectors[component_type] = {
+                'S': set(split_ids(kuli.list_connectors(component_type, 'S'))),
+                'A': set(split_ids(kuli.list_connectors(component_type, 'A'))),
+            }
+
+        # units are only collected for the component types used by the model
+        units = {}
+        for component_type in used_types:
+            type_connectors = connectors[component_type]
+            units[component_type] = dict(
+                (connector_id, kuli.get_component_connector_unit(component_type, connector_id))
+                for connector_id in type_connectors['S'] | type_connectors['A'])
+
+        com_codes = {
+            'In': set(split_ids(kuli.get_com_codes(True))),
+            'Out': set(split_ids(kuli.get_com_codes(False))),
+        }
+        return cls(components, component_types, connectors, units, com_codes, digest)
+
+    def has_component(self, component_id):
+        ''' returns True if the model contains the component, e.g. "1.Rad" '''
+        return component_id in self.components
+
+    def has_connector(self, component_type, connector_id, connector_type='SA'):
+        '''
+        Returns True if the component type has the connector.
+        :param connector_type: "S" for sensors, "A" for actuators or "SA" for both
+        '''
+        connectors = self.connectors.get(component_type)
+        if connectors is None:
+            return False
+        return any(connector_id in connectors[kind] for kind in connector_type)
+
+    def list_connectors(self, component_type, connector_type='SA'):
+        ''' returns the set of connectors of a component type '''
+        connectors = self.connectors.get(component_type, {})
+        ids = set()
+        for kind in connector_type:
+            ids |= connectors.get(kind, set())
+        return ids
+
+    def connector_unit(self, component_type, connector_id):
+        ''' returns the unit of a connector or None if it is not known '''
+        return self.units.get(component_type, {}).get(connector_id)
+
+    def has_com_object(self, com_id, is_input_com_object):
+        ''' returns True if the input or output COM object exists '''
+        return com_id in self.com_codes['In' if is_input_com_object else 'Out']
+
+    def to_dict(self):
+        ''' returns the schema as JSON serializable dict '''
+        return {
+            'version': SCHEMA_VERSION,
+            'digest': self.digest,
+            'components': self.components,
+            'component_types': sorted(self.component_types),
+            'connectors': dict((component_type, dict((kind, sorted(ids)) for kind, ids in kinds.items()))
+                               for component_type, kinds in self.connectors.items()),
+            'units': self.units,
+            'com_codes': dict((kind, sorted(ids)) for kind, ids in self.com_codes.items()),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        ''' creates a schema from the result of to_dict '''
+        if data.get('version') != SCHEMA_VERSION:
+            raise ValueError('unsupported schema version: %s' % data.get('version'))
+        return cls(
+            data['components'],
+            set(data['component_types']),
+            dict((component_type, dict((kind, set(ids)) for kind, ids in kinds.items()))
+                 for component_type, kinds in data['connectors'].items()),
+            data['units'],
+            dict((kind, set(ids)) for kind, ids in data['com_codes'].items()),
+            data['digest'])
+
+    def save(self, file_name):
+        ''' stores the schema as JSON file '''
+        directory = os.path.dirname(file_name)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_name = file_name + '.tmp'
+        with open(tmp_name, 'w') as schema_file:
+            json.dump(self.to_dict(), schema_file)
+        os.replace(tmp_name, file_name)
+
+    @classmethod
+    def load(cls, file_name):
+        ''' reads a schema stored with save '''
+        with open(file_name) as schema_file:
+            return cls.from_dict(json.load(schema_file))
+
+
+def load_schema(kuli_file_name, kuli=None, cache_dir=None, start_kuli=None):
+    '''
+    Returns the schema of a scs file. A stored schema is used if the file did
+    not change, otherwise the schema is built and stored.
+    :param kuli_file_name: name of the scs file
+    :param kuli: initialized KuliAnalysis for the file, started if needed
+    :param cache_dir: directory of stored schemas, defaults to DEFAULT_CACHE_DIR
+    :param start_kuli: function starting KULI, defaults to KuliAnalysisHelper.start_kuli
+    '''
+    try:
+        digest = model_digest(kuli_file_name)
+    except OSError:
+        digest = ''  # not readable from here, KULI may still find it
+    schema_file = os.path.join(cache_dir or DEFAULT_CACHE_DIR, digest + '.json')
+    if digest and os.path.exists(schema_file):
+        try:
+            return ModelSchema.load(schema_file)
+        except (ValueError, KeyError):
+            pass  # outdated or broken, build it again
+
+    started = kuli is None
+    if started:
+        if start_kuli is None:
+            from KuliAnalysisHelper import start_kuli
+        kuli = start_kuli(kuli_file_name)
+        if kuli is None:
+            return None
+    try:
+        schema = ModelSchema.build(kuli, digest)
+    finally:
+        if started:
+            kuli.clean_up()
+
+    if digest and schema.components:
+        schema.save(schema_file)
+    return schema
@@ -0,0 +1,237 @@
+""" Snapshots of all COM values as NumPy arrays
+
+A Snapshot holds the values of all output (or input) COM objects read in one
+batched pass, together with a NameIndex mapping COM IDs to positions. The
+index is shared by all snapshots of the same COM codes, so stacking and
+comparing snapshots works on plain float arrays:
+
+    recorder = SnapshotRecorder(kuli)
+    with recorder:
+        kuli.run_analysis()           # one snapshot per operating point
+    table = recorder.table()          # 2-D table, one row per operating point
+    table.column('CoolantTemp')
+
+    before = kuli.snapshot()
+    ...
+    after = kuli.snapshot()
+    print(changed(before, after, atol=1e-6))
+"""
+import functools
+
+import numpy
+
+
+class NameIndex(object):
+    """ COM IDs of a snapshot and their positions """
+
+    def __init__(self, names):
+        '''
+        :param names: COM IDs, in the order of the values
+        '''
+        self.names = tuple(names)
+        self.positions = dict((name, position) for position, name in enumerate(self.names))
+        if len(self.positions) != len(self.names):
+            raise ValueError('names of a NameIndex must be unique')
+        self.dtype = numpy.dtype([(name, numpy.float64) for name in self.names])
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.positions
+
+    def position(self, name):
+        return self.positions[name]
+
+    def align(self, other):
+        '''
+        Returns the common names and their positions in this and the other index.
+        '''
+        if other is self:
+            positions = numpy.arange(len(self.names))
+            return self.names, positions, positions
+        names = tuple(name for name in self.names if name in other.positions)
+        return (names, numpy.array([self.positions[name] for name in names], dtype=numpy.intp),
+                numpy.array([other.positions[name] for name in names], dtype=numpy.intp))
+
+
+@functools.lru_cache(maxsize=64)
+def name_index(names):
+    '''
+    Returns the shared NameIndex of a tuple of names.
+    '''
+    return NameIndex(names)
+
+
+class Snapshot(object):
+    """ Values of all COM objects at one point of a simulation """
+
+    __slots__ = ('index', 'values', 'label')
+
+    def __init__(self, index, values, label=None):
+        '''
+        :param index: NameIndex of the values
+        :param values: float array with one value per name
+        :param label: e.g. the operating point
+        '''
+        self.index = index
+        self.values = values
+        self.label = label
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, name):
+        return float(self.values[self.index.positions[name]])
+
+    @property
+    def names(self):
+        return self.index.names
+
+    @property
+    def record(self):
+        ''' the values as structured array with one field per COM ID, without copy '''
+        return self.values.view(self.index.dtype)[0]
+
+    def as_dict(self):
+        return dict(zip(self.index.names, self.values.tolist()))
+
+
+def take_snapshot(kuli, is_input_com_object=False, label=None, codes=None):
+    '''
+    Reads all input or output COM values of a KuliAnalysis instance.
+    :param kuli: KuliAnalysis instance
+    :param is_input_com_object: True for input COM objects
+    :param label: label of the snapshot, e.g. the operating point
+    :param codes: COM IDs to read instead of get_com_codes
+    '''
+    if codes is None:
+        codes = kuli.get_com_codes(is_input_com_object) or ()
+    index = name_index(tuple(codes))
+    return Snapshot(index, kuli.get_com_values(index.names, as_array=True), label)
+
+
+class SnapshotTable(object):
+    """ Stacked snapshots, one row per snapshot """
+
+    def __init__(self, index, values, labels=None):
+        '''
+        :param index: NameIndex of the columns
+        :param values: float array of shape (snapshots, names)
+        :param labels: label of each row
+        '''
+        self.index = index
+        self.values = values
+        self.labels = list(labels) if labels is not None else [None] * len(values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, row):
+        return Snapshot(self.index, self.values[row], self.labels[row])
+
+    @property
+    def names(self):
+        return self.index.names
+
+    @property
+    def records(self):
+        ''' the rows as structured array with one field per COM ID, without copy '''
+        return self.values.view(self.index.dtype)[:, 0]
+
+    def column(self, name):
+        ''' returns the values of one COM object in all rows '''
+        return self.values[:, self.index.positions[name]]
+
+    def row(self, label):
+        ''' returns the snapshot with the label '''
+        return self[self.labels.index(label)]
+
+
+def stack(snapshots):
+    '''
+    Stacks snapshots of the same COM objects into a SnapshotTable.
+    '''
+    snapshots = list(snapshots)
+    if not snapshots:
+        raise ValueError('no snapshots to stack')
+    index = snapshots[0].index
+    if any(snapshot.index is not index and snapshot.index.names != index.names for snapshot in snapshots):
+        raise ValueError('snapshots of different COM objects cannot be stacked')
+    values = numpy.empty((len(snapshots), len(index)))
+    for row, snapshot in enumerate(snapshots):
+        values[row] = snapshot.values
+    return SnapshotTable(index, values, [snapshot.label for snapshot in snapshots])
+
+
+def _aligned(a, b):
+    names, a_positions, b_positions = a.index.align(b.index)
+    if a.index is b.index:
+        return names, a.values, b.values
+    return names, a.values[..., a_positions], b.values[..., b_positions]
+
+
+def diff(a, b):
+    '''
+    Returns the common names and the differences b - a of two snapshots or
+    tables with rows of the same count.
+    '''
+    names, a_values, b_values = _aligned(a, b)
+    return names, b_values - a_values
+
+
+def isclose(a, b, atol=0.0, rtol=1e-9):
+    '''
+    Returns the common names and a bool array that is True where
+    |b - a| <= atol + rtol * |a|. NaN equals NaN.
+    '''
+    names, a_values, b_values = _aligned(a, b)
+    return names, numpy.isclose(b_values, a_values, rtol=rtol, atol=atol, equal_nan=True)
+
+
+def changed(a, b, atol=0.0, rtol=1e-9):
+    '''
+    Returns a dict of name -> (value in a, value in b) for the COM objects of
+    two snapshots that differ by more than the tolerance.
+    '''
+    names, close = isclose(a, b, atol, rtol)
+    _, a_values, b_values = _aligned(a, b)
+    return dict((names[position], (float(a_values[position]), float(b_values[position])))
+                for position in numpy.flatnonzero(~close))
+
+
+class SnapshotRecorder(object):
+    """ Takes a snapshot at the end of every operating point """
+
+    def __init__(self, kuli, is_input_com_object=False, codes=None):
+        '''
+        :param kuli: KuliAnalysis instance
+        :param is_input_com_object: True for input COM objects
+        :param codes: COM IDs to read instead of get_com_codes
+        '''
+        self.kuli = kuli
+        self.is_input_com_object = is_input_com_object
+        self.codes = codes
+        self.snapshots = []
+
+    def __end_of_operating_point(self, operating_point):
+        if self.codes is None:
+            self.codes = tuple(self.kuli.get_com_codes(self.is_input_com_object) or ())
+        self.snapshots.append(take_snapshot(self.kuli, label=operating_point, codes=self.codes))
+
+    def attach(self):
+        self.kuli.add_event_listener('OnEndOfOperatingPoint', self.__end_of_operating_point)
+
+    def detach(self):
+        self.kuli.remove_event_listener('OnEndOfOperatingPoint', self.__end_of_operating_point)
+
+    def __enter__(self):
+        self.attach()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.detach()
+
+    def table(self):
+        ''' returns the snapshots taken so far as SnapshotTable '''
+        return stack(self.snapshots)
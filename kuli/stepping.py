@@ -0,0 +1,119 @@
+""" Closed-loop stepping of a KULI simulation with bulk input schedules
+
+StepDriver runs a simulation time step by time step with
+next_kuli_iteration. Before every time step it writes one row of an input
+schedule to the actuators, after it reads the outputs into one row of a
+preallocated result matrix:
+
+    driver = StepDriver(kuli, ['1.Fan.Speed', '1.Pump.Speed'], ['1.Rad.ExitTempIM'])
+    outputs = driver.run(schedule)  # schedule has one row per time step
+
+The end of a time step is taken from OnEndOfTimeStep, which costs no extra
+COM call. Until that event has been seen, is_next_time_step and is_finished
+are polled after every iteration, so the driver also works when events are
+not delivered.
+
+A controller can adjust the inputs of each step from the previous outputs:
+
+    def controller(step, outputs, inputs):
+        inputs[0] = 2000.0 if outputs[0] > 360.0 else 1000.0
+"""
+import numpy
+
+from kuli.connector import parse_connectors
+
+
+class StepDriver(object):
+    """ Applies an input schedule step by step and collects the outputs """
+
+    def __init__(self, kuli, actuators, outputs, controller=None, max_iterations=10000):
+        '''
+        :param kuli: initialized KuliAnalysis instance
+        :param actuators: actuators written from the schedule columns, see
+        KuliAnalysis.set_values
+        :param outputs: sensors read after every time step
+        :param controller: function(step, outputs, inputs) called before every
+        time step with the outputs of the previous step (NaN for the first)
+        and the inputs from the schedule, which it may change in place
+        :param max_iterations: iterations after which a time step is aborted
+        '''
+        self.kuli = kuli
+        self.actuators = parse_connectors(actuators)
+        self.outputs = parse_connectors(outputs)
+        self.controller = controller
+        self.max_iterations = max_iterations
+        self.iterations = None
+        self.inputs = None
+        self.__step_done = False
+        self.__events = False
+        self.__row = None
+
+    def __end_of_time_step(self, time_step, time):
+        # read at the end of the step, before KULI moves on to the next one
+        self.__row[:] = self.kuli.get_values(self.outputs)
+        self.__step_done = True
+        self.__events = True
+
+    def run(self, schedule, start=True):
+        '''
+        Runs one time step per schedule row and returns the outputs as array
+        of shape (time steps, outputs). The result is shorter than the
+        schedule if the simulation finishes early. The inputs actually
+        applied are stored in self.inputs, the iterations per step in
+        self.iterations.
+        :param schedule: array of shape (time steps, actuators)
+        :param start: call start_analysis first
+        '''
+        schedule = numpy.asarray(schedule, dtype=float)
+        if schedule.ndim != 2 or schedule.shape[1] != len(self.actuators):
+            raise ValueError('schedule must have one column per actuator')
+        steps = schedule.shape[0]
+        results = numpy.full((steps, len(self.outputs)), numpy.nan)
+        self.iterations = numpy.zeros(steps, dtype=numpy.int64)
+        self.inputs = schedule.copy() if self.controller is not None else schedule
+
+        kuli = self.kuli
+        actuators = self.actuators
+        controller = self.controller
+        next_iteration = kuli.next_kuli_iteration
+        is_next_time_step = kuli.is_next_time_step
+        is_finished = kuli.is_finished
+        previous = numpy.full(len(self.outputs), numpy.nan)
+
+        if start and not kuli.start_analysis():
+            raise RuntimeError('KULI analysis could not be started')
+        self.__events = False
+        kuli.add_event_listener('OnEndOfTimeStep', self.__end_of_time_step)
+        try:
+            for step in range(steps):
+                inputs = self.inputs[step]
+                if controller is not None:
+                    controller(step, previous, inputs)
+                kuli.set_values(zip(actuators, inputs.tolist()))
+
+                # once OnEndOfTimeStep is seen, one COM call per iteration
+                self.__row = results[step]
+                self.__step_done = False
+                iteration = 0
+                while iteration < self.max_iterations:
+                    iteration += 1
+                    if not next_iteration() or self.__step_done:
+                        break
+                    if not self.__events and (is_next_time_step() or is_finished()):
+                        results[step] = kuli.get_values(self.outputs)
+                        self.__step_done = True
+                        break
+                self.iterations[step] = iteration
+
+                if not self.__step_done:
+                    break
+                previous = self.__row
+                if is_finished():
+                    step += 1
+                    break
+            else:
+                step = steps
+        finally:
+            kuli.remove_event_listener('OnEndOfTimeStep', self.__end_of_time_step)
+        self.iterations = self.iterations[:step]
+        return results[:step]
@@ -0,0 +1,263 @@
+""" Monte Carlo and parameter variation studies run on a KuliPool
+
+Replaces run_monte_carlo and run_parameter_variation, which run serially
+inside one KULI instance, by a design generated in Python and dealt out to
+the workers of a KuliPool. Every sample sets the input COM objects with
+set_com_value_by_id and simulates one operating point. Results are written
+into a ResultStore, one memory-mapped .npy file per column, together with
+a mask of the finished samples. An interrupted study continues where it
+stopped when it is run again with the same store directory:
+
+    design = latin_hypercube({'AmbientTemp': (-20.0, 45.0), 'VehicleSpeed': (0.0, 200.0)}, 10000)
+    study = Study(design, 'study_dir', outputs=['CoolantTemp', 'FanPower'])
+    with KuliPool(r'C:\\models\\ExCAR_COM.scs', outputs=study.outputs) as pool:
+        for result in study.run(pool):
+            print(result.index, result.outputs)
+    results = study.store.read()
+"""
+import itertools
+import json
+import os
+import time
+
+import numpy
+
+from kuli.connector import parse_connectors, signal_name
+
+# sample status in the store
+PENDING = 0
+DONE = 1
+FAILED = 2
+
+
+class Design(object):
+    """ Input COM values of all samples of a study """
+
+    def __init__(self, com_ids, values):
+        '''
+        :param com_ids: IDs of the input COM objects
+        :param values: array of shape (samples, COM objects)
+        '''
+        self.com_ids = list(com_ids)
+        self.values = numpy.asarray(values, dtype=float)
+        if self.values.ndim != 2 or self.values.shape[1] != len(self.com_ids):
+            raise ValueError('values must have one column per COM object')
+
+    def __len__(self):
+        return len(self.values)
+
+    def sample(self, index):
+        ''' returns the (com_id, value) pairs of one sample '''
+        return list(zip(self.com_ids, self.values[index].tolist()))
+
+
+def _bounds(parameters):
+    com_ids = list(parameters)
+    bounds = numpy.array([parameters[com_id] for com_id in com_ids], dtype=float).reshape(len(com_ids), 2)
+    return com_ids, bounds[:, 0], bounds[:, 1]
+
+
+def random_design(parameters, samples, seed=None):
+    '''
+    Draws samples uniformly distributed between the bounds.
+    :param parameters: dict of input COM ID -> (lower bound, upper bound)
+    :param samples: number of samples
+    :param seed: seed of the random generator
+    '''
+    com_ids, lower, upper = _bounds(parameters)
+    random = numpy.random.default_rng(seed)
+    return Design(com_ids, lower + (upper - lower) * random.random((samples, len(com_ids))))
+
+
+def latin_hypercube(parameters, samples, seed=None):
+    '''
+    Draws a Latin hypercube sample: the range of every COM object is cut
+    into as many intervals as samples and every interval is hit once.
+    :param parameters: dict of input COM ID -> (lower bound, upper bound)
+    :param samples: number of samples
+    :param seed: seed of the random generator
+    '''
+    com_ids, lower, upper = _bounds(parameters)
+    random = numpy.random.default_rng(seed)
+    strata = numpy.argsort(random.random((samples, len(com_ids))), axis=0)
+    unit = (strata + random.random((samples, len(com_ids)))) / samples
+    return Design(com_ids, lower + (upper - lower) * unit)
+
+
+def full_factorial(levels):
+    '''
+    Combines all levels of all COM objects, the last COM object varies fastest.
+    :param levels: dict of input COM ID -> values
+    '''
+    com_ids = list(levels)
+    values = list(itertools.product(*[list(levels[com_id]) for com_id in com_ids]))
+    return Design(com_ids, numpy.array(values, dtype=float).reshape(len(values), len(com_ids)))
+
+
+class ResultStore(object):
+    """ Columns of a study as memory-mapped .npy files with a status mask """
+
+    META_FILE = 'store.json'
+    STATUS_FILE = 'status.npy'
+
+    def __init__(self, directory, names, samples):
+        '''
+        Opens the store in directory, creating it if it does not exist.
+        :param directory: directory of the column files
+        :param names: column names
+        :param samples: number of rows
+        '''
+        self.directory = directory
+        self.names = list(names)
+        self.samples = samples
+        meta_file = os.path.join(directory, self.META_FILE)
+        if os.path.exists(meta_file):
+            with open(meta_file) as store_file:
+                meta = json.load(store_file)
+            if meta['names'] != self.names or meta['samples'] != samples:
+                raise ValueError('%s holds another study' % directory)
+            mode = 'r+'
+        else:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            mode = 'w+'
+        open_memmap = numpy.lib.format.open_memmap
+        self.columns = dict(
+            (name, open_memmap(self.__column_file(position), mode, float, (samples,)))
+            for position, name in enumerate(self.names))
+        self.status = open_memmap(os.path.join(directory, self.STATUS_FILE), mode, numpy.int8, (samples,))
+        if mode == 'w+':
+            for column in self.columns.values():
+                column[:] = numpy.nan
+            self.flush()
+            # written last, a store without it is created again
+            with open(meta_file, 'w') as store_file:
+                json.dump({'names': self.names, 'samples': samples}, store_file)
+
+    def __column_file(self, position):
+        return os.path.join(self.directory, 'column_%d.npy' % position)
+
+    def pending(self, retry_failed=True):
+        ''' returns the indices of the samples still to run '''
+        if retry_failed:
+            return numpy.flatnonzero(self.status != DONE)
+        return numpy.flatnonzero(self.status == PENDING)
+
+    def write(self, index, values, status=DONE):
+        '''
+        Writes one row.
+        :param index: sample index
+        :param values: dict of column name -> value
+        :param status: DONE or FAILED
+        '''
+        columns = self.columns
+        for name, value in values.items():
+            columns[name][index] = value
+        self.status[index] = status
+
+    def flush(self):
+        ''' writes the columns to disk, then the status mask '''
+        for column in self.columns.values():
+            column.flush()
+        self.status.flush()
+
+    def read(self, done_only=True):
+        '''
+        Returns a dict of column name -> array.
+        :param done_only: only rows of finished samples
+        '''
+        if done_only:
+            mask = self.status == DONE
+            return dict((name, numpy.array(column[mask])) for name, column in self.columns.items())
+        return dict((name, numpy.array(column)) for name, column in self.columns.items())
+
+    def close(self):
+        self.flush()
+        self.columns.clear()
+        self.status = None
+
+
+class Study(object):
+    """ Runs a Design on a KuliPool and stores the results """
+
+    def __init__(self, design, directory, outputs=(), signals=(), operating_point=1,
+                 checkpoint_interval=5.0):
+        '''
+        :param design: Design with the input COM values of the samples
+        :param directory: directory of the ResultStore, an existing store
+        of the same study is resumed
+        :param outputs: IDs of output COM objects stored per sample, must
+        match the outputs of the pool
+        :param signals: sensors stored per sample, must match the signals
+        of the pool
+        :param operating_point: operating point simulated for every sample
+        :param checkpoint_interval: seconds between flushes of the store
+        '''
+        self.design = design
+        self.outputs = list(outputs)
+        self.signals = list(signals)
+        self.operating_point = operating_point
+        self.checkpoint_interval = checkpoint_interval
+        self.errors = {}
+        self.__signal_names = [signal_name(signal) for signal in parse_connectors(self.signals)]
+        names = design.com_ids + self.outputs + self.__signal_names
+        if len(set(names)) != len(names):
+            raise ValueError('column names of inputs, outputs and signals must be unique')
+        self.store = ResultStore(directory, names, len(design))
+        for position, com_id in enumerate(design.com_ids):
+            stored = self.store.columns[com_id]
+            written = self.store.status != PENDING
+            if not numpy.array_equal(stored[written], design.values[written, position]):
+                raise ValueError('%s holds results of another design' % directory)
+
+    @property
+    def completed(self):
+        ''' number of finished samples '''
+        return int((self.store.status == DONE).sum())
+
+    def run(self, pool, retry_failed=True):
+        '''
+        Runs all samples that are not finished yet and yields their
+        PoolResults in the order they finish. The store is flushed every
+        checkpoint_interval seconds and when the run ends or is interrupted.
+        :param pool: KuliPool with the outputs and signals of the study
+        :param retry_failed: run failed samples again
+        '''
+        if list(pool.outputs) != self.outputs or \
+                [signal_name(signal) for signal in parse_connectors(pool.signals)] != self.__signal_names:
+            raise ValueError('the pool must read the outputs and signals of the study')
+        indices = self.store.pending(retry_failed)
+        design = self.design
+        operating_point = self.operating_point
+        items = [(design.sample(index), operating_point) for index in indices]
+
+        store = self.store
+        output_names = self.outputs
+        signal_names = self.__signal_names
+        last_checkpoint = time.time()
+        try:
+            for result in pool.imap('sample', items):
+                index = int(indices[result.index])
+                values = dict(zip(design.com_ids, design.values[index].tolist()))
+                if result.ok:
+                    values.update(zip(output_names, result.outputs or ()))
+                    values.update(zip(signal_names, result.signals or ()))
+                    self.errors.pop(index, None)
+                    store.write(index, values, DONE)
+                else:
+                    self.errors[index] = result.error
+                    store.write(index, values, FAILED)
+                yield result._replace(index=index)
+                if time.time() - last_checkpoint >= self.checkpoint_interval:
+                    store.flush()
+                    last_checkpoint = time.time()
+        finally:
+            store.flush()
+
+    def run_all(self, pool, retry_failed=True):
+        '''
+        Runs all pending samples and returns the number of failed samples.
+        '''
+        for _ in self.run(pool, retry_failed):
+            pass
+        return int((self.store.status == FAILED).sum())
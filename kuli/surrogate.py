@@ -0,0 +1,349 @@
+""" Response surface that answers queries close to known results
+
+A Surrogate learns the mapping from input COM values to output COM values of
+one operating point with radial basis function interpolation. Queries whose
+estimated error is below the tolerance are answered by the interpolation,
+all others are simulated with simulate_operating_point and the result is
+added to the training set:
+
+    surrogate = Surrogate(kuli, ['AmbientTemp', 'VehicleSpeed'], ['CoolantTemp'],
+                          tolerance=0.05)
+    surrogate.add_store(study.store)          # results of an earlier Study
+    result = surrogate.evaluate([25.0, 120.0])
+    print(result.outputs, result.simulated, surrogate.stats)
+
+The error is estimated from the leave-one-out errors of the nearest training
+points, scaled up with the distance of the query from them. It is a
+heuristic, so the tolerance should have some margin. Queries outside the
+range of the training inputs are always simulated.
+"""
+import collections
+
+import numpy
+
+# kernels as function of the distance, all conditionally positive definite
+# of order 2 or less, so a linear polynomial tail keeps the system solvable
+KERNELS = {
+    'cubic': lambda r, epsilon: r ** 3,
+    'thin_plate': lambda r, epsilon: numpy.where(r > 0.0, r ** 2 * numpy.log(numpy.maximum(r, 1e-300)), 0.0),
+    'linear': lambda r, epsilon: -r,
+    'multiquadric': lambda r, epsilon: -numpy.sqrt(1.0 + (epsilon * r) ** 2),
+    'gaussian': lambda r, epsilon: numpy.exp(-(epsilon * r) ** 2),
+}
+
+
+def _distances(a, b):
+    ''' Euclidean distances between the rows of a and b '''
+    squared = (a * a).sum(axis=1)[:, None] + (b * b).sum(axis=1)[None, :] - 2.0 * a @ b.T
+    return numpy.sqrt(numpy.maximum(squared, 0.0))
+
+
+class RBFModel(object):
+    """ RBF interpolation with a linear tail and leave-one-out errors """
+
+    def __init__(self, kernel='cubic', epsilon=1.0, smoothing=0.0):
+        '''
+        :param kernel: name of a kernel in KERNELS
+        :param epsilon: shape parameter of the multiquadric and gaussian kernels
+        :param smoothing: added to the diagonal, 0 interpolates exactly
+        '''
+        if kernel not in KERNELS:
+            raise ValueError('unknown kernel: %s' % kernel)
+        self.kernel = kernel
+        self.epsilon = epsilon
+        self.smoothing = smoothing
+        self.centers = None
+        self.loo_errors = None
+        self.spacing = None
+        self.__lower = None
+        self.__scale = None
+        self.__weights = None
+        self.__inverse = None
+        self.__inputs = None
+        self.__outputs = None
+        # kernel, epsilon and smoothing of the last fit, a change needs a refit
+        self.fitted_with = None
+        self.__fit_size = 0
+
+    def normalize(self, inputs):
+        ''' maps inputs to the unit cube of the training inputs '''
+        return (numpy.asarray(inputs, dtype=float) - self.__lower) / self.__scale
+
+    def fit(self, inputs, outputs):
+        '''
+        Fits the model to training data, O(points³).
+        :param inputs: array of shape (points, inputs)
+        :param outputs: array of shape (points, outputs)
+        '''
+        inputs = numpy.array(inputs, dtype=float)
+        outputs = numpy.array(outputs, dtype=float)
+        count, dimensions = inputs.shape
+        self.__lower = inputs.min(axis=0)
+        self.__scale = numpy.where(inputs.max(axis=0) > self.__lower, inputs.max(axis=0) - self.__lower, 1.0)
+        centers = self.normalize(inputs)
+
+        distances = _distances(centers, centers)
+        tail = numpy.hstack((numpy.ones((count, 1)), centers))
+        system = numpy.zeros((count + dimensions + 1, count + dimensions + 1))
+        system[:count, :count] = KERNELS[self.kernel](distances, self.epsilon)
+        system[:count, :count] += self.smoothing * numpy.eye(count)
+        system[:count, count:] = tail
+        system[count:, :count] = tail.T
+        try:
+            self.__inverse = numpy.linalg.inv(system)
+        except numpy.linalg.LinAlgError:
+            self.__inverse = numpy.linalg.pinv(system)
+        numpy.fill_diagonal(distances, numpy.inf)
+        self.spacing = distances.min(axis=1) if count > 1 else numpy.ones(1)
+        self.centers = centers
+        self.__inputs = inputs
+        self.__outputs = outputs
+        self.fitted_with = (self.kernel, self.epsilon, self.smoothing)
+        self.__fit_size = count
+        self.__solve()
+
+    def __solve(self):
+        count, dimensions = self.centers.shape
+        right_side = numpy.vstack((self.__outputs, numpy.zeros((dimensions + 1, self.__outputs.shape[1]))))
+        self.__weights = self.__inverse @ right_side
+        # Rippa: the leave-one-out error of point i is c_i / (A^-1)_ii
+        self.loo_errors = numpy.abs(self.__weights[:count] / numpy.diag(self.__inverse)[:count, None])
+
+    def add(self, inputs, outputs):
+        '''
+        Appends training points. Points in the range of the training inputs
+        are added by a bordered update of the inverse system in O(points²).
+        Points outside it change the normalization, so they refit the model
+        like a changed kernel, epsilon or smoothing or an ill-conditioned
+        update does. The model is also refitted whenever the points doubled
+        since the last fit, which bounds the rounding errors of the updates
+        and keeps the mean cost per point at O(points²).
+        :param inputs: array of shape (points, inputs)
+        :param outputs: array of shape (points, outputs)
+        '''
+        inputs = numpy.atleast_2d(numpy.asarray(inputs, dtype=float))
+        outputs = numpy.atleast_2d(numpy.asarray(outputs, dtype=float))
+        if self.centers is None:
+            return self.fit(inputs, outputs)
+        points = self.normalize(inputs)
+        inside = ((points >= 0.0) & (points <= 1.0)).all()
+        if not inside or self.fitted_with != (self.kernel, self.epsilon, self.smoothing) \
+                or len(self.centers) + len(points) >= 2 * self.__fit_size:
+            return self.fit(numpy.vstack((self.__inputs, inputs)), numpy.vstack((self.__outputs, outputs)))
+        for position, point in enumerate(points):
+            if not self.__append(point):
+                return self.fit(numpy.vstack((self.__inputs, inputs[position:])),
+                                numpy.vstack((self.__outputs, outputs[position:])))
+            self.__inputs = numpy.vstack((self.__inputs, inputs[position]))
+            self.__outputs = numpy.vstack((self.__outputs, outputs[position]))
+        self.__solve()
+
+    def __append(self, point):
+        ''' adds one normalized point to the inverse system, returns False if that is ill-conditioned '''
+        count = len(self.centers)
+        kernel = KERNELS[self.kernel]
+        distances = _distances(point[None, :], self.centers)[0]
+        # new row and column of the system, ordered like the inverse: points, then the tail
+        border = numpy.concatenate((kernel(distances, self.epsilon), [1.0], point))
+        corner = float(kernel(numpy.zeros(1), self.epsilon)[0]) + self.smoothing
+        projected = self.__inverse @ border
+        schur = corner - border @ projected
+        if not numpy.isfinite(schur) or abs(schur) <= 1e-10 * max(1.0, abs(corner), abs(border @ projected)):
+            return False
+        size = len(border) + 1
+        inverse = numpy.empty((size, size))
+        inverse[:-1, :-1] = self.__inverse + numpy.outer(projected, projected) / schur
+        inverse[:-1, -1] = inverse[-1, :-1] = -projected / schur
+        inverse[-1, -1] = 1.0 / schur
+        # move the new point in front of the tail
+        order = numpy.r_[0:count, size - 1, count:size - 1]
+        self.__inverse = inverse[numpy.ix_(order, order)]
+        self.spacing = distances.copy() if count == 1 else numpy.minimum(self.spacing, distances)
+        self.spacing = numpy.append(self.spacing, distances.min())
+        self.centers = numpy.vstack((self.centers, point))
+        return True
+
+    def predict(self, inputs, neighbours=3):
+        '''
+        Returns the interpolated outputs and their estimated errors, both of
+        shape (queries, outputs), and whether each query lies in the range
+        of the training inputs.
+        :param inputs: array of shape (queries, inputs)
+        :param neighbours: number of training points the error is estimated from
+        '''
+        points = self.normalize(numpy.atleast_2d(inputs))
+        distances = _distances(points, self.centers)
+        basis = KERNELS[self.kernel](distances, self.epsilon)
+        tail = numpy.hstack((numpy.ones((len(points), 1)), points))
+        outputs = numpy.hstack((basis, tail)) @ self.__weights
+
+        neighbours = min(neighbours, len(self.centers))
+        nearest = numpy.argpartition(distances, neighbours - 1, axis=1)[:, :neighbours]
+        near_distances = numpy.take_along_axis(distances, nearest, axis=1)
+        growth = numpy.maximum(1.0, near_distances / numpy.maximum(self.spacing[nearest], 1e-12))
+        errors = (self.loo_errors[nearest] * growth[:, :, None]).max(axis=1)
+        inside = ((points >= -1e-9) & (points <= 1.0 + 1e-9)).all(axis=1)
+        return outputs, errors, inside
+
+
+class SurrogateResult(collections.namedtuple('SurrogateResult', 'outputs error simulated')):
+    """ Outputs of a query, their estimated error and whether KULI was run """
+
+    __slots__ = ()
+
+
+class Surrogate(object):
+    """ Answers queries from an RBF model or by simulation """
+
+    def __init__(self, kuli, inputs, outputs, tolerance, operating_point=1, kernel='cubic',
+                 epsilon=1.0, smoothing=0.0, min_points=None, neighbours=3):
+        '''
+        :param kuli: initialized KuliAnalysis instance used for simulations
+        :param inputs: IDs of the input COM objects of a query
+        :param outputs: IDs of the output COM objects predicted
+        :param tolerance: largest accepted error, a number, a sequence with
+        one value per output or a dict of output ID -> tolerance
+        :param operating_point: operating point simulated
+        :param kernel: RBF kernel, see KERNELS
+        :param epsilon: shape parameter of the kernel
+        :param smoothing: smoothing of the interpolation
+        :param min_points: training points needed before queries are
+        answered, defaults to twice the number of inputs plus one
+        :param neighbours: training points the error is estimated from
+        '''
+        self.kuli = kuli
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        if hasattr(tolerance, 'items'):
+            tolerance = [tolerance[com_id] for com_id in self.outputs]
+        self.tolerance = numpy.broadcast_to(numpy.asarray(tolerance, dtype=float), (len(self.outputs),)).copy()
+        self.operating_point = operating_point
+        self.model = RBFModel(kernel, epsilon, smoothing)
+        self.min_points = min_points if min_points is not None else 2 * len(self.inputs) + 1
+        self.neighbours = neighbours
+        self.queries = 0
+        self.avoided = 0
+        self.simulations = 0
+        self.failed = 0
+        self.__training = collections.OrderedDict()
+        self.__fitted = False
+        # points added since the last fit, appended to the model incrementally
+        self.__new = []
+
+    def __len__(self):
+        return len(self.__training)
+
+    def add(self, inputs, outputs):
+        '''
+        Adds a known result to the training set.
+        :param inputs: values of the input COM objects
+        :param outputs: values of the output COM objects
+        '''
+        key = tuple(float(value) for value in inputs)
+        values = numpy.asarray(outputs, dtype=float)
+        if len(key) != len(self.inputs) or values.shape != (len(self.outputs),):
+            raise ValueError('expected %d inputs and %d outputs' % (len(self.inputs), len(self.outputs)))
+        if numpy.isfinite(values).all():
+            if key in self.__training:
+                self.__fitted = False  # a changed result needs a refit
+            else:
+                self.__new.append(key)
+            self.__training[key] = values
+
+    def add_many(self, inputs, outputs):
+        '''
+        Adds known results, one row per result.
+        '''
+        for row_inputs, row_outputs in zip(numpy.asarray(inputs, dtype=float), numpy.asarray(outputs, dtype=float)):
+            self.add(row_inputs, row_outputs)
+
+    def add_store(self, store):
+        '''
+        Adds the finished samples of a kuli.study.ResultStore holding the
+        input and output COM objects of the surrogate.
+        '''
+        columns = store.read()
+        self.add_many(numpy.column_stack([columns[com_id] for com_id in self.inputs]),
+                      numpy.column_stack([columns[com_id] for com_id in self.outputs]))
+
+    def __fit(self):
+        model = self.model
+        if not self.__fitted or model.fitted_with != (model.kernel, model.epsilon, model.smoothing):
+            points = numpy.array(list(self.__training))
+            model.fit(points, numpy.array(list(self.__training.values())))
+            self.__fitted = True
+        elif self.__new:
+            model.add(numpy.array(self.__new), numpy.array([self.__training[key] for key in self.__new]))
+        self.__new = []
+
+    def predict(self, inputs):
+        '''
+        Returns the interpolated outputs and their estimated errors without
+        simulating, or None while there are too few training points.
+        '''
+        if len(self.__training) < max(self.min_points, len(self.inputs) + 2):
+            return None
+        self.__fit()
+        outputs, errors, inside = self.model.predict(numpy.asarray(inputs, dtype=float), self.neighbours)
+        errors[~inside] = numpy.inf
+        return outputs, errors
+
+    def simulate(self, inputs):
+        '''
+        Simulates the operating point with the inputs, adds the result to the
+        training set and returns the outputs, or None if KULI failed.
+        '''
+        kuli = self.kuli
+        self.simulations += 1
+        kuli.set_com_values(zip(self.inputs, inputs))
+        if not kuli.simulate_operating_point(self.operating_point):
+            self.failed += 1
+            return None
+        outputs = kuli.get_com_values(self.outputs, as_array=True)
+        self.add(inputs, outputs)
+        return outputs
+
+    def evaluate(self, inputs):
+        '''
+        Returns a SurrogateResult for one query. The outputs are NaN if the
+        query had to be simulated and the simulation failed.
+        :param inputs: values of the input COM objects
+        '''
+        self.queries += 1
+        inputs = [float(value) for value in inputs]
+        prediction = self.predict([inputs])
+        if prediction is not None:
+            outputs, errors = prediction[0][0], prediction[1][0]
+            if (errors <= self.tolerance).all():
+                self.avoided += 1
+                return SurrogateResult(outputs, errors, False)
+        outputs = self.simulate(inputs)
+        if outputs is None:
+            outputs = numpy.full(len(self.outputs), numpy.nan)
+        return SurrogateResult(outputs, numpy.zeros(len(self.outputs)), True)
+
+    def evaluate_many(self, inputs):
+        '''
+        Evaluates several queries, one row per query. Returns the outputs and
+        a bool array that is True for simulated rows.
+        '''
+        inputs = numpy.atleast_2d(numpy.asarray(inputs, dtype=float))
+        outputs = numpy.empty((len(inputs), len(self.outputs)))
+        simulated = numpy.zeros(len(inputs), dtype=bool)
+        for row, query in enumerate(inputs):
+            result = self.evaluate(query)
+            outputs[row] = result.outputs
+            simulated[row] = result.simulated
+        return outputs, simulated
+
+    @property
+    def stats(self):
+        ''' dict with the numbers of queries, avoided and run simulations '''
+        return {
+            'queries': self.queries,
+            'avoided': self.avoided,
+            'simulations': self.simulations,
+            'failed': self.failed,
+            'avoided_rate': self.avoided / self.queries if self.queries else 0.0,
+            'training_points': len(self.__training),
+        }
@@ -0,0 +1,255 @@
+""" Client side unit conversion for batched reads and writes
+
+get_value_unit and set_value_unit let KULI convert every single value. A
+UnitRegistry looks up the base unit of each signal once and converts whole
+batches read in base units with NumPy instead:
+
+    registry = UnitRegistry(kuli)
+    converter = registry.converter(refs, ['degC', 'kW'])
+    registry.verify(converter)
+    values = registry.get_values_unit(converter)
+
+Signals whose target unit equals the base unit or has the same definition
+in UNITS (e.g. "degC" and "°C") are passed through without any arithmetic.
+Other conversions use the affine definitions in UNITS, which can differ
+from the server in the last bits. verify compares them with get_value_unit
+on the current values and routes signals that disagree back through KULI;
+one value per signal does not prove agreement for all values. With
+exact=True only the pass-through signals are converted on the client.
+"""
+import numpy
+
+from kuli.connector import ConnectorRef, parse_connectors
+
+# unit -> (base unit, factor, offset), value in base unit = value * factor + offset
+UNITS = {
+    # temperature
+    'K': ('K', 1.0, 0.0),
+    'degC': ('K', 1.0, 273.15),
+    '°C': ('K', 1.0, 273.15),
+    'degF': ('K', 5.0 / 9.0, 273.15 - 32.0 * 5.0 / 9.0),
+    # power and energy
+    'W': ('W', 1.0, 0.0),
+    'kW': ('W', 1000.0, 0.0),
+    'J': ('J', 1.0, 0.0),
+    'kJ': ('J', 1000.0, 0.0),
+    # pressure
+    'Pa': ('Pa', 1.0, 0.0),
+    'hPa': ('Pa', 100.0, 0.0),
+    'kPa': ('Pa', 1000.0, 0.0),
+    'mbar': ('Pa', 100.0, 0.0),
+    'bar': ('Pa', 100000.0, 0.0),
+    # mass flow
+    'kg/s': ('kg/s', 1.0, 0.0),
+    'kg/min': ('kg/s', 1.0 / 60.0, 0.0),
+    'kg/h': ('kg/s', 1.0 / 3600.0, 0.0),
+    # volume flow
+    'm3/s': ('m3/s', 1.0, 0.0),
+    'm3/h': ('m3/s', 1.0 / 3600.0, 0.0),
+    'l/s': ('m3/s', 0.001, 0.0),
+    'l/min': ('m3/s', 0.001 / 60.0, 0.0),
+    # speed
+    'm/s': ('m/s', 1.0, 0.0),
+    'km/h': ('m/s', 1.0 / 3.6, 0.0),
+    '1/min': ('1/min', 1.0, 0.0),
+    '1/s': ('1/min', 60.0, 0.0),
+    # length and time
+    'm': ('m', 1.0, 0.0),
+    'mm': ('m', 0.001, 0.0),
+    's': ('s', 1.0, 0.0),
+    'min': ('s', 60.0, 0.0),
+    'h': ('s', 3600.0, 0.0),
+    # dimensionless
+    '-': ('-', 1.0, 0.0),
+    '%': ('-', 0.01, 0.0),
+}
+
+
+def convert(value, from_unit, to_unit):
+    '''
+    Converts a value or array between two units with the same base unit.
+    :param value: value given in from_unit
+    :param from_unit: unit of the value
+    :param to_unit: unit the value is converted to
+    '''
+    if from_unit == to_unit:
+        return value
+    base, factor, offset = UNITS[from_unit]
+    to_base, to_factor, to_offset = UNITS[to_unit]
+    if base != to_base:
+        raise ValueError('cannot convert %s to %s' % (from_unit, to_unit))
+    return (value * factor + offset - to_offset) / to_factor
+
+
+class UnitConverter(object):
+    """ Precomputed conversion of a fixed signal list between base and target units """
+
+    def __init__(self, signals, base_units, units, exact=False):
+        '''
+        :param signals: ConnectorRefs
+        :param base_units: unit KULI reports each signal in
+        :param units: unit each signal is wanted in
+        :param exact: only cover signals whose value is passed through
+        unchanged, False also covers the affine conversions in UNITS
+        '''
+        self.signals = signals
+        self.base_units = list(base_units)
+        self.units = list(units)
+        count = len(signals)
+        # base -> unit: (value * from_factor + from_offset - to_offset) / to_factor
+        self.from_factor = numpy.ones(count)
+        self.from_offset = numpy.zeros(count)
+        self.to_factor = numpy.ones(count)
+        self.to_offset = numpy.zeros(count)
+        # identical units or definitions, passed through without arithmetic
+        self.identity = numpy.zeros(count, dtype=bool)
+        self.covered = numpy.zeros(count, dtype=bool)
+        for position, (base_unit, unit) in enumerate(zip(self.base_units, self.units)):
+            source = UNITS.get(base_unit)
+            target = UNITS.get(unit)
+            if base_unit == unit or (source is not None and source == target):
+                self.identity[position] = self.covered[position] = True
+                continue
+            if exact or source is None or target is None or source[0] != target[0]:
+                continue
+            self.from_factor[position], self.from_offset[position] = source[1], source[2]
+            self.to_factor[position], self.to_offset[position] = target[1], target[2]
+            self.covered[position] = True
+        self.update()
+
+    def update(self):
+        ''' recomputes the signal lists after covered was changed '''
+        self.covered_positions = numpy.flatnonzero(self.covered)
+        self.covered_signals = [self.signals[position] for position in self.covered_positions.tolist()]
+        self.uncovered_positions = numpy.flatnonzero(~self.covered)
+        self.converted_positions = numpy.flatnonzero(self.covered & ~self.identity)
+
+    def to_units(self, base_values):
+        ''' converts an array of values in base units to the target units '''
+        values = numpy.array(base_values, dtype=float)
+        positions = self.converted_positions
+        values[positions] = (values[positions] * self.from_factor[positions] + self.from_offset[positions]
+                             - self.to_offset[positions]) / self.to_factor[positions]
+        return values
+
+    def to_base(self, values):
+        ''' converts an array of values in target units to the base units '''
+        base_values = numpy.array(values, dtype=float)
+        positions = self.converted_positions
+        base_values[positions] = (base_values[positions] * self.to_factor[positions] + self.to_offset[positions]
+                                  - self.from_offset[positions]) / self.from_factor[positions]
+        return base_values
+
+
+class UnitRegistry(object):
+    """ Base units of the signals and COM objects of one KULI instance """
+
+    def __init__(self, kuli, schema=None):
+        '''
+        :param kuli: initialized KuliAnalysis instance
+        :param schema: ModelSchema of the model, used to look up units
+        without asking KULI
+        '''
+        self.kuli = kuli
+        self.schema = schema
+        self.__connector_units = {}
+        self.__com_units = {}
+
+    def base_unit(self, signal):
+        '''
+        Returns the unit KULI reports a sensor or actuator in.
+        :param signal: ConnectorRef or connector string
+        '''
+        if type(signal) is not ConnectorRef:
+            signal = parse_connectors([signal])[0]
+        key = (signal.component_type, signal.connector_id)
+        unit = self.__connector_units.get(key)
+        if unit is None:
+            if self.schema is not None:
+                unit = self.schema.connector_unit(*key)
+            if unit is None:
+                unit = self.kuli.get_component_connector_unit(*key)
+            if not unit:
+                unit = self.kuli.get_connector_unit(signal.connector_id)
+            self.__connector_units[key] = unit
+        return unit
+
+    def com_unit(self, com_id, is_input_com_object):
+        '''
+        Returns the unit of an input or output COM object.
+        '''
+        key = (com_id, bool(is_input_com_object))
+        unit = self.__com_units.get(key)
+        if unit is None:
+            if is_input_com_object:
+                unit = self.kuli.get_input_com_unit_by_id(com_id)
+            else:
+                unit = self.kuli.get_output_com_unit_by_id(com_id)
+            self.__com_units[key] = unit
+        return unit
+
+    def converter(self, signals, units=None, exact=False):
+        '''
+        Returns a UnitConverter for a list of signals.
+        :param signals: connector strings or ConnectorRefs
+        :param units: target units, defaults to the units given in brackets
+        of the signals
+        :param exact: only cover signals passed through unchanged, see the
+        module docstring
+        '''
+        refs = parse_connectors(signals)
+        if units is None:
+            units = [ref.unit or self.base_unit(ref) for ref in refs]
+        return UnitConverter(refs, [self.base_unit(ref) for ref in refs], units, exact)
+
+    def verify(self, converter, rtol=1e-12):
+        '''
+        Compares the client side conversion of every converted signal with
+        get_value_unit on the current values and marks signals that differ
+        by more than rtol as not covered. This is a spot check of one value
+        per signal, not a proof for all values. Pass-through signals need no
+        check. Returns the number of signals that failed the comparison.
+        :param rtol: accepted relative difference, 0 requires identical results
+        '''
+        positions = converter.converted_positions
+        if not len(positions):
+            return 0
+        signals = converter.signals
+        base = numpy.full(len(signals), numpy.nan)
+        base[positions] = self.kuli.get_values([signals[position] for position in positions.tolist()],
+                                               as_array=True)
+        client = converter.to_units(base)[positions]
+        server = numpy.array([self.kuli.get_value_unit(signals[position], None, converter.units[position])
+                              for position in positions.tolist()], dtype=float)
+        mismatch = ~((numpy.abs(client - server) <= rtol * numpy.abs(server))
+                     | (numpy.isnan(client) & numpy.isnan(server)))
+        converter.covered[positions[mismatch]] = False
+        converter.update()
+        return int(mismatch.sum())
+
+    def get_values_unit(self, converter):
+        '''
+        Reads the signals of the converter and returns them in its target
+        units. Covered signals are read in base units and converted with
+        NumPy, the others are converted by KULI.
+        '''
+        signals = converter.signals
+        values = numpy.empty(len(signals))
+        values[converter.covered_positions] = self.kuli.get_values(converter.covered_signals, as_array=True)
+        values = converter.to_units(values)
+        for position in converter.uncovered_positions.tolist():
+            values[position] = self.kuli.get_value_unit(signals[position], None, converter.units[position])
+        return values
+
+    def set_values_unit(self, converter, values):
+        '''
+        Writes values given in the target units of the converter. Covered
+        actuators are converted with NumPy and written in base units.
+        '''
+        values = numpy.asarray(values, dtype=float)
+        signals = converter.signals
+        base_values = converter.to_base(values)
+        self.kuli.set_values(zip(converter.covered_signals, base_values[converter.covered_positions].tolist()))
+        for position in converter.uncovered_positions.tolist():
+            self.kuli.set_value_unit(signals[position].component_id, signals[position].connector_id,
+                                     converter.units[position], float(values[position]))
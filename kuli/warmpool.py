@@ -0,0 +1,233 @@
+""" Pool of initialized KuliAnalysis instances reused across jobs
+
+Starting KULI, dispatching the COM server and initializing a model often
+takes longer than a short job itself. InstancePool keeps initialized
+instances per scs file and hands them out again instead of starting new
+ones:
+
+    pool = InstancePool(max_size=4)
+    with pool.instance(r'C:\\models\\ExCAR_COM.scs') as kuli:
+        kuli.simulate_operating_point(1)
+    print(pool.metrics)
+"""
+import collections
+import contextlib
+import threading
+import time
+
+
+class InstancePool(object):
+    """ Warm KuliAnalysis instances keyed by model file """
+
+    def __init__(self, factory=None, max_size=4, idle_timeout=300.0, reset='initialize'):
+        '''
+        :param factory: function creating an initialized KuliAnalysis from a
+        file name, defaults to KuliAnalysisHelper.start_kuli
+        :param max_size: maximum number of instances, idle and checked out
+        :param idle_timeout: idle instances are evicted after this time in seconds
+        :param reset: how a reused instance is reset, "initialize" calls
+        initialize, which restores the input COM and actuator values of the
+        model but reloads it. "step" only calls reset_current_simulation_step,
+        which is faster but leaves the values set by the previous user in
+        place. None does nothing and a function is called with the instance.
+        '''
+        if factory is None:
+            from KuliAnalysisHelper import start_kuli as factory
+        self.factory = factory
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.reset = reset
+
+        self.__lock = threading.Condition()
+        self.__idle = collections.OrderedDict()  # id -> (file name, instance, idle since)
+        self.__busy = {}  # id -> file name
+        self.__starting = 0
+        self.__startup_times = {}  # file name -> (starts, total time)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.failed_resets = 0
+        self.startup_time_saved = 0.0
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.__idle) + len(self.__busy) + self.__starting
+
+    def __reset(self, kuli):
+        if self.reset is None:
+            return True
+        if self.reset == 'step':
+            return kuli.reset_current_simulation_step()
+        if self.reset == 'initialize':
+            return kuli.initialize() != 0
+        return self.reset(kuli) is not False
+
+    def __discard(self, kuli):
+        try:
+            kuli.clean_up()
+        except Exception:
+            pass  # the instance is dropped anyway
+
+    def __take_idle(self, kuli_file_name):
+        ''' returns the most recently used idle instance for the file '''
+        for key in reversed(self.__idle):
+            file_name, kuli, _ = self.__idle[key]
+            if file_name == kuli_file_name:
+                del self.__idle[key]
+                return kuli
+        return None
+
+    def checkout(self, kuli_file_name, timeout=None):
+        '''
+        Returns an initialized instance for the scs file, reusing an idle one
+        if possible. Blocks while max_size instances are checked out.
+        :param kuli_file_name: name of the scs file
+        :param timeout: maximum time in seconds to wait for a free slot
+        '''
+        self.evict_idle()
+        evicted = []
+        while True:
+            with self.__lock:
+                kuli = self.__acquire(kuli_file_name, timeout, evicted)
+            if kuli is None:
+                break
+
+            # reset outside the lock, it is a COM call
+            try:
+                reset = self.__reset(kuli)
+            except Exception:
+                reset = False
+            if reset:
+                with self.__lock:
+                    self.hits += 1
+                    starts, total = self.__startup_times[kuli_file_name]
+                    self.startup_time_saved += total / starts
+                return kuli
+            with self.__lock:
+                self.failed_resets += 1
+                del self.__busy[id(kuli)]
+                self.__lock.notify()
+            self.__discard(kuli)
+
+        # no idle instance, a slot is reserved in __starting; an instance
+        # evicted for it is cleaned up outside the lock before starting
+        for kuli in evicted:
+            self.__discard(kuli)
+        start = time.perf_counter()
+        kuli = None
+        try:
+            kuli = self.factory(kuli_file_name)
+        finally:
+            with self.__lock:
+                self.__starting -= 1
+                if kuli is None:
+                    self.__lock.notify()
+                else:
+                    self.misses += 1
+                    starts, total = self.__startup_times.get(kuli_file_name, (0, 0.0))
+                    self.__startup_times[kuli_file_name] = (
+                        starts + 1, total + time.perf_counter() - start)
+                    self.__busy[id(kuli)] = kuli_file_name
+        if kuli is None:
+            raise RuntimeError('KULI could not be initialized with %s' % kuli_file_name)
+        return kuli
+
+    def __acquire(self, kuli_file_name, timeout, evicted):
+        '''
+        Takes an idle instance for the file or, if there is none, reserves a
+        slot for starting a new one and returns None. Waits while the pool is
+        full, called with the lock held.
+        :param evicted: list receiving an idle instance of another file that
+        was evicted for the slot, to be cleaned up by the caller
+        '''
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            kuli = self.__take_idle(kuli_file_name)
+            if kuli is not None:
+                self.__busy[id(kuli)] = kuli_file_name
+                return kuli
+            if len(self.__idle) + len(self.__busy) + self.__starting < self.max_size:
+                self.__starting += 1
+                return None
+            if self.__idle:
+                # evict the least recently used idle instance, it belongs to another file
+                _, (_, kuli, _) = self.__idle.popitem(last=False)
+                self.evictions += 1
+                evicted.append(kuli)
+                self.__starting += 1
+                return None
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise TimeoutError('no KULI instance became available')
+            self.__lock.wait(remaining)
+
+    def checkin(self, kuli, reusable=True):
+        '''
+        Returns an instance to the pool.
+        :param kuli: instance returned by checkout
+        :param reusable: False discards the instance, e.g. after an error
+        '''
+        with self.__lock:
+            kuli_file_name = self.__busy.pop(id(kuli))
+            if reusable:
+                self.__idle[id(kuli)] = (kuli_file_name, kuli, time.monotonic())
+            self.__lock.notify()
+        if not reusable:
+            self.__discard(kuli)
+
+    @contextlib.contextmanager
+    def instance(self, kuli_file_name, timeout=None):
+        '''
+        Context manager checking out an instance and returning it afterwards.
+        The instance is discarded if the block raises.
+        '''
+        kuli = self.checkout(kuli_file_name, timeout)
+        try:
+            yield kuli
+        except BaseException:
+            self.checkin(kuli, False)
+            raise
+        self.checkin(kuli)
+
+    def evict_idle(self):
+        ''' cleans up instances that were idle longer than idle_timeout '''
+        now = time.monotonic()
+        evicted = []
+        with self.__lock:
+            for key, (_, kuli, since) in list(self.__idle.items()):
+                if now - since >= self.idle_timeout:
+                    del self.__idle[key]
+                    evicted.append(kuli)
+            self.evictions += len(evicted)
+        for kuli in evicted:
+            self.__discard(kuli)
+        return len(evicted)
+
+    def close(self):
+        ''' cleans up all idle instances '''
+        with self.__lock:
+            idle = [kuli for _, kuli, _ in self.__idle.values()]
+            self.__idle.clear()
+        for kuli in idle:
+            self.__discard(kuli)
+
+    @property
+    def metrics(self):
+        ''' dict with hit rate, startup times and instance counts '''
+        with self.__lock:
+            starts = sum(count for count, _ in self.__startup_times.values())
+            total = sum(elapsed for _, elapsed in self.__startup_times.values())
+            requests = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / requests if requests else 0.0,
+                'evictions': self.evictions,
+                'failed_resets': self.failed_resets,
+                'startup_time': total,
+                'mean_startup_time': total / starts if starts else 0.0,
+                'startup_time_saved': self.startup_time_saved,
+                'idle': len(self.__idle),
+                'busy': len(self.__busy),
+            }
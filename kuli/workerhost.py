@@ -0,0 +1,409 @@
+""" KULI instances in child processes with shared memory result tables
+
+WorkerHost runs every KuliAnalysis instance in its own child process, so a
+crashing KULI server only takes down its worker. While a task runs, the
+worker records the signals and COM objects at every time step into a NumPy
+table in a multiprocessing.shared_memory block. The parent gets views of
+these tables, nothing but a row count is pickled:
+
+    with WorkerHost(r'C:\\models\\ExCAR_COM.scs', processes=4,
+                    signals=['1.Rad.ExitTempIM'], com_ids=['CoolantTemp']) as host:
+        for result in host.imap('operating_point', range(1, 101)):
+            temperatures = result.column('1.Rad.ExitTempIM')
+
+The table of a result yielded by imap is valid until the next result is
+requested; copy it to keep it, or use map, which copies. A watchdog
+restarts workers that crashed or made no progress for hang_timeout seconds
+and runs their tasks again, up to max_retries times.
+
+Pass factory=kuli.fake.start_kuli to run the host without a KULI server.
+"""
+import collections
+import multiprocessing
+import multiprocessing.connection
+import time
+import traceback
+from multiprocessing import shared_memory
+
+import numpy
+
+from kuli.connector import signal_name
+from kuli.pool import TASKS
+from kuli.recorder import INDEX_COLUMNS
+
+
+def _attach(name):
+    ''' attaches to a shared memory block owned by the parent '''
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        # before Python 3.13; the block is registered again with the resource
+        # tracker shared with the parent, which unlinks it once on close
+        return shared_memory.SharedMemory(name)
+
+
+def _host_worker(connection, block_name, shape, progress, factory, kuli_file_name, signals, com_ids):
+    ''' main function of the worker processes '''
+    block = _attach(block_name)
+    tables = numpy.ndarray(shape, dtype=numpy.float64, buffer=block.buf)
+    try:
+        kuli = factory(kuli_file_name)
+        if kuli is None:
+            raise RuntimeError('KULI could not be initialized with %s' % kuli_file_name)
+    except Exception:
+        connection.send(('dead', traceback.format_exc()))
+        return
+
+    recording = {'table': None, 'row': 0, 'start': 0, 'truncated': False}
+
+    def end_of_time_step(time_step, sim_time):
+        progress.value = time.time()
+        table = recording['table']
+        row = recording['row']
+        if row == len(table):
+            recording['truncated'] = True
+            return
+        values = [numpy.nan, time_step, sim_time] + kuli.get_values(signals)
+        if com_ids:
+            values += kuli.get_com_values(com_ids)
+        table[row] = values
+        recording['row'] = row + 1
+
+    def end_of_operating_point(operating_point):
+        # the operating point of the time steps is only known at its end
+        recording['table'][recording['start']:recording['row'], 0] = operating_point
+        recording['start'] = recording['row']
+
+    def next_iteration(iteration_number):
+        progress.value = time.time()
+
+    kuli.add_event_listener('OnEndOfTimeStep', end_of_time_step)
+    kuli.add_event_listener('OnEndOfOperatingPoint', end_of_operating_point)
+    kuli.add_event_listener('OnNextIteration', next_iteration)
+
+    state = {'kuli_file_name': kuli_file_name, 'model': kuli_file_name}
+    connection.send(('ready', None))
+    try:
+        while True:
+            task = connection.recv()
+            if task is None:
+                break
+            task_id, kind, item, buffer = task
+            progress.value = time.time()
+            recording.update(table=tables[buffer], row=0, start=0, truncated=False)
+            value = error = None
+            try:
+                value = TASKS[kind](kuli, item, state)
+                if value is False:
+                    error = 'KULI reported a failed simulation'
+            except Exception:
+                error = traceback.format_exc()
+            connection.send(('done', (task_id, value, recording['row'], recording['truncated'], error)))
+    except (EOFError, OSError):
+        pass
+    finally:
+        kuli.clean_up()
+        del tables
+        block.close()
+
+
+class HostResult(object):
+    """ Result of one task run by a WorkerHost """
+
+    def __init__(self, index, item, value, table, names, error, worker, attempts, truncated, release=None):
+        self.index = index
+        self.item = item
+        self.value = value
+        # view of the shared memory table, valid until released
+        self.table = table
+        self.names = names
+        self.error = error
+        self.worker = worker
+        self.attempts = attempts
+        self.truncated = truncated
+        self.__release = release
+
+    @property
+    def ok(self):
+        ''' True if the task finished without error '''
+        return self.error is None
+
+    def column(self, name):
+        ''' returns a view of one column of the table '''
+        return self.table[:, self.names.index(name)]
+
+    def copy(self):
+        ''' returns a released result owning a copy of the table '''
+        result = HostResult(self.index, self.item, self.value,
+                            None if self.table is None else self.table.copy(), self.names,
+                            self.error, self.worker, self.attempts, self.truncated)
+        self.release()
+        return result
+
+    def release(self):
+        ''' hands the shared table back to its worker '''
+        if self.__release is not None:
+            self.__release()
+            self.__release = None
+
+
+class _Slot(object):
+    """ One worker process with its shared memory block and state """
+
+    def __init__(self, slot_id, block, buffers):
+        self.slot_id = slot_id
+        self.block = block
+        self.free = list(range(buffers))
+        self.process = None
+        self.connection = None
+        self.progress = None
+        self.ready = False
+        self.task = None
+        self.started = 0.0
+        self.failed_starts = 0
+        self.error = None
+
+
+class WorkerHost(object):
+    """ Child processes running KULI with a watchdog and shared result tables """
+
+    def __init__(self, kuli_file_name, processes=None, factory=None, signals=(), com_ids=(),
+                 max_rows=10000, buffers=2, hang_timeout=600.0, startup_timeout=600.0,
+                 max_retries=2, max_failed_starts=3, context='spawn'):
+        '''
+        :param kuli_file_name: scs file every worker initializes
+        :param processes: number of worker processes, defaults to the number of CPUs
+        :param factory: function creating an initialized KuliAnalysis from a
+        file name, defaults to KuliAnalysisHelper.start_kuli. It must be picklable.
+        :param signals: sensors recorded at every time step
+        :param com_ids: IDs of COM objects recorded at every time step
+        :param max_rows: time steps a result table can take, later steps are
+        dropped and the result is marked as truncated
+        :param buffers: result tables per worker
+        :param hang_timeout: seconds without iteration or time step after
+        which a busy worker is restarted
+        :param startup_timeout: seconds a worker may take to start KULI
+        :param max_retries: times a task is run again after its worker died
+        :param max_failed_starts: failed starts after which a worker is given up
+        :param context: multiprocessing start method
+        '''
+        if factory is None:
+            from KuliAnalysisHelper import start_kuli as factory
+        self.kuli_file_name = kuli_file_name
+        self.factory = factory
+        self.signals = list(signals)
+        self.com_ids = list(com_ids)
+        self.names = list(INDEX_COLUMNS) + [signal_name(signal) for signal in self.signals] + self.com_ids
+        self.shape = (buffers, max_rows, len(self.names))
+        self.hang_timeout = hang_timeout
+        self.startup_timeout = startup_timeout
+        self.max_retries = max_retries
+        self.max_failed_starts = max_failed_starts
+        self.restarts = 0
+        self.hangs = 0
+        self.crashes = 0
+        self.errors = {}
+        self.__context = multiprocessing.get_context(context)
+        self.__run_id = 0
+        self.__slots = []
+        size = int(numpy.prod(self.shape)) * numpy.dtype(numpy.float64).itemsize
+        for slot_id in range(processes or multiprocessing.cpu_count()):
+            slot = _Slot(slot_id, shared_memory.SharedMemory(create=True, size=max(size, 1)), buffers)
+            self.__slots.append(slot)
+            self.__start(slot)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def __start(self, slot):
+        parent_connection, child_connection = self.__context.Pipe()
+        slot.progress = self.__context.Value('d', time.time(), lock=False)
+        slot.process = self.__context.Process(
+            target=_host_worker, name='WorkerHost-%d' % slot.slot_id,
+            args=(child_connection, slot.block.name, self.shape, slot.progress, self.factory,
+                  self.kuli_file_name, self.signals, self.com_ids))
+        slot.process.daemon = True
+        slot.process.start()
+        child_connection.close()
+        slot.connection = parent_connection
+        slot.ready = False
+        slot.started = time.time()
+
+    def __stop(self, slot):
+        if slot.process.is_alive():
+            slot.process.kill()
+        slot.process.join()
+        slot.connection.close()
+
+    def __restart(self, slot, reason):
+        ''' replaces the worker of a slot, returns its task '''
+        self.__stop(slot)
+        task, slot.task = slot.task, None
+        if task is not None:
+            slot.free.append(task[2])
+        if slot.failed_starts < self.max_failed_starts:
+            self.restarts += 1
+            self.__start(slot)
+        else:
+            slot.process = None
+            self.errors[slot.slot_id] = slot.error or reason
+        return task
+
+    def __live_slots(self):
+        return [slot for slot in self.__slots if slot.process is not None]
+
+    def imap(self, kind, items):
+        '''
+        Runs a task for every item and yields HostResults in the order the
+        tasks finish. The table of a result is handed back to its worker
+        when the next result is requested.
+        :param kind: task kind, a key of kuli.pool.TASKS
+        :param items: items passed to the task function
+        '''
+        if kind not in TASKS:
+            raise ValueError('unknown task kind: %s' % kind)
+        self.__run_id += 1
+        run_id = self.__run_id
+        items = list(items)
+        waiting = collections.deque((index, 1) for index in range(len(items)))
+        pending = len(items)
+        previous = None
+
+        try:
+            while pending:
+                slots = self.__live_slots()
+                if not slots:
+                    error = 'no KULI worker is running'
+                    if self.errors:
+                        error += ', last worker error:\n' + list(self.errors.values())[-1]
+                    while waiting:
+                        index, attempts = waiting.popleft()
+                        pending -= 1
+                        yield HostResult(index, items[index], None, None, self.names, error, None,
+                                         attempts, False)
+                    break
+
+                # deal out tasks to idle workers with a free table
+                for slot in slots:
+                    if waiting and slot.ready and slot.task is None and slot.free:
+                        index, attempts = waiting.popleft()
+                        buffer = slot.free.pop()
+                        slot.task = ((run_id, index), attempts, buffer)
+                        slot.started = slot.progress.value = time.time()
+                        slot.connection.send(((run_id, index), kind, items[index], buffer))
+
+                ready = multiprocessing.connection.wait([slot.connection for slot in slots], timeout=0.1)
+                for slot in slots:
+                    if slot.connection not in ready:
+                        continue
+                    try:
+                        message, data = slot.connection.recv()
+                    except (EOFError, OSError):
+                        continue  # handled by the watchdog below
+                    if message == 'ready':
+                        slot.ready = True
+                        slot.failed_starts = 0
+                    elif message == 'dead':
+                        slot.failed_starts += 1
+                        slot.error = data
+                        self.__restart(slot, data)
+                    elif message == 'done':
+                        task_id, value, rows, truncated, error = data
+                        task, slot.task = slot.task, None
+                        if task is None or task_id != task[0] or task_id[0] != run_id:
+                            if task is not None:
+                                slot.free.append(task[2])
+                            continue
+                        if previous is not None:
+                            previous.release()
+                        index, attempts, buffer = task_id[1], task[1], task[2]
+                        table = numpy.ndarray(self.shape, dtype=numpy.float64, buffer=slot.block.buf)[buffer, :rows]
+                        previous = HostResult(index, items[index], value, table, self.names, error, slot.slot_id,
+                                              attempts, truncated,
+                                              lambda slot=slot, buffer=buffer: slot.free.append(buffer))
+                        pending -= 1
+                        yield previous
+
+                # watchdog
+                now = time.time()
+                for slot in slots:
+                    if slot.process is None:
+                        continue
+                    reason = None
+                    if not slot.process.is_alive():
+                        reason = 'worker %d died with exit code %s' % (slot.slot_id, slot.process.exitcode)
+                        self.crashes += 1
+                        if not slot.ready:
+                            slot.failed_starts += 1
+                    elif slot.task is not None and now - max(slot.progress.value, slot.started) > self.hang_timeout:
+                        reason = 'worker %d made no progress for %g s' % (slot.slot_id, self.hang_timeout)
+                        self.hangs += 1
+                    elif not slot.ready and now - slot.started > self.startup_timeout:
+                        reason = 'worker %d did not start within %g s' % (slot.slot_id, self.startup_timeout)
+                        slot.failed_starts += 1
+                    if reason is None:
+                        continue
+                    slot.error = slot.error if not slot.ready else reason
+                    task = self.__restart(slot, reason)
+                    if task is None or task[0][0] != run_id:
+                        continue
+                    index, attempts = task[0][1], task[1]
+                    if attempts <= self.max_retries:
+                        waiting.appendleft((index, attempts + 1))
+                    else:
+                        pending -= 1
+                        yield HostResult(index, items[index], None, None, self.names, reason, slot.slot_id,
+                                         attempts, False)
+
+        finally:
+            if previous is not None:
+                previous.release()
+
+    def map(self, kind, items):
+        '''
+        Runs a task for every item and returns HostResults with copied
+        tables in item order.
+        '''
+        results = [result.copy() for result in self.imap(kind, items)]
+        results.sort(key=lambda result: result.index)
+        return results
+
+    def map_operating_points(self, operating_points):
+        ''' simulates the operating points, one task per operating point '''
+        return self.map('operating_point', operating_points)
+
+    @property
+    def stats(self):
+        ''' dict with restart counts and the number of running workers '''
+        return {
+            'workers': len(self.__live_slots()),
+            'restarts': self.restarts,
+            'crashes': self.crashes,
+            'hangs': self.hangs,
+        }
+
+    def close(self, timeout=10.0):
+        '''
+        Stops the workers and frees the shared memory.
+        :param timeout: time in seconds to wait for each worker
+        '''
+        deadline = time.time() + timeout
+        for slot in self.__live_slots():
+            try:
+                slot.connection.send(None)
+            except (OSError, ValueError):
+                pass
+        for slot in self.__slots:
+            if slot.process is not None:
+                slot.process.join(max(0.0, deadline - time.time()))
+                self.__stop(slot)
+                slot.process = None
+            try:
+                slot.block.close()
+            except BufferError:  # tables of results are still referenced
+                pass
+            slot.block.unlink()
+        self.__slots = []
@@ -0,0 +1,79 @@
+""" Tests of kuli.aio against the fake KULI server """
+import asyncio
+import threading
+
+import pytest
+
+from kuli import fake
+from kuli.aio import AsyncKuliAnalysis
+
+
+async def start(model=None):
+    kuli = await AsyncKuliAnalysis.start(dispatch=fake.FakeDispatch(model))
+    await kuli.set('kuli_file_name', 'model.scs')
+    assert await kuli.initialize() != 0
+    return kuli
+
+
+def test_calls_run_on_one_thread():
+    async def main():
+        kuli = await start()
+        threads = set()
+        kuli.kuli.add_event_listener('OnEndOfOperatingPoint', lambda number: threads.add(threading.get_ident()))
+        assert await kuli.get('kuli_file_name') == 'model.scs'
+        assert await kuli.simulate_operating_point(1)
+        values = await kuli.get_values(['1.Rad.ExitTempIM'])
+        assert values == [kuli.kuli.get_value('1.Rad', 'ExitTempIM')]
+        assert await kuli.set_com_values({'AmbientTemp': 30.0}) == [True]
+        assert await kuli.get_com_values(['AmbientTemp']) == [30.0]
+        assert await kuli.get_com_value_by_id('AmbientTemp') == 30.0
+        assert threads and threading.get_ident() not in threads
+        await kuli.close()
+        assert kuli.kuli is None
+
+    asyncio.run(main())
+
+
+def test_events():
+    async def main():
+        kuli = await start(fake.FakeModel(time_steps=3))
+        async with kuli.events('OnEndOfTimeStep', 'OnEndOfOperatingPoint') as events:
+            await kuli.simulate_operating_point(2)
+            events.close()
+            received = [event async for event in events]
+        await kuli.close()
+        return received
+
+    received = asyncio.run(main())
+    assert [event.name for event in received] == ['OnEndOfTimeStep'] * 3 + ['OnEndOfOperatingPoint']
+    assert received[-1].args == (2,)
+
+
+def test_dropped_events():
+    async def main():
+        kuli = await start(fake.FakeModel(time_steps=5))
+        events = kuli.events('OnEndOfTimeStep', maxsize=2)
+        await kuli.simulate_operating_point(1)
+        events.close()
+        # the end of the stream must not be lost with a full queue
+        await asyncio.sleep(0.01)
+        received = [event async for event in events]
+        await kuli.close()
+        return received, events.dropped
+
+    received, dropped = asyncio.run(main())
+    assert (len(received), dropped) == (2, 3)
+
+
+def test_unknown_names():
+    async def main():
+        kuli = await start()
+        try:
+            with pytest.raises(ValueError):
+                kuli.events('OnUnknown')
+            with pytest.raises(AttributeError):
+                kuli.unknown_method
+        finally:
+            await kuli.close()
+
+    asyncio.run(main())
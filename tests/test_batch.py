@@ -0,0 +1,52 @@
+""" Tests of the batched getters and setters of KuliAnalysis against the fake KULI server """
+import numpy
+import pytest
+
+from kuli import fake, parse_connector
+
+
+@pytest.fixture
+def kuli():
+    kuli = fake.start_kuli('model.scs')
+    yield kuli
+    kuli.clean_up()
+
+
+def server(kuli):
+    return kuli._KuliAnalysis__kuli
+
+
+def test_get_values(kuli):
+    values = kuli.get_values(['1.Rad.ExitTempIM', ('1.CAC', 'ExitTempIM'), parse_connector('1.Fan.Power')])
+    assert values == [kuli.get_value('1.Rad', 'ExitTempIM'), kuli.get_value('1.CAC', 'ExitTempIM'),
+                      kuli.get_value('1.Fan', 'Power')]
+    array = kuli.get_values(['1.Rad.ExitTempIM', '1.CAC.ExitTempIM'], as_array=True)
+    assert isinstance(array, numpy.ndarray)
+    assert array.tolist() == values[:2]
+
+
+def test_methods_are_looked_up_once(kuli):
+    kuli.get_values(['1.Rad.ExitTempIM'])
+    kuli.get_com_values(['CoolantTemp'])
+    lookups = server(kuli).name_lookups
+    calls = server(kuli).calls.get('GetValue', 0)
+    for _ in range(3):
+        kuli.get_values(['1.Rad.ExitTempIM', '1.CAC.ExitTempIM'])
+        kuli.get_com_values(['CoolantTemp', 'FanPower'])
+    assert server(kuli).name_lookups == lookups
+    assert server(kuli).calls['GetValue'] == calls + 6
+
+
+def test_set_values(kuli):
+    kuli.set_values({'1.Fan.Speed': 2000.0, ('1.Pump', 'Speed'): 1500})
+    assert kuli.get_value('1.Fan', 'Speed') == 2000.0
+    assert kuli.get_value('1.Pump', 'Speed') == 1500.0
+    kuli.set_values([('1.Fan.Speed', 2500.0)])
+    assert kuli.get_values(['1.Fan.Speed']) == [2500.0]
+
+
+def test_com_values(kuli):
+    assert kuli.set_com_values({'AmbientTemp': 30.0, 'VehicleSpeed': 80}) == [True, True]
+    assert kuli.get_com_values(['AmbientTemp', 'VehicleSpeed']) == [30.0, 80.0]
+    assert kuli.set_com_values([('AmbientTemp', 35.0), ('Unknown', 1.0)]) == [True, False]
+    assert kuli.get_com_value_by_id('AmbientTemp') == 35.0
@@ -0,0 +1,122 @@
+""" Tests of kuli.jobqueue against the fake KULI server """
+import os
+import time
+
+import pytest
+
+from kuli import fake
+from kuli.jobqueue import (CANCELLED, DONE, FAILED, PENDING, Coordinator, FileTransport, JobSpec,
+                           SQLiteTransport, Transport, WorkerAgent)
+from kuli.warmpool import InstancePool
+
+
+@pytest.fixture(params=['sqlite', 'files'])
+def transport(request, tmp_path):
+    if request.param == 'sqlite':
+        transport = SQLiteTransport(os.path.join(str(tmp_path), 'jobs.sqlite'))
+        yield transport
+        transport.close()
+    else:
+        yield FileTransport(os.path.join(str(tmp_path), 'jobs'))
+
+
+@pytest.fixture
+def coordinator(transport):
+    return Coordinator(transport, poll_interval=0.01)
+
+
+@pytest.fixture
+def agent(transport):
+    pool = InstancePool(factory=fake.start_kuli, max_size=1)
+    yield WorkerAgent(transport, pool, 'worker', poll_interval=0.01)
+    pool.close()
+
+
+def spec(priority=0, **kwargs):
+    return JobSpec('model.scs', outputs=['CoolantTemp'], priority=priority, **kwargs)
+
+
+def test_priority_order(coordinator, agent):
+    coordinator.submit(spec(), 'a')
+    coordinator.submit(spec(), 'b')
+    coordinator.submit(spec(-1), 'low')
+    coordinator.submit(spec(5), 'high')
+    assert [agent.run_once() for _ in range(5)] == ['high', 'a', 'b', 'low', None]
+    assert all(result.status == DONE for result in coordinator.wait(['a', 'b', 'low', 'high'], timeout=5.0))
+
+
+def test_result(coordinator, agent):
+    coordinator.submit(spec(inputs={'AmbientTemp': 30.0}, operating_points=[1, 2],
+                            signals=['1.Rad.ExitTempIM']), 'job')
+    assert agent.run_once() == 'job'
+    result = coordinator.result('job', timeout=5.0)
+    assert result.status == DONE
+    assert result.attempts == 1
+    assert result.worker == 'worker'
+    assert len(result.outputs) == len(result.signals) == 2
+
+
+def test_retries_until_failed(coordinator, agent):
+    coordinator.submit(spec(operating_points=[9], max_retries=1), 'invalid')
+    assert agent.run_once() == 'invalid'
+    assert coordinator.status('invalid') == PENDING
+    assert agent.run_once() == 'invalid'
+    assert agent.run_once() is None
+    result = coordinator.result('invalid', timeout=5.0)
+    assert result.status == FAILED
+    assert result.attempts == 2
+    assert 'operating point 9 failed' in result.error
+
+
+def test_expired_lease_is_queued_again(transport, coordinator, agent):
+    coordinator.submit(spec(), 'job')
+    job_id, _, attempt = transport.claim('crashed', 0.01)
+    assert (job_id, attempt) == ('job', 1)
+    time.sleep(0.05)
+    assert transport.renew('job', 'other', 60.0) is False
+    assert coordinator.requeue_expired() == 1
+    assert coordinator.requeue_expired() == 0
+    assert transport.renew('job', 'crashed', 60.0) is False
+    assert agent.run_once() == 'job'
+    result = coordinator.result('job', timeout=5.0)
+    assert result.status == DONE
+    assert result.attempts == 2
+    assert result.worker == 'worker'
+
+
+def test_renewed_lease_is_kept(transport, coordinator):
+    coordinator.submit(spec(), 'job')
+    transport.claim('worker', 0.01)
+    assert transport.renew('job', 'worker', 60.0) is True
+    time.sleep(0.05)
+    assert coordinator.requeue_expired() == 0
+    assert coordinator.status('job') == 'running'
+
+
+def test_cancel(coordinator, agent):
+    coordinator.submit(spec(), 'cancelled')
+    coordinator.submit(spec(), 'claimed')
+    assert coordinator.cancel('cancelled') is True
+    assert coordinator.cancel('cancelled') is False
+    assert agent.run_once() == 'claimed'
+    assert coordinator.cancel('claimed') is False
+    assert agent.run_once() is None
+    assert coordinator.status('cancelled') == CANCELLED
+    assert coordinator.status('unknown') is None
+
+
+def test_run_and_metrics(coordinator, agent):
+    job_ids = coordinator.submit_many([spec(), spec(), spec(operating_points=[9], max_retries=0)])
+    assert agent.run(idle_timeout=0.05) == 3
+    metrics = coordinator.metrics
+    assert (metrics['done'], metrics['failed'], metrics['pending']) == (2, 1, 0)
+    assert sorted(result.status for result in coordinator.wait(job_ids, timeout=5.0)) == [DONE, DONE, FAILED]
+
+
+def test_transport_is_abstract():
+    class Incomplete(Transport):
+        def submit(self, job_id, spec):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,70 @@
+""" Tests of the lazy imports of kuli and the lazy dispatch of KuliAnalysis """
+import importlib
+import os
+import subprocess
+import sys
+
+import pytest
+
+import kuli
+from kuli import fake
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def loaded_modules(statement):
+    ''' returns the modules loaded by a statement in a new interpreter '''
+    code = '%s\nimport sys\nprint(" ".join(sys.modules))' % statement
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=ROOT)
+    return set(output.decode().split())
+
+
+@pytest.mark.parametrize('statement, module', [
+    ('import kuli', 'kuli.kulianalysis'),
+    ('from kuli import KuliAnalysis', 'kuli.pool'),
+    ('from kuli import KuliPool', 'kuli.kulianalysis'),
+])
+def test_import_is_lazy(statement, module):
+    modules = loaded_modules(statement)
+    assert module not in modules
+    assert not modules & {'numpy', 'win32com', 'pythoncom', 'colorama'}
+
+
+def test_exports():
+    assert set(kuli.__all__) <= set(dir(kuli))
+    for name in kuli.__all__:
+        module = importlib.import_module(kuli._EXPORTS[name])
+        assert getattr(kuli, name) is getattr(module, name)
+    with pytest.raises(AttributeError):
+        kuli.Unknown
+
+
+class CountingDispatch(fake.FakeDispatch):
+    """ FakeDispatch counting the dispatched servers """
+
+    def __init__(self):
+        fake.FakeDispatch.__init__(self)
+        self.count = 0
+
+    def __call__(self, progid, event_handler):
+        self.count += 1
+        return fake.FakeDispatch.__call__(self, progid, event_handler)
+
+
+def test_dispatch_on_first_call():
+    dispatch = CountingDispatch()
+    instance = kuli.KuliAnalysis('13', dispatch=dispatch)
+    instance.add_event_listener('OnEndOfOperatingPoint', lambda number: None)
+    assert (dispatch.count, instance.dispatched) == (0, False)
+    instance.kuli_file_name = 'model.scs'
+    assert (dispatch.count, instance.dispatched) == (1, True)
+    assert instance.initialize() != 0
+    assert dispatch.count == 1
+
+
+def test_dispatch_in_constructor():
+    dispatch = CountingDispatch()
+    instance = kuli.KuliAnalysis('13', dispatch=dispatch, lazy=False)
+    assert (dispatch.count, instance.dispatched) == (1, True)
+    instance.connect()
+    assert dispatch.count == 1
@@ -0,0 +1,82 @@
+""" Tests of kuli.pool against the fake KULI server """
+import functools
+import os
+import time
+
+import pytest
+
+import kuli.pool
+from kuli import fake
+from kuli.pool import KuliPool
+
+
+def exit_on_task(operating_point, kuli_file_name):
+    ''' factory of a worker that exits as soon as it takes the operating point '''
+    next_task = kuli.pool._next_task
+
+    def take(worker_id, task_queues, timeout):
+        task = next_task(worker_id, task_queues, timeout)
+        if task is not None and task[3] == operating_point:
+            # lets the queue send the messages of the earlier tasks first
+            time.sleep(0.2)
+            os._exit(3)
+        return task
+
+    kuli.pool._next_task = take
+    return fake.start_kuli(kuli_file_name)
+
+
+def exit_in_task(operating_point, kuli_file_name):
+    ''' factory of a worker that exits at the end of the operating point '''
+    instance = fake.start_kuli(kuli_file_name)
+
+    def end_of_operating_point(number):
+        if number == operating_point:
+            time.sleep(0.2)
+            os._exit(3)
+
+    instance.add_event_listener('OnEndOfOperatingPoint', end_of_operating_point)
+    return instance
+
+
+@pytest.fixture
+def pool():
+    with KuliPool('model.scs', processes=2, factory=fake.start_kuli,
+                  outputs=['CoolantTemp'], signals=['1.Rad.ExitTempIM']) as pool:
+        yield pool
+
+
+def test_map_operating_points(pool):
+    results = pool.map_operating_points([1, 2, 3, 9])
+    assert [result.index for result in results] == [0, 1, 2, 3]
+    assert [result.ok for result in results] == [True, True, True, False]
+    assert all(len(result.outputs) == len(result.signals) == 1 for result in results[:3])
+    assert results[0].outputs != results[1].outputs
+    with pytest.raises(ValueError):
+        pool.map('unknown', [1])
+
+
+def test_abandoned_run_is_drained(pool):
+    results = pool.imap('operating_point', [1, 2, 3] * 10)
+    next(results)
+    results.close()
+    assert all(queue.empty() for queue in pool._KuliPool__task_queues)
+    assert [result.item for result in pool.map_operating_points([3, 1])] == [3, 1]
+
+
+def test_worker_dying_in_task():
+    with KuliPool('model.scs', processes=2, factory=functools.partial(exit_in_task, 2)) as pool:
+        results = pool.map_operating_points([1, 2, 3])
+        assert [result.ok for result in results] == [True, False, True]
+        assert 'died with exit code 3' in results[1].error
+        assert all(result.ok for result in pool.map_operating_points([1, 3]))
+
+
+def test_worker_dying_after_taking_task():
+    with KuliPool('model.scs', processes=2, factory=functools.partial(exit_on_task, 2),
+                  lost_task_timeout=0.5) as pool:
+        results = pool.map_operating_points([1, 3, 2, 1, 3])
+        assert [result.index for result in results] == [0, 1, 2, 3, 4]
+        assert not results[2].ok
+        assert 'task lost' in results[2].error
+        assert all(result.ok for result in results if result.item != 2)
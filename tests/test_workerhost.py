@@ -0,0 +1,86 @@
+""" Tests of kuli.workerhost against the fake KULI server """
+import functools
+import os
+import time
+
+import numpy
+import pytest
+
+from kuli import fake
+from kuli.workerhost import WorkerHost
+
+SIGNALS = ['1.Rad.ExitTempIM']
+COM_IDS = ['CoolantTemp']
+
+
+def failing_once(action, marker, kuli_file_name):
+    '''
+    factory of a worker that exits or hangs at the end of operating point 2,
+    the first time only
+    '''
+    instance = fake.start_kuli(kuli_file_name, fake.FakeModel(time_steps=3))
+
+    def end_of_operating_point(number):
+        if number != 2 or os.path.exists(marker):
+            return
+        open(marker, 'w').close()
+        if action == 'exit':
+            os._exit(3)
+        time.sleep(60.0)
+
+    instance.add_event_listener('OnEndOfOperatingPoint', end_of_operating_point)
+    return instance
+
+
+def start_host(factory, **kwargs):
+    return WorkerHost('model.scs', processes=2, factory=factory, signals=SIGNALS, com_ids=COM_IDS, **kwargs)
+
+
+@pytest.fixture
+def host():
+    with start_host(functools.partial(fake.start_kuli, model=fake.FakeModel(time_steps=3)), max_rows=5) as host:
+        yield host
+
+
+def test_map_operating_points(host):
+    results = host.map_operating_points([1, 2, 9])
+    assert [result.ok for result in results] == [True, True, False]
+    assert results[0].names == ['operating_point', 'time_step', 'time'] + SIGNALS + COM_IDS
+    assert results[0].table.shape == (3, 5)
+    assert results[0].column('operating_point').tolist() == [1.0] * 3
+    assert results[1].column('time_step').tolist() == [1.0, 2.0, 3.0]
+    assert not numpy.isnan(results[1].column('CoolantTemp')).any()
+    assert host.stats == {'workers': 2, 'restarts': 0, 'crashes': 0, 'hangs': 0}
+
+
+def test_tables_are_reused(host):
+    for _ in range(3):
+        for result in host.imap('operating_point', [1, 2, 3]):
+            assert result.attempts == 1
+            assert len(result.table) == 3
+    result = next(iter(host.imap('batch_file', ['model.scs'])))
+    assert result.ok
+    # the run of three operating points does not fit into five rows
+    assert result.truncated
+    assert len(result.table) == 5
+
+
+@pytest.mark.parametrize('action, counter', [('exit', 'crashes'), ('hang', 'hangs')])
+def test_task_is_run_again(tmp_path, action, counter):
+    factory = functools.partial(failing_once, action, os.path.join(str(tmp_path), 'failed'))
+    with start_host(factory, hang_timeout=1.0) as host:
+        results = host.map_operating_points([1, 2, 3])
+        assert all(result.ok for result in results)
+        assert [result.attempts for result in results] == [1, 2, 1]
+        assert results[1].column('time_step').tolist() == [1.0, 2.0, 3.0]
+        stats = host.stats
+        assert (stats['workers'], stats['restarts'], stats[counter]) == (2, 1, 1)
+
+
+def test_task_fails_without_retries(tmp_path):
+    factory = functools.partial(failing_once, 'exit', os.path.join(str(tmp_path), 'failed'))
+    with start_host(factory, max_retries=0) as host:
+        results = host.map_operating_points([2, 1])
+        assert [result.ok for result in results] == [False, True]
+        assert 'died with exit code 3' in results[0].error
+        assert results[0].table is None
@@ -0,0 +1,82 @@
+""" Tests of the write buffer of KuliAnalysis against the fake KULI server """
+import pytest
+
+from kuli import fake
+
+
+@pytest.fixture
+def kuli():
+    kuli = fake.start_kuli('model.scs')
+    kuli.enable_write_buffer()
+    yield kuli
+    kuli.clean_up()
+
+
+def calls(kuli, name):
+    return kuli._KuliAnalysis__kuli.calls.get(name, 0)
+
+
+def test_writes_wait_for_a_read(kuli):
+    kuli.set_value('1.Fan', 'Speed', 1000.0)
+    kuli.set_value('1.Fan', 'Speed', 2000.0)
+    kuli.set_com_value_by_id('AmbientTemp', 30.0)
+    assert calls(kuli, 'SetValue') == calls(kuli, 'SetCOMValueByID') == 0
+    assert kuli.write_buffer_stats['pending'] == 2
+    assert kuli.get_value('1.Fan', 'Speed') == 2000.0
+    assert calls(kuli, 'SetValue') == calls(kuli, 'SetCOMValueByID') == 1
+    stats = kuli.write_buffer_stats
+    assert (stats['writes'], stats['sent'], stats['coalesced'], stats['pending']) == (3, 2, 1, 0)
+
+
+def test_repeated_values_are_dropped(kuli):
+    kuli.set_values({'1.Fan.Speed': 1000.0})
+    kuli.set_com_values({'AmbientTemp': 30.0})
+    kuli.flush_writes()
+    kuli.set_values({'1.Fan.Speed': 1000})
+    kuli.set_com_values({'AmbientTemp': 30.0})
+    kuli.set_value('1.Pump', 'Speed', 5.0)
+    kuli.set_value('1.Pump', 'Speed', 0.0)
+    kuli.flush_writes()
+    assert calls(kuli, 'SetValue') == 2
+    assert calls(kuli, 'SetCOMValueByID') == 1
+    assert kuli.write_buffer_stats['dropped'] == 2
+
+
+def test_flush_before_simulation(kuli):
+    kuli.set_com_value_by_id('AmbientTemp', 40.0)
+    kuli.simulate_operating_point(1)
+    assert calls(kuli, 'SetCOMValueByID') == 1
+    kuli.set_com_value_by_id('AmbientTemp', 45.0)
+    kuli.next_kuli_iteration()
+    assert calls(kuli, 'SetCOMValueByID') == 2
+
+
+def test_invalidate(kuli):
+    kuli.set_com_value_by_id('AmbientTemp', 30.0)
+    kuli.invalidate_write_buffer()
+    assert calls(kuli, 'SetCOMValueByID') == 1
+    kuli.set_com_value_by_id('AmbientTemp', 30.0)
+    assert kuli.write_buffer_stats['pending'] == 1
+    kuli.disable_write_buffer()
+    assert calls(kuli, 'SetCOMValueByID') == 2
+    assert kuli.write_buffer_stats is None
+
+
+def test_failed_writes(kuli, monkeypatch):
+    kuli.set_com_values({'AmbientTemp': 30.0, 'Unknown': 1.0})
+    assert kuli.flush_writes() == ['Unknown']
+    assert kuli.write_buffer_stats['failed'] == 1
+
+    def broken(component_id, actuator_id, value):
+        raise RuntimeError('server gone')
+
+    kuli.set_value('1.Fan', 'Speed', 1000.0)
+    kuli.set_com_value_by_id('AmbientTemp', 35.0)
+    monkeypatch.setattr(kuli._KuliAnalysis__kuli, 'SetValue', broken)
+    with pytest.raises(RuntimeError):
+        kuli.flush_writes()
+    assert kuli.write_buffer_stats['pending'] == 2
+    monkeypatch.undo()
+    assert kuli.flush_writes() == []
+    assert kuli.get_values(['1.Fan.Speed']) == [1000.0]
+    assert kuli.get_com_values(['AmbientTemp']) == [35.0]